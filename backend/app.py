@@ -1,5 +1,6 @@
 from flask import Flask, request, jsonify, g
 from flask_cors import CORS
+import click
 from waitress import serve
 import os
 import logging
@@ -9,11 +10,14 @@ from dotenv import load_dotenv
 # Import custom modules
 from config.database import init_db
 from config.firebase_admin import init_firebase
-from middleware.logging_middleware import setup_logging, log_request
+from middleware.logging_middleware import setup_logging, log_request, log_response, get_logging_stats
+from middleware.metrics_middleware import init_metrics
 from routes.auth_routes import auth_bp
 from routes.user_routes import user_bp
 from routes.nutrient_routes import nutrient_bp
 from services.email_service import init_mail
+from services.mail_dispatcher import get_mail_stats
+from services.notification_service import get_notification_stats
 from services.cloudinary_service import init_cloudinary
 from services.ml_service import init_ml_service
 
@@ -88,12 +92,21 @@ def create_app():
     
     @app.after_request
     def after_request(response):
-        # Log response details
-        logging.info(f"Response Status: {response.status_code}")
-        if response.status_code >= 400:
-            logging.error(f"Error Response: {response.get_data(as_text=True)}")
+        log_response(response)
         return response
     
+    # Latency histograms and phase timings, scraped from /metrics
+    init_metrics(app)
+    
+    # Maintenance commands (run with: flask --app app rebuild-nutrition-rollups)
+    @app.cli.command('rebuild-nutrition-rollups')
+    @click.option('--user-id', default=None, help='Only rebuild rollups for this user')
+    def rebuild_nutrition_rollups(user_id):
+        """Backfill or repair the user_daily_nutrition rollups from user_meals"""
+        from models.daily_nutrition import DailyNutrition
+        written = DailyNutrition.rebuild(user_id)
+        click.echo(f"Rebuilt {written} daily nutrition rollup documents")
+    
     # Register blueprints
     app.register_blueprint(auth_bp, url_prefix='/api/v1/auth')
     app.register_blueprint(user_bp, url_prefix='/api/v1/users')
@@ -116,6 +129,10 @@ def create_app():
         except Exception:
             ml_status = 'error'
         
+        # Cache hit ratios
+        from services.cache_service import get_cache_stats
+        caches = get_cache_stats()
+        
         return jsonify({
             'status': 'healthy',
             'message': 'GlycoFit Backend is running',
@@ -126,7 +143,11 @@ def create_app():
                 'cloudinary': 'configured',
                 'firebase': 'configured',
                 'ml_model': ml_status
-            }
+            },
+            'caches': caches,
+            'logging': get_logging_stats(),
+            'mail': get_mail_stats(),
+            'notifications': get_notification_stats()
         }), 200
     
     # Error handlers
@@ -155,5 +176,5 @@ if __name__ == '__main__':
     logging.info(f"Starting GlycoFit Backend on port {port}")
     logging.info(f"Debug mode: {debug}")
 
-    serve(app, host='0.0.0.0', port=port)
+    serve(app, host='0.0.0.0', port=port, threads=int(os.getenv('WAITRESS_THREADS', 12)))
     #app.run(host='0.0.0.0', port=port, debug=debug)
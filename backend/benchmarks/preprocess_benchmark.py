@@ -0,0 +1,104 @@
+"""
+Microbenchmark: fast image preprocessing vs the torchvision transforms pipeline
+
+Times both paths on phone-sized JPEGs and reports how far the fast path's
+tensors are from the reference ones. Run from the backend directory:
+
+    python -m benchmarks.preprocess_benchmark --size 4032x3024 --repeat 20
+    python -m benchmarks.preprocess_benchmark --images path/to/photos
+
+The reference path does not apply EXIF orientation, so compare on photos
+without a rotation tag (the generated ones have none).
+"""
+import argparse
+import random
+import time
+import sys
+import io
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from PIL import Image
+
+from services.image_preprocessor import FastImagePreprocessor
+from services.model_optimizer import IMAGE_EXTENSIONS
+from services.ml_service import build_transform
+
+def make_photos(count, size):
+    """Generate JPEGs at camera resolution (smooth colour fields plus sensor-like noise)"""
+    rng = random.Random(11)
+    photos = []
+    for _ in range(count):
+        small = Image.new('RGB', (32, 24))
+        small.putdata([(rng.randrange(256), rng.randrange(256), rng.randrange(256)) for _ in range(32 * 24)])
+        image = small.resize(size, Image.BICUBIC)
+        noise = Image.effect_noise(size, 12).convert('RGB')
+        image = Image.blend(image, noise, 0.15)
+
+        buffer = io.BytesIO()
+        image.save(buffer, 'JPEG', quality=90)
+        photos.append(buffer.getvalue())
+    return photos
+
+def load_photos(directory, limit):
+    names = sorted(name for name in os.listdir(directory) if name.lower().endswith(IMAGE_EXTENSIONS))[:limit]
+    photos = []
+    for name in names:
+        with open(os.path.join(directory, name), 'rb') as photo:
+            photos.append(photo.read())
+    return photos
+
+def reference_preprocess(transform, image_data):
+    image = Image.open(io.BytesIO(image_data))
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+    return transform(image).unsqueeze(0)
+
+def time_path(preprocess, photos, repeat):
+    preprocess(photos[0])
+    started_at = time.perf_counter()
+    for _ in range(repeat):
+        for photo in photos:
+            preprocess(photo)
+    return (time.perf_counter() - started_at) * 1000 / (repeat * len(photos))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Compare fast image preprocessing with the torchvision pipeline')
+    parser.add_argument('--images', help='Directory of photos to use instead of generated ones')
+    parser.add_argument('--count', type=int, default=4, help='Number of photos')
+    parser.add_argument('--size', default='4032x3024', help='Generated photo size, WIDTHxHEIGHT')
+    parser.add_argument('--repeat', type=int, default=10, help='Passes over the photos per path')
+    args = parser.parse_args(argv)
+
+    if args.images:
+        photos = load_photos(args.images, args.count)
+    else:
+        width, height = (int(value) for value in args.size.lower().split('x'))
+        photos = make_photos(args.count, (width, height))
+    if not photos:
+        print('No photos to benchmark', file=sys.stderr)
+        return 1
+
+    transform = build_transform()
+    fast = FastImagePreprocessor()
+    reference = lambda photo: reference_preprocess(transform, photo)
+
+    reference_ms = time_path(reference, photos, args.repeat)
+    fast_ms = time_path(fast, photos, args.repeat)
+
+    mean_error = 0.0
+    max_error = 0.0
+    for photo in photos:
+        difference = (fast(photo) - reference(photo)).abs()
+        mean_error += float(difference.mean()) / len(photos)
+        max_error = max(max_error, float(difference.max()))
+
+    print(f"{len(photos)} photos, {args.repeat} passes")
+    print(f"  transforms.Compose  {reference_ms:8.2f} ms/image")
+    print(f"  fast path           {fast_ms:8.2f} ms/image  ({reference_ms / fast_ms:.1f}x)")
+    print(f"  tensor difference   mean {mean_error:.4f}, max {max_error:.4f} (normalized units)")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,373 @@
+"""
+Load/benchmark suite for the GlycoFit backend
+
+Boots create_app() against local stand-ins (see benchmarks/standins.py),
+drives concurrent workloads and reports throughput, latency percentiles
+and memory. Run from the backend directory:
+
+    pip install -r benchmarks/requirements.txt
+    python -m benchmarks.run_benchmarks --workloads predict,save-meal,meals,summary --concurrency 8 --requests 200
+
+Use --http to go through a real waitress server instead of the in-process
+test client, --output to save results as JSON, and --baseline with a
+previously saved file to fail (exit code 1) on regressions.
+"""
+from datetime import datetime, timedelta
+import argparse
+import threading
+import http.client
+import resource
+import random
+import json
+import time
+import uuid
+import sys
+import io
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from benchmarks.standins import install_standins, seed_data, bench_token
+
+WORKLOADS = ('predict', 'save-meal', 'meals', 'summary')
+
+def make_images(count, size=(1024, 768)):
+    """Generate distinct JPEG photos-sized images (smooth random colour fields)"""
+    from PIL import Image
+
+    rng = random.Random(7)
+    images = []
+    for _ in range(count):
+        small = Image.new('RGB', (16, 12))
+        small.putdata([(rng.randrange(256), rng.randrange(256), rng.randrange(256)) for _ in range(16 * 12)])
+        buffer = io.BytesIO()
+        small.resize(size, Image.BILINEAR).save(buffer, 'JPEG', quality=85)
+        images.append(buffer.getvalue())
+    return images
+
+def encode_multipart(field, filename, data, content_type='image/jpeg'):
+    boundary = uuid.uuid4().hex
+    body = (
+        f'--{boundary}\r\n'
+        f'Content-Disposition: form-data; name="{field}"; filename="{filename}"\r\n'
+        f'Content-Type: {content_type}\r\n\r\n'
+    ).encode('utf-8') + data + f'\r\n--{boundary}--\r\n'.encode('utf-8')
+    return body, f'multipart/form-data; boundary={boundary}'
+
+class TestClientTransport:
+    """Sends requests through Flask's in-process test client"""
+
+    def __init__(self, app):
+        self.app = app
+        self.local = threading.local()
+
+    def request(self, method, path, headers, body=None, content_type=None):
+        client = getattr(self.local, 'client', None)
+        if client is None:
+            client = self.local.client = self.app.test_client()
+        response = client.open(path, method=method, headers=headers, data=body, content_type=content_type)
+        response.get_data()
+        return response.status_code
+
+class HttpTransport:
+    """Sends requests over keep-alive HTTP connections to a local waitress server"""
+
+    def __init__(self, app, threads):
+        from waitress.server import create_server
+
+        self.server = create_server(app, host='127.0.0.1', port=0, threads=threads)
+        self.port = self.server.effective_port
+        self.closed = False
+        self.thread = threading.Thread(target=self._serve, daemon=True)
+        self.thread.start()
+        self.local = threading.local()
+
+    def _serve(self):
+        try:
+            self.server.run()
+        except Exception:
+            # The loop fails on its closed sockets once close() has run
+            if not self.closed:
+                raise
+
+    def request(self, method, path, headers, body=None, content_type=None):
+        connection = getattr(self.local, 'connection', None)
+        if connection is None:
+            connection = self.local.connection = http.client.HTTPConnection('127.0.0.1', self.port, timeout=60)
+
+        headers = dict(headers)
+        if content_type:
+            headers['Content-Type'] = content_type
+        try:
+            connection.request(method, path, body=body, headers=headers)
+            response = connection.getresponse()
+            response.read()
+            return response.status
+        except (http.client.HTTPException, OSError):
+            connection.close()
+            self.local.connection = None
+            raise
+
+    def close(self):
+        self.closed = True
+        self.server.close()
+
+class WorkloadBuilder:
+    """Builds the next request for each workload"""
+
+    def __init__(self, uids, images):
+        self.uids = uids
+        self.images = images
+        now = datetime.utcnow().replace(microsecond=0)
+        # A handful of ranges, like a dashboard switching between views
+        self.ranges = [
+            (None, None),
+            ((now - timedelta(days=1)).isoformat(), now.isoformat()),
+            ((now - timedelta(days=7)).isoformat(), now.isoformat()),
+            ((now - timedelta(days=30)).isoformat(), now.isoformat())
+        ]
+
+    def build(self, workload, rng):
+        uid = rng.choice(self.uids)
+        headers = {'Authorization': f'Bearer {bench_token(uid)}'}
+
+        if workload == 'predict':
+            body, content_type = encode_multipart('image', 'meal.jpg', rng.choice(self.images))
+            return 'POST', '/api/v1/nutrients/predict-only', headers, body, content_type
+
+        if workload == 'save-meal':
+            body = json.dumps({
+                'nutrients': {'Calories': 420.5, 'Protein (g)': 22.1, 'Carbs (g)': 48.3, 'Fat (g)': 14.2},
+                'meal_name': 'Benchmark lunch',
+                'food_type': rng.choice(['breakfast', 'lunch', 'dinner', 'snacks']),
+                'notes': '',
+                'temp_image_public_id': f"temp_meals/bench_{uuid.uuid4().hex}"
+            }).encode('utf-8')
+            return 'POST', '/api/v1/nutrients/save-meal', headers, body, 'application/json'
+
+        if workload == 'meals':
+            return 'GET', '/api/v1/nutrients/meals?limit=20', headers, None, None
+
+        if workload == 'summary':
+            start_date, end_date = rng.choice(self.ranges)
+            query = '&'.join(f'{key}={value}' for key, value in (('start_date', start_date), ('end_date', end_date)) if value)
+            return 'GET', f'/api/v1/nutrients/nutrition-summary?{query}', headers, None, None
+
+        raise ValueError(f"Unknown workload: {workload}")
+
+def current_rss_mb():
+    """Resident set size from /proc (None where unavailable)"""
+    try:
+        with open('/proc/self/statm') as statm:
+            pages = int(statm.read().split()[1])
+        return round(pages * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024), 1)
+    except (OSError, ValueError, AttributeError):
+        return None
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    return round(peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024, 1)
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+def run_workload(transport, builder, workload, concurrency, total_requests, duration, warmup):
+    """Drive one workload and return its summary"""
+    warmup_rng = random.Random(0)
+    for _ in range(warmup):
+        transport.request(*builder.build(workload, warmup_rng))
+
+    latencies = []
+    statuses = {}
+    errors = [0]
+    lock = threading.Lock()
+    issued = [0]
+    deadline = time.perf_counter() + duration if duration else None
+
+    def next_slot():
+        with lock:
+            if deadline is not None:
+                return time.perf_counter() < deadline
+            if issued[0] >= total_requests:
+                return False
+            issued[0] += 1
+            return True
+
+    def worker(seed):
+        rng = random.Random(seed)
+        local_latencies = []
+        local_statuses = {}
+        local_errors = 0
+
+        while next_slot():
+            request_args = builder.build(workload, rng)
+            started_at = time.perf_counter()
+            try:
+                status = transport.request(*request_args)
+            except Exception:
+                status = 'exception'
+            local_latencies.append(time.perf_counter() - started_at)
+            local_statuses[status] = local_statuses.get(status, 0) + 1
+            if status == 'exception' or status >= 400:
+                local_errors += 1
+
+        with lock:
+            latencies.extend(local_latencies)
+            errors[0] += local_errors
+            for status, count in local_statuses.items():
+                statuses[str(status)] = statuses.get(str(status), 0) + count
+
+    rss_before = current_rss_mb()
+    started_at = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(seed,)) for seed in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started_at
+
+    latencies.sort()
+    return {
+        'workload': workload,
+        'concurrency': concurrency,
+        'requests': len(latencies),
+        'errors': errors[0],
+        'statuses': statuses,
+        'elapsed_s': round(elapsed, 3),
+        'throughput_rps': round(len(latencies) / elapsed, 2) if elapsed else 0,
+        'latency_ms': {
+            'mean': round(sum(latencies) / len(latencies) * 1000, 2) if latencies else 0,
+            'p50': round(percentile(latencies, 0.50) * 1000, 2),
+            'p95': round(percentile(latencies, 0.95) * 1000, 2),
+            'p99': round(percentile(latencies, 0.99) * 1000, 2),
+            'max': round(latencies[-1] * 1000, 2) if latencies else 0
+        },
+        'memory_mb': {
+            'rss_before': rss_before,
+            'rss_after': current_rss_mb(),
+            'peak_rss': peak_rss_mb()
+        }
+    }
+
+def print_results(results):
+    header = f"{'workload':<10} {'conc':>4} {'reqs':>6} {'errs':>5} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'rss MB':>8}"
+    print(header)
+    print('-' * len(header))
+    for result in results:
+        latency = result['latency_ms']
+        print(
+            f"{result['workload']:<10} {result['concurrency']:>4} {result['requests']:>6} {result['errors']:>5} "
+            f"{result['throughput_rps']:>9.2f} {latency['p50']:>9.2f} {latency['p95']:>9.2f} {latency['p99']:>9.2f} "
+            f"{result['memory_mb']['rss_after'] or 0:>8.1f}"
+        )
+
+def compare_with_baseline(results, baseline_path, max_regression):
+    """Return a list of regression messages against a saved run"""
+    with open(baseline_path) as baseline_file:
+        baseline = {result['workload']: result for result in json.load(baseline_file)['results']}
+
+    regressions = []
+    for result in results:
+        previous = baseline.get(result['workload'])
+        if not previous:
+            continue
+
+        if previous['latency_ms']['p95'] and result['latency_ms']['p95'] > previous['latency_ms']['p95'] * (1 + max_regression):
+            regressions.append(f"{result['workload']}: p95 {previous['latency_ms']['p95']}ms -> {result['latency_ms']['p95']}ms")
+        if previous['throughput_rps'] and result['throughput_rps'] < previous['throughput_rps'] * (1 - max_regression):
+            regressions.append(f"{result['workload']}: throughput {previous['throughput_rps']} -> {result['throughput_rps']} req/s")
+        if result['errors'] > previous['errors']:
+            regressions.append(f"{result['workload']}: errors {previous['errors']} -> {result['errors']}")
+
+    return regressions
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the GlycoFit backend against local stand-ins')
+    parser.add_argument('--workloads', default=','.join(WORKLOADS), help=f"Comma-separated subset of: {', '.join(WORKLOADS)}")
+    parser.add_argument('--concurrency', type=int, default=8, help='Concurrent client threads')
+    parser.add_argument('--requests', type=int, default=200, help='Requests per workload')
+    parser.add_argument('--duration', type=float, default=None, help='Run each workload for this many seconds instead of a fixed request count')
+    parser.add_argument('--warmup', type=int, default=5, help='Untimed requests per workload before measuring')
+    parser.add_argument('--users', type=int, default=20, help='Seeded users')
+    parser.add_argument('--meals-per-user', type=int, default=200, help='Seeded meals per user')
+    parser.add_argument('--images', type=int, default=64, help='Distinct images used by the predict workload')
+    parser.add_argument('--http', action='store_true', help='Serve through waitress over HTTP instead of the test client')
+    parser.add_argument('--server-threads', type=int, default=8, help='Waitress threads in --http mode')
+    parser.add_argument('--cloudinary-latency-ms', type=float, default=50, help='Simulated latency of each Cloudinary call')
+    parser.add_argument('--firebase-latency-ms', type=float, default=30, help='Simulated latency of each token verification')
+    parser.add_argument('--log-level', default='WARNING', help='Application log level during the run')
+    parser.add_argument('--output', help='Write results as JSON to this file')
+    parser.add_argument('--baseline', help='JSON results from a previous run to compare against')
+    parser.add_argument('--max-regression', type=float, default=0.2, help='Allowed relative p95/throughput regression against the baseline')
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    workloads = [workload.strip() for workload in args.workloads.split(',') if workload.strip()]
+    unknown = [workload for workload in workloads if workload not in WORKLOADS]
+    if unknown:
+        print(f"Unknown workloads: {', '.join(unknown)}", file=sys.stderr)
+        return 2
+
+    work_dir, fake_cloudinary = install_standins(
+        cloudinary_latency_ms=args.cloudinary_latency_ms,
+        firebase_latency_ms=args.firebase_latency_ms,
+        log_level=args.log_level
+    )
+
+    from app import create_app
+    app = create_app()
+
+    print(f"Seeding {args.users} users x {args.meals_per_user} meals...")
+    uids = seed_data(args.users, args.meals_per_user)
+    images = make_images(args.images) if 'predict' in workloads else []
+    builder = WorkloadBuilder(uids, images)
+
+    transport = HttpTransport(app, args.server_threads) if args.http else TestClientTransport(app)
+
+    results = []
+    try:
+        for workload in workloads:
+            print(f"Running {workload} (concurrency={args.concurrency})...")
+            results.append(run_workload(
+                transport, builder, workload,
+                concurrency=args.concurrency,
+                total_requests=args.requests,
+                duration=args.duration,
+                warmup=args.warmup
+            ))
+    finally:
+        if args.http:
+            transport.close()
+
+    print()
+    print_results(results)
+
+    report = {
+        'timestamp': datetime.utcnow().isoformat(),
+        'settings': vars(args),
+        'cloudinary_calls': fake_cloudinary.calls,
+        'results': results
+    }
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            json.dump(report, output_file, indent=2)
+        print(f"\nResults written to {args.output}")
+
+    if args.baseline:
+        regressions = compare_with_baseline(results, args.baseline, args.max_regression)
+        if regressions:
+            print('\nRegressions against baseline:')
+            for regression in regressions:
+                print(f"  {regression}")
+            return 1
+        print('\nNo regressions against baseline')
+
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
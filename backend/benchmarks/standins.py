@@ -0,0 +1,265 @@
+"""
+Local stand-ins for the external services the backend depends on
+
+install_standins() must run before create_app(). It swaps in:
+- mongomock for MongoDB
+- an in-process fake for the Cloudinary SDK calls used by CloudinaryService
+- a stub for Firebase ID token verification
+- a NutrientPredictor with random (untrained) weights
+- a local SMTP sink for outgoing email
+
+Everything above those calls (controllers, caches, batcher, executors,
+logging, metrics) is the real application code.
+"""
+from datetime import datetime, timedelta
+import socketserver
+import threading
+import tempfile
+import random
+import uuid
+import time
+import os
+
+TOKEN_PREFIX = 'bench:'
+
+def bench_token(uid):
+    """Authorization token accepted by the Firebase stub for a seeded user"""
+    return f"{TOKEN_PREFIX}{uid}"
+
+class FakeCloudinary:
+    """Replaces cloudinary.uploader/api calls with local, configurable-latency fakes"""
+
+    def __init__(self, latency_ms=0):
+        self.latency = latency_ms / 1000.0
+        self.calls = {'upload': 0, 'destroy': 0, 'rename': 0}
+
+    def _wait(self):
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _resource(self, public_id, size=0):
+        return {
+            'public_id': public_id,
+            'secure_url': f"https://res.cloudinary.test/image/upload/{public_id}.jpg",
+            'width': 800,
+            'height': 600,
+            'format': 'jpg',
+            'bytes': size
+        }
+
+    def upload(self, file, **options):
+        self.calls['upload'] += 1
+        size = len(file) if isinstance(file, (bytes, bytearray)) else 0
+        if hasattr(file, 'read'):
+            size = len(file.read())
+        self._wait()
+
+        public_id = options.get('public_id') or uuid.uuid4().hex
+        if options.get('folder'):
+            public_id = f"{options['folder']}/{public_id}"
+        return self._resource(public_id, size)
+
+    def destroy(self, public_id, **options):
+        self.calls['destroy'] += 1
+        self._wait()
+        return {'result': 'ok'}
+
+    def rename(self, from_public_id, to_public_id, **options):
+        self.calls['rename'] += 1
+        self._wait()
+        return self._resource(to_public_id)
+
+    def ping(self, **options):
+        return {'status': 'ok'}
+
+    def resource(self, public_id, **options):
+        return self._resource(public_id)
+
+    def install(self):
+        import cloudinary.uploader
+        import cloudinary.api
+
+        cloudinary.uploader.upload = self.upload
+        cloudinary.uploader.destroy = self.destroy
+        cloudinary.uploader.rename = self.rename
+        cloudinary.api.ping = self.ping
+        cloudinary.api.resource = self.resource
+
+class _SmtpSinkHandler(socketserver.StreamRequestHandler):
+    """Minimal SMTP dialogue: accepts every message and keeps it in memory"""
+
+    def reply(self, line):
+        self.wfile.write(f"{line}\r\n".encode('ascii'))
+
+    def handle(self):
+        sink = self.server.sink
+        sink.connections += 1
+        self.reply('220 sink ESMTP')
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode('utf-8', 'replace').strip()
+            verb = command.split(' ', 1)[0].upper()
+
+            if verb in ('EHLO', 'HELO'):
+                self.reply('250 sink')
+            elif verb in ('MAIL', 'RCPT', 'RSET', 'NOOP'):
+                self.reply('250 OK')
+            elif verb == 'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                lines = []
+                for data_line in self.rfile:
+                    if data_line in (b'.\r\n', b'.\n'):
+                        break
+                    lines.append(data_line)
+                if sink.latency:
+                    time.sleep(sink.latency)
+                sink.messages.append(b''.join(lines))
+                self.reply('250 OK')
+            elif verb == 'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                self.reply('502 Command not implemented')
+
+class SmtpSink:
+    """Local SMTP server that accepts and stores every message (no TLS, no auth)"""
+
+    def __init__(self, latency_ms=0):
+        self.latency = latency_ms / 1000.0
+        self.messages = []
+        self.connections = 0
+        self.server = socketserver.ThreadingTCPServer(('127.0.0.1', 0), _SmtpSinkHandler)
+        self.server.daemon_threads = True
+        self.server.sink = self
+        self.port = self.server.server_address[1]
+
+    def install(self):
+        """Start serving and point the mail settings at the sink"""
+        threading.Thread(target=self.server.serve_forever, name='smtp-sink', daemon=True).start()
+        os.environ['SMTP_HOST'] = '127.0.0.1'
+        os.environ['SMTP_PORT'] = str(self.port)
+        os.environ['SMTP_USE_SSL'] = 'false'
+        os.environ['SMTP_EMAIL'] = 'bench@example.com'
+        os.environ['SMTP_PASSWORD'] = ''
+
+def install_firebase_stub(latency_ms=0):
+    """Accept tokens of the form 'bench:<uid>' instead of verifying with Google"""
+    import middleware.firebase_auth as firebase_auth
+    import config.firebase_admin as firebase_admin
+
+    latency = latency_ms / 1000.0
+
+    def verify_token(id_token):
+        if latency:
+            time.sleep(latency)
+        if not id_token.startswith(TOKEN_PREFIX):
+            raise ValueError('Invalid benchmark token')
+        now = int(time.time())
+        return {'uid': id_token[len(TOKEN_PREFIX):], 'iat': now, 'exp': now + 3600}
+
+    firebase_auth.verify_firebase_token = verify_token
+    firebase_admin.verify_firebase_token = verify_token
+    firebase_admin.init_firebase = lambda: None
+
+def install_dummy_model(work_dir):
+    """Write random NutrientPredictor weights and point ML_MODEL_PATH at them"""
+    import torch
+    import services.ml_service as ml_service
+
+    model_path = os.path.join(work_dir, 'nutrient_predictor_model.pth')
+    torch.manual_seed(0)
+    torch.save(ml_service.NutrientPredictor().state_dict(), model_path)
+    os.environ['ML_MODEL_PATH'] = model_path
+    # Ignore any exported artifact lying around in the backend directory
+    os.environ['ML_MODEL_ARTIFACT'] = 'none'
+
+def install_mongomock():
+    import mongomock
+    import config.database as database
+
+    database.MongoClient = mongomock.MongoClient
+    # Explain output from mongomock does not resemble a real query plan
+    os.environ['DB_CHECK_QUERY_PLANS'] = 'false'
+
+def install_standins(cloudinary_latency_ms=0, firebase_latency_ms=0, log_level='WARNING'):
+    """
+    Configure the environment and patch external services
+
+    Returns:
+        Tuple of (work_dir, fake_cloudinary)
+    """
+    work_dir = tempfile.mkdtemp(prefix='glycofit-bench-')
+
+    os.environ['DB_URI'] = 'mongodb://localhost:27017/glycofit_bench'
+    os.environ['LOG_LEVEL'] = log_level
+    os.environ['LOG_FILE'] = os.path.join(work_dir, 'app.log')
+    os.environ.setdefault('CLOUDINARY_CLOUD_NAME', 'bench')
+    # Measure raw capacity by default; set it to true to measure load shedding
+    os.environ.setdefault('INFERENCE_ADMISSION_ENABLED', 'false')
+    os.environ['NOTIFICATION_BACKEND'] = 'fake'
+
+    install_mongomock()
+    install_firebase_stub(firebase_latency_ms)
+    install_dummy_model(work_dir)
+
+    fake_cloudinary = FakeCloudinary(cloudinary_latency_ms)
+    fake_cloudinary.install()
+
+    SmtpSink().install()
+
+    return work_dir, fake_cloudinary
+
+def seed_data(num_users, meals_per_user, days=30):
+    """
+    Create benchmark users and meal history
+
+    Returns:
+        List of seeded Firebase UIDs
+    """
+    from config.database import get_db
+    from models.user import User
+    from models.user_meal import UserMeal
+    from models.daily_nutrition import DailyNutrition
+
+    db = get_db()
+    rng = random.Random(42)
+    now = datetime.utcnow()
+    uids = []
+
+    for index in range(num_users):
+        uid = f"bench-user-{index}"
+        user = User(uid, 'Bench', f"User {index}", f"bench{index}@example.com")
+        user.save()
+        uids.append(uid)
+
+        meals = []
+        for _ in range(meals_per_user):
+            meal = UserMeal(
+                user_id=user._id,
+                nutrients={
+                    'Calories': round(rng.uniform(80, 900), 2),
+                    'Protein (g)': round(rng.uniform(1, 60), 2),
+                    'Carbs (g)': round(rng.uniform(5, 120), 2),
+                    'Fat (g)': round(rng.uniform(1, 50), 2)
+                },
+                meal_name='Benchmark meal',
+                food_type=rng.choice(UserMeal.VALID_MEAL_TYPES)
+            ).to_dict()
+            meal['meal_datetime'] = now - timedelta(minutes=rng.randint(0, days * 24 * 60))
+            meals.append(meal)
+
+        if meals:
+            db.user_meals.insert_many(meals)
+            for meal in meals:
+                DailyNutrition.apply_meal(meal, 1)
+
+    # Rollups were maintained while seeding, so they are complete
+    db.rollup_meta.update_one(
+        {'_id': DailyNutrition.META_ID},
+        {'$set': {'backfilled_at': datetime.utcnow()}},
+        upsert=True
+    )
+
+    return uids
@@ -1,6 +1,8 @@
-from pymongo import MongoClient
+from pymongo import MongoClient, ASCENDING, DESCENDING
 from flask import current_app
+from middleware.metrics_middleware import MongoCommandMetrics, metrics_enabled
 import logging
+import os
 
 # Global database connection
 db = None
@@ -14,7 +16,9 @@ def init_db(app):
         mongodb_uri = app.config['DB_URI']
         logging.info(f"Connecting to MongoDB: {mongodb_uri.split('@')[-1] if '@' in mongodb_uri else mongodb_uri}")
         
-        client = MongoClient(mongodb_uri)
+        # Time every command for the 'mongo' phase metrics
+        event_listeners = [MongoCommandMetrics()] if metrics_enabled() else []
+        client = MongoClient(mongodb_uri, event_listeners=event_listeners)
         
         # Extract database name from URI or use default
         if mongodb_uri.endswith('/'):
@@ -31,6 +35,10 @@ def init_db(app):
         # Create indexes for better performance
         create_indexes()
         
+        # Make sure the hot query shapes are actually served by those indexes
+        if os.getenv('DB_CHECK_QUERY_PLANS', 'true').lower() == 'true':
+            check_query_plans()
+        
     except Exception as e:
         logging.error(f"Failed to connect to MongoDB: {str(e)}")
         raise e
@@ -41,12 +49,88 @@ def create_indexes():
         # User collection indexes
         db.users.create_index("email", unique=True)
         db.users.create_index("uid", unique=True)  # Firebase UID should be unique
+        # Multikey index so dead push tokens can be pruned without a collection scan
+        db.users.create_index("push_tokens")
+        
+        # Meal collection indexes: every UserMeal query filters on user_id and
+        # sorts newest first (with _id as the keyset pagination tie-breaker);
+        # the food type listing also filters on food_type
+        db.user_meals.create_index(
+            [('user_id', ASCENDING), ('meal_datetime', DESCENDING), ('_id', DESCENDING)],
+            name='user_id_meal_datetime_id'
+        )
+        db.user_meals.create_index(
+            [('user_id', ASCENDING), ('food_type', ASCENDING), ('meal_datetime', DESCENDING), ('_id', DESCENDING)],
+            name='user_id_food_type_meal_datetime_id'
+        )
+        
+        # Daily nutrition rollups: one document per user, day and food type
+        db.user_daily_nutrition.create_index(
+            [('user_id', ASCENDING), ('day', ASCENDING), ('food_type', ASCENDING)],
+            unique=True,
+            name='user_id_day_food_type'
+        )
+        
+        # OTP codes (OTP_STORE_BACKEND=mongo): MongoDB deletes each code once
+        # its expires_at has passed
+        db.otp_codes.create_index('expires_at', expireAfterSeconds=0, name='expires_at_ttl')
+        
+        # User info collection indexes
+        db.user_info.create_index("user_id")
         
         logging.info("Database indexes created successfully")
         
     except Exception as e:
         logging.warning(f"Error creating indexes: {str(e)}")
 
+def _find_plan_stages(plan, stages=None):
+    """Collect every stage name in an explain() plan tree"""
+    if stages is None:
+        stages = []
+    
+    if isinstance(plan, dict):
+        if 'stage' in plan:
+            stages.append(plan['stage'])
+        for key in ('inputStage', 'queryPlan'):
+            if key in plan:
+                _find_plan_stages(plan[key], stages)
+        for child in plan.get('inputStages', []):
+            _find_plan_stages(child, stages)
+    
+    return stages
+
+def check_query_plans():
+    """Report UserMeal query shapes that the planner would answer with a collection scan"""
+    # Imported here because the models depend on this module
+    from models.user_meal import UserMeal
+    
+    collection_scans = []
+    
+    for name, query, sort in UserMeal.query_shapes():
+        try:
+            cursor = db.user_meals.find(query)
+            if sort:
+                cursor = cursor.sort(sort)
+            explain = cursor.limit(1).explain()
+            winning_plan = explain.get('queryPlanner', {}).get('winningPlan', {})
+            stages = _find_plan_stages(winning_plan)
+            
+            if 'COLLSCAN' in stages:
+                collection_scans.append(name)
+                logging.warning(f"Query shape '{name}' on user_meals falls back to a collection scan: {stages}")
+            else:
+                logging.debug(f"Query shape '{name}' on user_meals uses plan: {stages}")
+                
+        except Exception as e:
+            logging.warning(f"Could not explain query shape '{name}': {str(e)}")
+    
+    if collection_scans:
+        logging.warning(f"{len(collection_scans)} user_meals query shape(s) are not covered by an index: {', '.join(collection_scans)}")
+    else:
+        logging.info("All user_meals query shapes are served by indexes")
+    
+    return collection_scans
+
 def get_db():
     """Get database connection"""
     global db
@@ -3,6 +3,7 @@ from firebase_admin import credentials, auth, messaging
 import os
 import logging
 import json
+from middleware.metrics_middleware import time_phase
 
 # Global Firebase app instance
 firebase_app = None
@@ -62,7 +63,8 @@ class FirebaseAuth:
         """Verify Firebase ID token"""
         try:
             get_firebase_app()  # Ensure Firebase is initialized
-            decoded_token = auth.verify_id_token(id_token)
+            with time_phase('firebase', 'verify_id_token'):
+                decoded_token = auth.verify_id_token(id_token)
             logging.info(f"Token verified for user: {decoded_token.get('uid')}")
             return decoded_token
         except Exception as e:
@@ -180,22 +182,15 @@ class FirebaseMessaging:
     
     @staticmethod
     def send_multicast_notification(tokens, title, body, data=None):
-        """Send push notification to multiple devices"""
+        """
+        Send push notification to multiple devices
+
+        Any number of tokens; see NotificationDispatcher.send for the chunking,
+        the returned summary and the pruning of invalid tokens.
+        """
         try:
-            get_firebase_app()  # Ensure Firebase is initialized
-            
-            message = messaging.MulticastMessage(
-                notification=messaging.Notification(
-                    title=title,
-                    body=body
-                ),
-                data=data or {},
-                tokens=tokens
-            )
-            
-            response = messaging.send_multicast(message)
-            logging.info(f"Multicast notification sent: {response.success_count} successful, {response.failure_count} failed")
-            return response
+            from services.notification_service import get_notification_dispatcher
+            return get_notification_dispatcher().send(tokens, title, body, data)
             
         except Exception as e:
             logging.error(f"Failed to send multicast notification: {str(e)}")
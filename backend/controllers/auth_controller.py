@@ -7,8 +7,6 @@ from middleware.firebase_auth import firebase_auth_required, firebase_admin_requ
 from middleware.logging_middleware import log_database_operation, log_authentication_attempt, log_error
 import logging
 from datetime import datetime
-import os
-import tempfile
 
 class AuthController:
     
@@ -176,34 +174,10 @@ class AuthController:
                             'errors': ['Unsupported file type! Please upload a JPEG, JPG, or PNG image.']
                         }), 400
                     
-                    # Save temporarily and upload to Cloudinary
-                    temp_file_path = None
-                    try:
-                        with tempfile.NamedTemporaryFile(delete=False, suffix='.jpg') as temp_file:
-                            temp_file_path = temp_file.name
-                            avatar_file.save(temp_file_path)
-                        
-                        # Upload to Cloudinary with specific folder and dimensions
-                        upload_result = CloudinaryService.upload_avatar(temp_file_path, uid)
-                        avatar = upload_result
-                        
-                    finally:
-                        # Clean up temp file with error handling
-                        if temp_file_path and os.path.exists(temp_file_path):
-                            try:
-                                os.unlink(temp_file_path)
-                            except PermissionError:
-                                # On Windows, file might still be locked, try again after a brief delay
-                                import time
-                                time.sleep(0.1)
-                                try:
-                                    os.unlink(temp_file_path)
-                                except Exception:
-                                    # If we still can't delete it, log a warning but don't fail the request
-                                    logging.warning(f"Could not delete temporary file: {temp_file_path}")
-                            except Exception as e:
-                                logging.warning(f"Error deleting temporary file: {str(e)}")
-                        
+                    # Upload the in-memory file to Cloudinary with specific folder and dimensions
+                    upload_result = CloudinaryService.upload_avatar(avatar_file.read(), uid)
+                    avatar = upload_result
+                    
                 except Exception as e:
                     logging.warning(f"Avatar upload failed: {str(e)}")
                     return jsonify({
@@ -385,38 +359,16 @@ class AuthController:
             if 'avatar' in files:
                 try:
                     avatar_file = files['avatar']
-                    temp_file_path = None
-                    try:
-                        with tempfile.NamedTemporaryFile(delete=False, suffix='.jpg') as temp_file:
-                            temp_file_path = temp_file.name
-                            avatar_file.save(temp_file_path)
-                        
-                        # Upload new avatar (will delete old one)
-                        old_public_id = current_user.avatar.get('public_id') if current_user.avatar else None
-                        upload_result = CloudinaryService.upload_avatar(
-                            temp_file_path, 
-                            current_user.uid, 
-                            old_public_id
-                        )
-                        update_data['avatar'] = upload_result
-                        
-                    finally:
-                        # Clean up temp file with error handling
-                        if temp_file_path and os.path.exists(temp_file_path):
-                            try:
-                                os.unlink(temp_file_path)
-                            except PermissionError:
-                                # On Windows, file might still be locked, try again after a brief delay
-                                import time
-                                time.sleep(0.1)
-                                try:
-                                    os.unlink(temp_file_path)
-                                except Exception:
-                                    # If we still can't delete it, log a warning but don't fail the request
-                                    logging.warning(f"Could not delete temporary file: {temp_file_path}")
-                            except Exception as e:
-                                logging.warning(f"Error deleting temporary file: {str(e)}")
-                        
+                    
+                    # Upload new avatar straight from memory (will delete old one)
+                    old_public_id = current_user.avatar.get('public_id') if current_user.avatar else None
+                    upload_result = CloudinaryService.upload_avatar(
+                        avatar_file.read(), 
+                        current_user.uid, 
+                        old_public_id
+                    )
+                    update_data['avatar'] = upload_result
+                    
                 except Exception as e:
                     logging.warning(f"Avatar update failed: {str(e)}")
                     return jsonify({'error': 'Failed to update avatar'}), 500
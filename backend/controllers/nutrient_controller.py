@@ -1,14 +1,17 @@
 from flask import request, jsonify
 import logging
-import tempfile
+import time
 import os
+from concurrent.futures import TimeoutError as FutureTimeoutError
 from services.ml_service import get_ml_service
-from services.cloudinary_service import CloudinaryService
+from services.cloudinary_service import CloudinaryService, get_upload_timeout
 from models.user_meal import UserMeal
 from middleware.firebase_auth import firebase_auth_required, get_current_user_id
+from middleware.admission_control import inference_admission_required, get_admission_stats
 
 class NutrientController:
     @staticmethod
+    @inference_admission_required
     def predict_nutrients_only():
         """
         Predict nutrients from uploaded food image (without saving to database)
@@ -53,7 +56,7 @@ class NutrientController:
                     'error': 'File too large. Maximum size is 10MB'
                 }), 413
             
-            # Step 1: Get ML service and make prediction
+            # Step 1: Make sure the model can take the request before starting any upload
             try:
                 ml_service = get_ml_service()
                 if not ml_service.is_model_ready():
@@ -61,19 +64,6 @@ class NutrientController:
                         'success': False,
                         'error': 'ML model not ready'
                     }), 503
-                
-                # Predict nutrients
-                prediction_result = ml_service.predict_nutrients(image_data)
-                
-                if not prediction_result['success']:
-                    logging.error(f"ML prediction failed: {prediction_result.get('error', 'Unknown error')}")
-                    return jsonify({
-                        'success': False,
-                        'error': f"Prediction failed: {prediction_result.get('error', 'Unknown error')}"
-                    }), 500
-                
-                nutrients = prediction_result['nutrients']
-                
             except Exception as ml_error:
                 logging.error(f"ML service error: {str(ml_error)}")
                 return jsonify({
@@ -81,19 +71,15 @@ class NutrientController:
                     'error': 'ML service unavailable'
                 }), 503
             
-            # Step 2: Upload image to Cloudinary (to temp folder for preview)
-            image_url = None
-            image_public_id = None
+            # Step 2: Start the Cloudinary upload (temp folder for preview) in the
+            # background so it overlaps with inference
+            upload_future = None
+            upload_deadline = time.monotonic() + get_upload_timeout()
             
             try:
-                # Create a temporary file for Cloudinary upload
-                with tempfile.NamedTemporaryFile(delete=False, suffix=f".{image_file.filename.split('.')[-1]}") as temp_file:
-                    temp_file.write(image_data)
-                    temp_file_path = temp_file.name
-                
-                # Upload to Cloudinary in temp folder
-                upload_result = CloudinaryService.upload_image(
-                    file_path=temp_file_path,
+                # Upload the already-read bytes to Cloudinary in temp folder
+                upload_future = CloudinaryService.upload_image_async(
+                    file=image_data,
                     folder='temp_meals',  # Temporary folder
                     public_id=f"temp_meal_{int(__import__('time').time())}_{__import__('random').randint(1000, 9999)}",
                     transformation=[
@@ -102,21 +88,54 @@ class NutrientController:
                     ]
                 )
                 
-                # Clean up temporary file
-                os.unlink(temp_file_path)
-                
-                if upload_result['success']:
-                    image_url = upload_result['url']
-                    image_public_id = upload_result['public_id']
-                    logging.info(f"Temp image uploaded to Cloudinary successfully: {image_public_id}")
-                else:
-                    logging.warning(f"Failed to upload image to Cloudinary: {upload_result.get('error')}")
-                    # Continue without image upload - we still have the prediction
-                
             except Exception as upload_error:
-                logging.error(f"Error uploading image to Cloudinary: {str(upload_error)}")
+                logging.error(f"Error starting Cloudinary upload: {str(upload_error)}")
                 # Continue without image upload - we still have the prediction
             
+            # Step 3: Predict nutrients while the upload is in flight
+            try:
+                prediction_result = ml_service.predict_nutrients(image_data)
+            except Exception as ml_error:
+                logging.error(f"ML service error: {str(ml_error)}")
+                CloudinaryService.discard_upload(upload_future)
+                return jsonify({
+                    'success': False,
+                    'error': 'ML service unavailable'
+                }), 503
+            
+            if not prediction_result['success']:
+                logging.error(f"ML prediction failed: {prediction_result.get('error', 'Unknown error')}")
+                CloudinaryService.discard_upload(upload_future)
+                return jsonify({
+                    'success': False,
+                    'error': f"Prediction failed: {prediction_result.get('error', 'Unknown error')}"
+                }), 500
+            
+            nutrients = prediction_result['nutrients']
+            
+            # Step 4: Join the upload, never holding the worker longer than the upload timeout
+            image_url = None
+            image_public_id = None
+            
+            if upload_future is not None:
+                try:
+                    upload_result = upload_future.result(timeout=max(0, upload_deadline - time.monotonic()))
+                    
+                    if upload_result['success']:
+                        image_url = upload_result['url']
+                        image_public_id = upload_result['public_id']
+                        logging.info(f"Temp image uploaded to Cloudinary successfully: {image_public_id}")
+                    else:
+                        logging.warning(f"Failed to upload image to Cloudinary: {upload_result.get('error')}")
+                        # Continue without image upload - we still have the prediction
+                    
+                except FutureTimeoutError:
+                    logging.warning("Cloudinary upload timed out, returning prediction without image")
+                    CloudinaryService.discard_upload(upload_future)
+                except Exception as upload_error:
+                    logging.error(f"Error uploading image to Cloudinary: {str(upload_error)}")
+                    # Continue without image upload - we still have the prediction
+            
             # Return prediction results for user to edit
             return jsonify({
                 'success': True,
@@ -137,6 +156,179 @@ class NutrientController:
                 'error': 'Internal server error'
             }), 500
 
+    @staticmethod
+    @inference_admission_required
+    def predict_nutrients_batch():
+        """
+        Predict nutrients for several food images in one request (without saving)
+        
+        Expected request:
+        - Multipart form data with one or more 'images' files
+        
+        Returns:
+        - JSON response with per-image predictions and temporary image URLs,
+          plus the total across the images that succeeded. An invalid or
+          undecodable image is reported in its own entry without failing
+          the others.
+        """
+        try:
+            image_files = request.files.getlist('images')
+            if not image_files:
+                return jsonify({
+                    'success': False,
+                    'error': 'No image files provided'
+                }), 400
+            
+            max_images = int(os.getenv('ML_PREDICT_BATCH_MAX_IMAGES', 8))
+            if len(image_files) > max_images:
+                return jsonify({
+                    'success': False,
+                    'error': f'Too many images. Maximum is {max_images} per request'
+                }), 400
+            
+            # Validate each file on its own so one bad file doesn't fail the batch
+            allowed_extensions = {'png', 'jpg', 'jpeg', 'gif', 'bmp', 'webp'}
+            max_size = 10 * 1024 * 1024  # 10MB
+            entries = []
+            for index, image_file in enumerate(image_files):
+                entry = {'index': index, 'filename': image_file.filename}
+                entries.append(entry)
+                
+                if image_file.filename == '':
+                    entry['error'] = 'No image file selected'
+                elif not image_file.filename.lower().split('.')[-1] in allowed_extensions:
+                    entry['error'] = 'Invalid file type. Allowed types: png, jpg, jpeg, gif, bmp, webp'
+                else:
+                    image_data = image_file.read()
+                    if len(image_data) > max_size:
+                        entry['error'] = 'File too large. Maximum size is 10MB'
+                    else:
+                        entry['image_data'] = image_data
+            
+            valid_entries = [entry for entry in entries if 'image_data' in entry]
+            
+            # Make sure the model can take the request before starting any upload
+            if valid_entries:
+                try:
+                    ml_service = get_ml_service()
+                    if not ml_service.is_model_ready():
+                        return jsonify({
+                            'success': False,
+                            'error': 'ML model not ready'
+                        }), 503
+                except Exception as ml_error:
+                    logging.error(f"ML service error: {str(ml_error)}")
+                    return jsonify({
+                        'success': False,
+                        'error': 'ML service unavailable'
+                    }), 503
+            
+            # Start every temp upload in the background so they overlap with
+            # each other and with inference
+            upload_deadline = time.monotonic() + get_upload_timeout()
+            batch_id = f"{int(time.time())}_{__import__('random').randint(1000, 9999)}"
+            for entry in valid_entries:
+                entry['upload_future'] = None
+                try:
+                    entry['upload_future'] = CloudinaryService.upload_image_async(
+                        file=entry['image_data'],
+                        folder='temp_meals',  # Temporary folder
+                        public_id=f"temp_meal_{batch_id}_{entry['index']}",
+                        transformation=[
+                            {'width': 800, 'height': 600, 'crop': 'limit'},
+                            {'quality': 'auto', 'fetch_format': 'auto'}
+                        ]
+                    )
+                except Exception as upload_error:
+                    logging.error(f"Error starting Cloudinary upload: {str(upload_error)}")
+            
+            # Decode in parallel and run one batched forward pass
+            if valid_entries:
+                try:
+                    predictions = ml_service.predict_nutrients_batch([entry['image_data'] for entry in valid_entries])
+                except Exception as ml_error:
+                    logging.error(f"ML service error: {str(ml_error)}")
+                    for entry in valid_entries:
+                        CloudinaryService.discard_upload(entry['upload_future'])
+                    return jsonify({
+                        'success': False,
+                        'error': 'ML service unavailable'
+                    }), 503
+                
+                for entry, prediction in zip(valid_entries, predictions):
+                    if prediction['success']:
+                        entry['nutrients'] = prediction['nutrients']
+                    else:
+                        entry['error'] = f"Prediction failed: {prediction.get('error', 'Unknown error')}"
+                        CloudinaryService.discard_upload(entry['upload_future'])
+            
+            # Join the uploads, never holding the worker longer than the upload timeout
+            for entry in valid_entries:
+                upload_future = entry['upload_future']
+                if upload_future is None or 'nutrients' not in entry:
+                    continue
+                try:
+                    upload_result = upload_future.result(timeout=max(0, upload_deadline - time.monotonic()))
+                    if upload_result['success']:
+                        entry['temp_image_url'] = upload_result['url']
+                        entry['temp_image_public_id'] = upload_result['public_id']
+                    else:
+                        logging.warning(f"Failed to upload image to Cloudinary: {upload_result.get('error')}")
+                except FutureTimeoutError:
+                    logging.warning("Cloudinary upload timed out, returning prediction without image")
+                    CloudinaryService.discard_upload(upload_future)
+                except Exception as upload_error:
+                    logging.error(f"Error uploading image to Cloudinary: {str(upload_error)}")
+            
+            images = []
+            total_nutrients = {}
+            for entry in entries:
+                if 'nutrients' in entry:
+                    for name, value in entry['nutrients'].items():
+                        total_nutrients[name] = round(total_nutrients.get(name, 0) + value, 2)
+                    images.append({
+                        'index': entry['index'],
+                        'filename': entry['filename'],
+                        'success': True,
+                        'nutrients': entry['nutrients'],
+                        'temp_image_url': entry.get('temp_image_url'),
+                        'temp_image_public_id': entry.get('temp_image_public_id')
+                    })
+                else:
+                    images.append({
+                        'index': entry['index'],
+                        'filename': entry['filename'],
+                        'success': False,
+                        'error': entry['error']
+                    })
+            
+            predicted_count = sum(1 for image in images if image['success'])
+            if predicted_count == 0:
+                return jsonify({
+                    'success': False,
+                    'error': 'No image could be processed',
+                    'data': {'images': images}
+                }), 400
+            
+            return jsonify({
+                'success': True,
+                'message': f'Nutrient prediction completed for {predicted_count} of {len(images)} images',
+                'data': {
+                    'images': images,
+                    'total_nutrients': total_nutrients,
+                    'predicted_count': predicted_count,
+                    'failed_count': len(images) - predicted_count,
+                    'valid_food_types': UserMeal.VALID_MEAL_TYPES
+                }
+            }), 200
+            
+        except Exception as e:
+            logging.error(f"Error in batch nutrient prediction endpoint: {str(e)}")
+            return jsonify({
+                'success': False,
+                'error': 'Internal server error'
+            }), 500
+
     @staticmethod
     @firebase_auth_required
     def save_meal():
@@ -190,37 +382,53 @@ class NutrientController:
             image_public_id = None
             
             if temp_image_public_id:
-                try:
-                    # Get the temp image URL first
-                    temp_image_url = f"https://res.cloudinary.com/{os.getenv('CLOUDINARY_CLOUD_NAME')}/image/upload/{temp_image_public_id}"
-                    
-                    # Upload to permanent location
-                    upload_result = CloudinaryService.upload_image(
-                        file_path=temp_image_url,  # Can upload from URL
-                        folder='user_meals',
-                        public_id=f"meal_{user_id}_{int(__import__('time').time())}",
-                        transformation=[
-                            {'width': 800, 'height': 600, 'crop': 'limit'},
-                            {'quality': 'auto', 'fetch_format': 'auto'}
-                        ]
+                # Preferred path: relocate the temp image server-side, no re-encode
+                if temp_image_public_id.startswith('temp_meals/'):
+                    move_result = CloudinaryService.move_image(
+                        temp_image_public_id,
+                        f"user_meals/meal_{user_id}_{int(time.time())}"
                     )
                     
-                    if upload_result['success']:
-                        image_url = upload_result['url']
-                        image_public_id = upload_result['public_id']
+                    if move_result['success']:
+                        image_url = move_result['url']
+                        image_public_id = move_result['public_id']
                         logging.info(f"Image moved to permanent location: {image_public_id}")
-                        
-                        # Delete temp image
-                        try:
-                            CloudinaryService.delete_image(temp_image_public_id)
-                            logging.info(f"Temp image deleted: {temp_image_public_id}")
-                        except Exception as delete_error:
-                            logging.warning(f"Failed to delete temp image: {str(delete_error)}")
                     else:
-                        logging.warning(f"Failed to move image to permanent location: {upload_result.get('error')}")
+                        logging.warning(f"Server-side move failed, falling back to re-upload: {move_result.get('error')}")
+                
+                # Fallback: have Cloudinary fetch the temp image and upload a permanent copy
+                if image_public_id is None:
+                    try:
+                        # Get the temp image URL first
+                        temp_image_url = f"https://res.cloudinary.com/{os.getenv('CLOUDINARY_CLOUD_NAME')}/image/upload/{temp_image_public_id}"
+                        
+                        # Upload to permanent location
+                        upload_result = CloudinaryService.upload_image(
+                            file=temp_image_url,  # Can upload from URL
+                            folder='user_meals',
+                            public_id=f"meal_{user_id}_{int(time.time())}",
+                            transformation=[
+                                {'width': 800, 'height': 600, 'crop': 'limit'},
+                                {'quality': 'auto', 'fetch_format': 'auto'}
+                            ]
+                        )
                         
-                except Exception as move_error:
-                    logging.error(f"Error moving image to permanent location: {str(move_error)}")
+                        if upload_result['success']:
+                            image_url = upload_result['url']
+                            image_public_id = upload_result['public_id']
+                            logging.info(f"Image copied to permanent location: {image_public_id}")
+                            
+                            # Delete temp image
+                            try:
+                                CloudinaryService.delete_image(temp_image_public_id)
+                                logging.info(f"Temp image deleted: {temp_image_public_id}")
+                            except Exception as delete_error:
+                                logging.warning(f"Failed to delete temp image: {str(delete_error)}")
+                        else:
+                            logging.warning(f"Failed to move image to permanent location: {upload_result.get('error')}")
+                            
+                    except Exception as move_error:
+                        logging.error(f"Error moving image to permanent location: {str(move_error)}")
             
             # Step 2: Save meal record to database
             try:
@@ -285,7 +493,12 @@ class NutrientController:
             return jsonify({
                 'success': True,
                 'model_ready': is_ready,
-                'message': 'Model is ready' if is_ready else 'Model not ready'
+                'message': 'Model is ready' if is_ready else 'Model not ready',
+                'inference_mode': ml_service.inference_mode,
+                'batching': ml_service.get_batching_stats(),
+                'inference_pool': ml_service.get_pool_stats(),
+                'admission': get_admission_stats(),
+                'prediction_cache': ml_service.get_cache_stats()
             }), 200
             
         except Exception as e:
@@ -305,6 +518,8 @@ class NutrientController:
         Query parameters:
         - limit: Number of meals to return (default: 50)
         - offset: Number of meals to skip (default: 0)
+        - cursor: Keyset pagination cursor; pass it empty for the first page,
+          then the returned next_cursor (takes precedence over offset)
         - start_date: Filter meals from this date (ISO format)
         - end_date: Filter meals until this date (ISO format)
         
@@ -317,30 +532,41 @@ class NutrientController:
             # Get query parameters
             limit = int(request.args.get('limit', 50))
             offset = int(request.args.get('offset', 0))
+            cursor = request.args.get('cursor')
             start_date = request.args.get('start_date')
             end_date = request.args.get('end_date')
             
             # Validate limits
             limit = min(limit, 100)  # Max 100 meals per request
             
+            # Reject malformed cursors up front (raises ValueError)
+            if cursor:
+                UserMeal.decode_cursor(cursor)
+            
             result = UserMeal.get_user_meals(
                 user_id=user_id,
                 limit=limit,
                 offset=offset,
                 start_date=start_date,
-                end_date=end_date
+                end_date=end_date,
+                cursor=cursor
             )
             
             if result['success']:
+                data = {
+                    'meals': result['meals'],
+                    'count': result['count'],
+                    'limit': limit
+                }
+                if cursor is None:
+                    data['offset'] = offset
+                else:
+                    data['next_cursor'] = result['next_cursor']
+                
                 return jsonify({
                     'success': True,
                     'message': 'Meals retrieved successfully',
-                    'data': {
-                        'meals': result['meals'],
-                        'count': result['count'],
-                        'limit': limit,
-                        'offset': offset
-                    }
+                    'data': data
                 }), 200
             else:
                 return jsonify({
@@ -552,6 +778,8 @@ class NutrientController:
         Query parameters:
         - limit: Number of meals to return (default: 50)
         - offset: Number of meals to skip (default: 0)
+        - cursor: Keyset pagination cursor; pass it empty for the first page,
+          then the returned next_cursor (takes precedence over offset)
         - start_date: Filter meals from this date (ISO format)
         - end_date: Filter meals until this date (ISO format)
         
@@ -564,32 +792,43 @@ class NutrientController:
             # Get query parameters
             limit = int(request.args.get('limit', 50))
             offset = int(request.args.get('offset', 0))
+            cursor = request.args.get('cursor')
             start_date = request.args.get('start_date')
             end_date = request.args.get('end_date')
             
             # Validate limits
             limit = min(limit, 100)  # Max 100 meals per request
             
+            # Reject malformed cursors up front (raises ValueError)
+            if cursor:
+                UserMeal.decode_cursor(cursor)
+            
             result = UserMeal.get_meals_by_food_type(
                 user_id=user_id,
                 food_type=food_type,
                 limit=limit,
                 offset=offset,
                 start_date=start_date,
-                end_date=end_date
+                end_date=end_date,
+                cursor=cursor
             )
             
             if result['success']:
+                data = {
+                    'meals': result['meals'],
+                    'count': result['count'],
+                    'food_type': result['food_type'],
+                    'limit': limit
+                }
+                if cursor is None:
+                    data['offset'] = offset
+                else:
+                    data['next_cursor'] = result['next_cursor']
+                
                 return jsonify({
                     'success': True,
                     'message': f'Meals of type "{food_type}" retrieved successfully',
-                    'data': {
-                        'meals': result['meals'],
-                        'count': result['count'],
-                        'food_type': result['food_type'],
-                        'limit': limit,
-                        'offset': offset
-                    }
+                    'data': data
                 }), 200
             else:
                 return jsonify({
@@ -5,10 +5,9 @@ from models.user import User
 from services.cloudinary_service import CloudinaryService
 from middleware.logging_middleware import log_database_operation, log_error
 import logging
+import time
 from datetime import datetime
 from bson import ObjectId
-import tempfile
-import os
 
 class UserInfoController:
     
@@ -62,30 +61,27 @@ class UserInfoController:
                 if field in files:
                     try:
                         file = files[field]
-                        with tempfile.NamedTemporaryFile(delete=False, suffix='.jpg') as temp_file:
-                            file.save(temp_file.name)
-                            
-                            # Upload to Cloudinary
-                            upload_result = CloudinaryService.upload_image(
-                                file_path=temp_file.name,
-                                folder='user_documents',
-                                public_id=f"{field}_{user_id}_{int(datetime.now().timestamp())}"
-                            )
-                            
-                            if upload_result['success']:
-                                user_info['documents'][field] = {
-                                    'public_id': upload_result['public_id'],
-                                    'url': upload_result['url']
-                                }
-                            
-                            os.unlink(temp_file.name)
-                            
+                        
+                        # Upload to Cloudinary straight from memory
+                        upload_result = CloudinaryService.upload_image(
+                            file=file.read(),
+                            folder='user_documents',
+                            public_id=f"{field}_{user_id}_{int(datetime.now().timestamp())}"
+                        )
+                        
+                        if upload_result['success']:
+                            user_info['documents'][field] = {
+                                'public_id': upload_result['public_id'],
+                                'url': upload_result['url']
+                            }
+                        
                     except Exception as e:
                         logging.warning(f"Failed to upload {field}: {str(e)}")
             
             # Insert user info
+            started_at = time.perf_counter()
             result = db.user_info.insert_one(user_info)
-            log_database_operation('insert_one', 'user_info', user_info, result)
+            log_database_operation('insert_one', 'user_info', user_info, result, started_at=started_at)
             
             # Format response
             user_info['_id'] = str(result.inserted_id)
@@ -117,8 +113,9 @@ class UserInfoController:
             db = get_db()
             
             # Find user info
+            started_at = time.perf_counter()
             user_info = db.user_info.find_one({'user_id': ObjectId(target_user_id)})
-            log_database_operation('find_one', 'user_info', {'user_id': target_user_id}, user_info)
+            log_database_operation('find_one', 'user_info', {'user_id': target_user_id}, user_info, started_at=started_at)
             
             if not user_info:
                 return jsonify({'error': 'User information not found'}), 404
@@ -163,8 +160,9 @@ class UserInfoController:
             skip = (page - 1) * limit
             
             # Get all user info
+            started_at = time.perf_counter()
             user_infos = list(db.user_info.find().skip(skip).limit(limit))
-            log_database_operation('find', 'user_info', {'skip': skip, 'limit': limit}, user_infos)
+            log_database_operation('find', 'user_info', {'skip': skip, 'limit': limit}, user_infos, started_at=started_at)
             
             # Format response
             for info in user_infos:
@@ -270,23 +268,18 @@ class UserInfoController:
                         
                         # Upload new document
                         file = files[field]
-                        with tempfile.NamedTemporaryFile(delete=False, suffix='.jpg') as temp_file:
-                            file.save(temp_file.name)
-                            
-                            upload_result = CloudinaryService.upload_image(
-                                file_path=temp_file.name,
-                                folder='user_documents',
-                                public_id=f"{field}_{user_info['user_id']}_{int(datetime.now().timestamp())}"
-                            )
-                            
-                            if upload_result['success']:
-                                documents[field] = {
-                                    'public_id': upload_result['public_id'],
-                                    'url': upload_result['url']
-                                }
-                            
-                            os.unlink(temp_file.name)
-                            
+                        upload_result = CloudinaryService.upload_image(
+                            file=file.read(),
+                            folder='user_documents',
+                            public_id=f"{field}_{user_info['user_id']}_{int(datetime.now().timestamp())}"
+                        )
+                        
+                        if upload_result['success']:
+                            documents[field] = {
+                                'public_id': upload_result['public_id'],
+                                'url': upload_result['url']
+                            }
+                        
                     except Exception as e:
                         logging.warning(f"Failed to update {field}: {str(e)}")
             
@@ -294,11 +287,12 @@ class UserInfoController:
                 update_data['documents'] = documents
             
             # Update user info
+            started_at = time.perf_counter()
             result = db.user_info.update_one(
                 {'_id': ObjectId(info_id)},
                 {'$set': update_data}
             )
-            log_database_operation('update_one', 'user_info', {'_id': info_id}, result)
+            log_database_operation('update_one', 'user_info', {'_id': info_id}, result, started_at=started_at)
             
             # Get updated user info
             updated_info = db.user_info.find_one({'_id': ObjectId(info_id)})
@@ -351,8 +345,9 @@ class UserInfoController:
                         logging.warning(f"Failed to delete document {field}: {str(e)}")
             
             # Delete user info
+            started_at = time.perf_counter()
             result = db.user_info.delete_one({'_id': ObjectId(info_id)})
-            log_database_operation('delete_one', 'user_info', {'_id': info_id}, result)
+            log_database_operation('delete_one', 'user_info', {'_id': info_id}, result, started_at=started_at)
             
             logging.info(f"User info deleted successfully: {info_id}")
             return jsonify({
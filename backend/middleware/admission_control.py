@@ -0,0 +1,177 @@
+from functools import wraps
+from flask import jsonify
+from middleware.metrics_middleware import admission_rejections_total
+import threading
+import logging
+import math
+import time
+import os
+
+class AdmissionController:
+    """
+    Bounded admission for expensive endpoints
+
+    At most `max_concurrent` requests run at once and at most `max_queue`
+    more wait (up to `queue_timeout` seconds) for a slot. Anything beyond
+    that is turned away immediately, so waitress threads stay available for
+    the rest of the API instead of all piling up behind inference.
+    """
+
+    def __init__(self, name, max_concurrent=2, max_queue=1, queue_timeout=2.0, retry_after=2):
+        self.name = name
+        self.max_concurrent = max(1, int(max_concurrent))
+        self.max_queue = max(0, int(max_queue))
+        self.queue_timeout = max(0.0, float(queue_timeout))
+        self.retry_after = max(1, int(retry_after))
+
+        self._condition = threading.Condition()
+        self._active = 0
+        self._waiting = 0
+        self._stats = {
+            'admitted': 0,
+            'queued': 0,
+            'rejected_queue_full': 0,
+            'rejected_timeout': 0,
+            'total_service_ms': 0.0
+        }
+
+    def acquire(self):
+        """
+        Take a slot, waiting in the bounded queue if needed
+
+        Returns:
+            None when admitted, otherwise the rejection reason
+            ('queue_full' or 'timeout')
+        """
+        with self._condition:
+            if self._active < self.max_concurrent and self._waiting == 0:
+                self._active += 1
+                self._stats['admitted'] += 1
+                return None
+
+            if self._waiting >= self.max_queue:
+                self._stats['rejected_queue_full'] += 1
+                return 'queue_full'
+
+            self._waiting += 1
+            self._stats['queued'] += 1
+            deadline = time.monotonic() + self.queue_timeout
+            try:
+                while self._active >= self.max_concurrent:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._stats['rejected_timeout'] += 1
+                        return 'timeout'
+                    self._condition.wait(remaining)
+            finally:
+                self._waiting -= 1
+
+            self._active += 1
+            self._stats['admitted'] += 1
+            return None
+
+    def release(self, service_seconds=0.0):
+        with self._condition:
+            self._active -= 1
+            self._stats['total_service_ms'] += service_seconds * 1000
+            self._condition.notify()
+
+    def get_retry_after(self):
+        """Seconds the client should wait: the configured floor, or longer when requests are slow"""
+        with self._condition:
+            admitted = self._stats['admitted']
+            avg_service = self._stats['total_service_ms'] / admitted / 1000 if admitted else 0.0
+            backlog = (self._active + self._waiting) / self.max_concurrent
+        return max(self.retry_after, math.ceil(avg_service * backlog))
+
+    def get_stats(self):
+        """Get admission statistics"""
+        with self._condition:
+            stats = dict(self._stats)
+            stats['active'] = self._active
+            stats['waiting'] = self._waiting
+
+        admitted = stats['admitted']
+        stats['max_concurrent'] = self.max_concurrent
+        stats['max_queue'] = self.max_queue
+        stats['avg_service_ms'] = round(stats['total_service_ms'] / admitted, 3) if admitted else 0.0
+        stats['total_service_ms'] = round(stats['total_service_ms'], 3)
+        return stats
+
+# Global instance
+inference_admission = None
+inference_admission_lock = threading.Lock()
+
+def admission_control_enabled():
+    return os.getenv('INFERENCE_ADMISSION_ENABLED', 'true').lower() == 'true'
+
+def _batch_max_size():
+    """ML_BATCH_MAX_SIZE when the in-process micro-batcher is in use, else None"""
+    if os.getenv('ML_BATCHING_ENABLED', 'true').lower() != 'true' or os.getenv('ML_BACKEND', 'thread').lower() == 'process':
+        return None
+    return int(os.getenv('ML_BATCH_MAX_SIZE', 8))
+
+def _default_max_concurrent():
+    # Every admitted request holds its slot while it waits in the batcher, so
+    # fewer slots than ML_BATCH_MAX_SIZE would keep batches from ever filling
+    return _batch_max_size() or 2
+
+def get_inference_admission():
+    """Get the admission controller guarding the inference endpoints (None when disabled)"""
+    global inference_admission
+
+    if not admission_control_enabled():
+        return None
+
+    with inference_admission_lock:
+        if inference_admission is None:
+            inference_admission = AdmissionController(
+                'inference',
+                max_concurrent=int(os.getenv('INFERENCE_MAX_CONCURRENT') or _default_max_concurrent()),
+                max_queue=int(os.getenv('INFERENCE_MAX_QUEUE') or 1),
+                queue_timeout=float(os.getenv('INFERENCE_QUEUE_TIMEOUT_SECONDS', 2)),
+                retry_after=int(os.getenv('INFERENCE_RETRY_AFTER_SECONDS', 2))
+            )
+            logging.info(f"Inference admission control enabled (max_concurrent={inference_admission.max_concurrent}, max_queue={inference_admission.max_queue})")
+
+            batch_max_size = _batch_max_size()
+            if batch_max_size and inference_admission.max_concurrent + inference_admission.max_queue < batch_max_size:
+                logging.warning(f"INFERENCE_MAX_CONCURRENT + INFERENCE_MAX_QUEUE is below ML_BATCH_MAX_SIZE ({batch_max_size}); inference batches will never fill")
+
+    return inference_admission
+
+def get_admission_stats():
+    """Admission statistics for the status endpoints (None when disabled or unused)"""
+    if inference_admission is None:
+        return None
+    return inference_admission.get_stats()
+
+def inference_admission_required(f):
+    """Decorator that sheds inference requests with 503 + Retry-After when saturated"""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        admission = get_inference_admission()
+        if admission is None:
+            return f(*args, **kwargs)
+
+        reason = admission.acquire()
+        if reason is not None:
+            admission_rejections_total.inc(name=admission.name, reason=reason)
+            retry_after = admission.get_retry_after()
+            logging.warning(f"Inference request rejected ({reason}), retry after {retry_after}s")
+            response = jsonify({
+                'success': False,
+                'error': 'Server is busy processing other images, please retry shortly',
+                'retry_after': retry_after
+            })
+            response.status_code = 503
+            response.headers['Retry-After'] = str(retry_after)
+            return response
+
+        started_at = time.perf_counter()
+        try:
+            return f(*args, **kwargs)
+        finally:
+            admission.release(time.perf_counter() - started_at)
+
+    return decorated_function
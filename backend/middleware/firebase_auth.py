@@ -2,7 +2,35 @@ from functools import wraps
 from flask import request, jsonify
 from config.firebase_admin import verify_firebase_token, get_firebase_user
 from models.user import User
+from services.cache_service import get_named_cache
+import hashlib
 import logging
+import time
+
+def verify_firebase_token_cached(token):
+    """
+    Verify a Firebase ID token, reusing recent verifications of the same token
+
+    Entries are keyed by a hash of the token (the raw token is never kept)
+    and expire after AUTH_TOKEN_CACHE_TTL_SECONDS or at the token's own
+    `exp`, whichever comes first. Failed verifications are not cached.
+    """
+    cache = get_named_cache('auth_token', 'AUTH_TOKEN_CACHE', max_entries=10000, ttl_seconds=300)
+    if cache is None:
+        return verify_firebase_token(token)
+    
+    key = hashlib.sha256(token.encode('utf-8')).hexdigest()
+    decoded_token = cache.get(key)
+    if decoded_token is not None:
+        return decoded_token
+    
+    decoded_token = verify_firebase_token(token)
+    
+    remaining = decoded_token.get('exp', 0) - time.time()
+    if remaining > 0:
+        cache.set(key, decoded_token, expires_at=time.monotonic() + min(remaining, cache.ttl_seconds))
+    
+    return decoded_token
 
 def firebase_auth_required(f):
     """Decorator to require Firebase authentication"""
@@ -24,14 +52,14 @@ def firebase_auth_required(f):
             
             # Verify the Firebase token
             try:
-                decoded_token = verify_firebase_token(token)
+                decoded_token = verify_firebase_token_cached(token)
                 firebase_uid = decoded_token.get('uid')
                 
                 if not firebase_uid:
                     return jsonify({'error': 'Invalid token: no UID found'}), 401
                 
                 # Get user from our database using Firebase UID
-                user = User.find_by_uid(firebase_uid)
+                user = User.find_by_uid_cached(firebase_uid)
                 if not user:
                     return jsonify({'error': 'User not found in our system'}), 404
                 
@@ -85,14 +113,14 @@ def firebase_admin_required(f):
             
             # Verify the Firebase token
             try:
-                decoded_token = verify_firebase_token(token)
+                decoded_token = verify_firebase_token_cached(token)
                 firebase_uid = decoded_token.get('uid')
                 
                 if not firebase_uid:
                     return jsonify({'error': 'Invalid token: no UID found'}), 401
                 
                 # Get user from our database
-                user = User.find_by_uid(firebase_uid)
+                user = User.find_by_uid_cached(firebase_uid)
                 if not user:
                     return jsonify({'error': 'User not found in our system'}), 404
                 
@@ -1,8 +1,13 @@
 import logging
+from logging.handlers import QueueHandler, QueueListener
 import os
 from datetime import datetime
 from flask import request, g
 import json
+import queue
+import random
+import atexit
+import time
 from bson import ObjectId
 
 def datetime_serializer(obj):
@@ -15,10 +20,51 @@ def datetime_serializer(obj):
 
 def safe_json_dumps(data, **kwargs):
     """Safely serialize data to JSON with datetime support"""
+    kwargs.setdefault('separators', (',', ':'))
     return json.dumps(data, default=datetime_serializer, **kwargs)
 
+class DroppingQueueHandler(QueueHandler):
+    """
+    QueueHandler that never blocks the caller
+
+    Records go onto a bounded queue drained by a QueueListener thread. When
+    the queue is full (e.g. the disk is slow) the record is dropped and
+    counted instead of stalling the request thread.
+    """
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Records stay in this process, so formatting (including lazy
+        # payloads such as DatabaseOperationRecord, which copy what they
+        # reference when created) is left to the writer thread instead of
+        # being done here on the request thread
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+# Background log writer, started by setup_logging
+log_queue_handler = None
+log_listener = None
+
+# Database operations log through their own logger so DB_LOG_LEVEL can
+# silence them without touching application logs
+db_logger = logging.getLogger('glycofit.db')
+
+# Headers whose values must never reach the logs
+REDACTED_HEADERS = {'authorization', 'cookie', 'set-cookie', 'x-api-key'}
+SENSITIVE_FIELDS = ['password', 'token', 'secret']
+
 def setup_logging():
     """Setup logging configuration"""
+    global log_queue_handler, log_listener
+    
     # Create logs directory if it doesn't exist
     if not os.path.exists('logs'):
         os.makedirs('logs')
@@ -26,89 +72,218 @@ def setup_logging():
     # Configure logging
     log_level = os.getenv('LOG_LEVEL', 'INFO').upper()
     log_file = os.getenv('LOG_FILE', 'logs/app.log')
+    queue_size = int(os.getenv('LOG_QUEUE_SIZE', 10000))
+    
+    formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    handlers = [
+        logging.FileHandler(log_file, encoding='utf-8'),
+        logging.StreamHandler()  # Console output
+    ]
+    for handler in handlers:
+        handler.setFormatter(formatter)
+    
+    if log_listener is not None:
+        log_listener.stop()
+    
+    # Request threads only enqueue records; file and console writes happen
+    # on the listener thread
+    log_queue_handler = DroppingQueueHandler(queue.Queue(maxsize=queue_size))
+    log_listener = QueueListener(log_queue_handler.queue, *handlers, respect_handler_level=True)
+    log_listener.start()
+    atexit.register(log_listener.stop)
     
     logging.basicConfig(
         level=getattr(logging, log_level),
-        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-        handlers=[
-            logging.FileHandler(log_file, encoding='utf-8'),
-            logging.StreamHandler()  # Console output
-        ]
+        handlers=[log_queue_handler],
+        force=True
     )
     
     # Set specific logger levels
     logging.getLogger('werkzeug').setLevel(logging.WARNING)  # Reduce Flask request logs
     logging.getLogger('pymongo').setLevel(logging.WARNING)   # Reduce MongoDB logs
     
+    db_log_level = os.getenv('DB_LOG_LEVEL')
+    if db_log_level:
+        db_logger.setLevel(getattr(logging, db_log_level.upper()))
+    
     logging.info("Logging system initialized")
 
+def get_logging_stats():
+    """Return queue depth and dropped record count for the log pipeline"""
+    if log_queue_handler is None:
+        return {'enabled': False}
+    
+    return {
+        'enabled': True,
+        'queue_depth': log_queue_handler.queue.qsize(),
+        'queue_capacity': log_queue_handler.queue.maxsize,
+        'dropped_records': log_queue_handler.dropped
+    }
+
+def redact_headers(headers):
+    """Copy request headers with credentials replaced"""
+    return {
+        key: '[HIDDEN]' if key.lower() in REDACTED_HEADERS else value
+        for key, value in headers.items()
+    }
+
 def log_request():
-    """Log incoming request details"""
-    start_time = datetime.utcnow()
-    g.start_time = start_time
+    """Record the request start time (details are logged with the response)"""
+    g.start_time = time.perf_counter()
+
+def should_log_response(status_code):
+    """Errors are always logged; successes are sampled by LOG_SUCCESS_SAMPLE_RATE"""
+    if status_code >= 400:
+        return True
     
-    # Log request details
+    sample_rate = float(os.getenv('LOG_SUCCESS_SAMPLE_RATE', 1.0))
+    return sample_rate >= 1.0 or random.random() < sample_rate
+
+def log_response(response):
+    """Log one compact line per request, including status and duration"""
+    logger = logging.getLogger()
+    if not logger.isEnabledFor(logging.INFO) or not should_log_response(response.status_code):
+        return
+    
+    start_time = g.get('start_time')
     request_data = {
-        'timestamp': start_time.isoformat(),
+        'timestamp': datetime.utcnow().isoformat(),
         'method': request.method,
-        'url': request.url,
         'path': request.path,
+        'status': response.status_code,
+        'duration_ms': round((time.perf_counter() - start_time) * 1000, 2) if start_time else None,
         'remote_addr': request.remote_addr,
         'user_agent': str(request.user_agent),
-        'headers': dict(request.headers),
         'args': dict(request.args),
     }
     
+    if logger.isEnabledFor(logging.DEBUG):
+        request_data['headers'] = redact_headers(request.headers)
+    
     # Log request body for POST/PUT requests (be careful with sensitive data)
     if request.method in ['POST', 'PUT', 'PATCH']:
         try:
             if request.is_json:
-                body = request.get_json()
+                body = request.get_json(silent=True)
                 # Remove sensitive fields from logging
                 if body and isinstance(body, dict):
                     safe_body = {k: v for k, v in body.items() 
-                               if k.lower() not in ['password', 'token', 'secret']}
+                               if k.lower() not in SENSITIVE_FIELDS}
                     request_data['body'] = safe_body
             elif request.form:
                 # Log form data (excluding sensitive fields)
                 safe_form = {k: v for k, v in request.form.items() 
-                           if k.lower() not in ['password', 'token', 'secret']}
+                           if k.lower() not in SENSITIVE_FIELDS}
                 request_data['form'] = safe_form
         except Exception as e:
             logging.warning(f"Could not log request body: {str(e)}")
     
-    # Log the request
-    logging.info(f"Incoming Request: {safe_json_dumps(request_data, indent=2)}")
+    if response.status_code >= 400:
+        # Only preview small, buffered bodies; never read a streamed file
+        if not response.is_streamed and not response.direct_passthrough:
+            max_chars = int(os.getenv('LOG_ERROR_BODY_MAX_CHARS', 512))
+            request_data['error_body'] = response.get_data(as_text=True)[:max_chars]
+        logging.error(f"Request: {safe_json_dumps(request_data)}")
+    else:
+        logging.info(f"Request: {safe_json_dumps(request_data)}")
 
-def log_database_operation(operation, collection, query=None, result=None):
-    """Log database operations for debugging"""
-    log_data = {
-        'operation': operation,
-        'collection': collection,
-        'timestamp': datetime.utcnow().isoformat(),
-    }
+class DatabaseOperationRecord:
+    """
+    Structured payload for one database operation
+
+    Takes a shallow copy of the query and the already-extracted counts; the
+    query is only redacted and JSON-serialized when a handler formats the
+    record, which happens on the log writer thread. The copy keeps a caller
+    that reuses or mutates its dict (e.g. User.to_dict() output) from
+    changing the payload while it waits on the queue.
+    """
+
+    __slots__ = ('operation', 'collection', 'query', 'fields', 'created_at')
+
+    def __init__(self, operation, collection, query, fields):
+        self.operation = operation
+        self.collection = collection
+        if isinstance(query, dict):
+            query = dict(query)
+        elif isinstance(query, list):
+            query = list(query)
+        self.query = query
+        self.fields = fields
+        self.created_at = time.time()
+
+    def to_dict(self):
+        log_data = {
+            'operation': self.operation,
+            'collection': self.collection,
+            'timestamp': datetime.utcfromtimestamp(self.created_at).isoformat(),
+        }
+        log_data.update(self.fields)
+        
+        if self.query:
+            # Remove sensitive data from query logging
+            safe_query = self.query
+            if isinstance(safe_query, dict) and any(key in safe_query for key in SENSITIVE_FIELDS):
+                safe_query = dict(safe_query)
+                for key in SENSITIVE_FIELDS:
+                    if key in safe_query:
+                        safe_query[key] = '[HIDDEN]'
+            log_data['query'] = safe_query
+        
+        return log_data
+
+    def __str__(self):
+        return safe_json_dumps(self.to_dict())
+
+def summarize_database_result(result):
+    """Extract document counts from a pymongo result, document or list"""
+    if hasattr(result, 'acknowledged'):
+        fields = {'acknowledged': result.acknowledged}
+        if hasattr(result, 'inserted_id'):
+            fields['inserted_id'] = str(result.inserted_id)
+            fields['document_count'] = 1
+        elif hasattr(result, 'bulk_api_result'):
+            fields['matched_count'] = result.matched_count
+            fields['document_count'] = result.inserted_count + result.modified_count + result.deleted_count + result.upserted_count
+        elif hasattr(result, 'inserted_ids'):
+            fields['document_count'] = len(result.inserted_ids)
+        elif hasattr(result, 'deleted_count'):
+            fields['document_count'] = result.deleted_count
+        elif hasattr(result, 'modified_count'):
+            fields['matched_count'] = result.matched_count
+            fields['document_count'] = result.modified_count
+            if result.upserted_id is not None:
+                fields['upserted_id'] = str(result.upserted_id)
+                fields['document_count'] += 1
+        return fields
+    
+    if isinstance(result, dict):
+        return {'document_count': 1}
     
-    if query:
-        # Remove sensitive data from query logging
-        safe_query = query.copy() if isinstance(query, dict) else query
-        if isinstance(safe_query, dict):
-            for key in ['password', 'token', 'secret']:
-                if key in safe_query:
-                    safe_query[key] = '[HIDDEN]'
-        log_data['query'] = safe_query
+    return {'document_count': len(result) if hasattr(result, '__len__') else 1}
+
+def log_database_operation(operation, collection, query=None, result=None, started_at=None):
+    """
+    Log a database operation on the 'glycofit.db' logger
+    
+    Does nothing unless the logger is enabled for INFO (see DB_LOG_LEVEL).
+    
+    Args:
+        started_at: time.perf_counter() value taken just before the
+            operation, used to record its latency as duration_ms
+    """
+    if not db_logger.isEnabledFor(logging.INFO):
+        return
     
+    fields = {}
+    if started_at is not None:
+        fields['duration_ms'] = round((time.perf_counter() - started_at) * 1000, 2)
     if result is not None:
-        if hasattr(result, 'acknowledged'):
-            log_data['result'] = {
-                'acknowledged': result.acknowledged,
-                'inserted_id': str(result.inserted_id) if hasattr(result, 'inserted_id') else None,
-                'modified_count': getattr(result, 'modified_count', None),
-                'deleted_count': getattr(result, 'deleted_count', None),
-            }
-        else:
-            log_data['result_count'] = len(result) if hasattr(result, '__len__') else 1
-    
-    logging.info(f"Database Operation: {safe_json_dumps(log_data, indent=2)}")
+        fields.update(summarize_database_result(result))
+    else:
+        fields['document_count'] = 0
+    
+    payload = DatabaseOperationRecord(operation, collection, query, fields)
+    db_logger.info("Database Operation: %s", payload, extra={'db_operation': payload})
 
 def log_authentication_attempt(email, success, reason=None):
     """Log authentication attempts for security monitoring"""
@@ -125,9 +300,9 @@ def log_authentication_attempt(email, success, reason=None):
         log_data['reason'] = reason
     
     if success:
-        logging.info(f"Successful Authentication: {safe_json_dumps(log_data, indent=2)}")
+        logging.info(f"Successful Authentication: {safe_json_dumps(log_data)}")
     else:
-        logging.warning(f"Failed Authentication: {safe_json_dumps(log_data, indent=2)}")
+        logging.warning(f"Failed Authentication: {safe_json_dumps(log_data)}")
 
 def log_error(error, context=None):
     """Log errors with context information"""
@@ -142,4 +317,4 @@ def log_error(error, context=None):
     if context:
         log_data['context'] = context
     
-    logging.error(f"Application Error: {safe_json_dumps(log_data, indent=2)}")
+    logging.error(f"Application Error: {safe_json_dumps(log_data)}")
@@ -0,0 +1,313 @@
+from contextlib import contextmanager
+from flask import request, g, Response
+from pymongo import monitoring
+import threading
+import logging
+import time
+import os
+
+# Latency buckets in seconds, shared by request and phase histograms
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+def _escape_label_value(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_labels(labelnames, labelvalues, extra=None):
+    pairs = [f'{name}="{_escape_label_value(value)}"' for name, value in zip(labelnames, labelvalues)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class _Metric:
+    """Base for labelled metrics; values are keyed by a tuple of label values"""
+
+    metric_type = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.metric_type}']
+        with self._lock:
+            items = sorted(self._values.items())
+            for labelvalues, value in items:
+                lines.extend(self._render_sample(labelvalues, value))
+        return lines
+
+    def _render_sample(self, labelvalues, value):
+        return [f'{self.name}{_format_labels(self.labelnames, labelvalues)} {_format_value(value)}']
+
+class Counter(_Metric):
+    metric_type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+class Gauge(_Metric):
+    metric_type = 'gauge'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+class Histogram(_Metric):
+    metric_type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                series = self._values[key] = {'counts': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series['counts'][index] += 1
+                    break
+            series['sum'] += value
+            series['count'] += 1
+
+    def _render_sample(self, labelvalues, series):
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets, series['counts']):
+            cumulative += count
+            labels = _format_labels(self.labelnames, labelvalues, f'le="{_format_value(bound)}"')
+            lines.append(f'{self.name}_bucket{labels} {cumulative}')
+
+        labels = _format_labels(self.labelnames, labelvalues)
+        lines.append(f'{self.name}_sum{labels} {_format_value(series["sum"])}')
+        lines.append(f'{self.name}_count{labels} {series["count"]}')
+        return lines
+
+class MetricsRegistry:
+    """Holds every metric and renders them in the Prometheus text format"""
+
+    def __init__(self):
+        self.metrics = []
+        self.collectors = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def register_collector(self, collector):
+        """Register a callable run before each scrape (e.g. to refresh gauges)"""
+        self.collectors.append(collector)
+
+    def render(self):
+        for collector in self.collectors:
+            try:
+                collector()
+            except Exception as e:
+                logging.warning(f"Metrics collector failed: {str(e)}")
+
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+registry = MetricsRegistry()
+
+http_requests_total = registry.register(Counter(
+    'glycofit_http_requests_total',
+    'HTTP requests by endpoint and status code',
+    ('blueprint', 'endpoint', 'method', 'status')
+))
+http_request_duration_seconds = registry.register(Histogram(
+    'glycofit_http_request_duration_seconds',
+    'HTTP request latency in seconds',
+    ('blueprint', 'endpoint', 'method')
+))
+http_requests_in_flight = registry.register(Gauge(
+    'glycofit_http_requests_in_flight',
+    'HTTP requests currently being handled',
+    ('blueprint', 'endpoint')
+))
+phase_duration_seconds = registry.register(Histogram(
+    'glycofit_phase_duration_seconds',
+    'Time spent in internal phases (decode, forward, cloudinary, mongo, firebase)',
+    ('phase', 'operation')
+))
+phase_errors_total = registry.register(Counter(
+    'glycofit_phase_errors_total',
+    'Internal phases that raised or failed',
+    ('phase', 'operation')
+))
+admission_rejections_total = registry.register(Counter(
+    'glycofit_admission_rejections_total',
+    'Requests turned away by admission control',
+    ('name', 'reason')
+))
+mail_messages_total = registry.register(Counter(
+    'glycofit_mail_messages_total',
+    'Emails by delivery outcome (sent, failed, retried, dropped)',
+    ('status',)
+))
+push_notifications_total = registry.register(Counter(
+    'glycofit_push_notifications_total',
+    'Push notification deliveries per token by outcome (sent, failed, invalid)',
+    ('status',)
+))
+
+# Refreshed from service stats on each scrape
+ml_batch_queue_depth = registry.register(Gauge(
+    'glycofit_ml_batch_queue_depth',
+    'Images waiting for the inference batcher'
+))
+cache_hit_ratio = registry.register(Gauge(
+    'glycofit_cache_hit_ratio',
+    'Hit ratio per in-process cache since startup',
+    ('cache',)
+))
+log_dropped_records = registry.register(Gauge(
+    'glycofit_log_dropped_records',
+    'Log records dropped because the log queue was full'
+))
+mail_queue_depth = registry.register(Gauge(
+    'glycofit_mail_queue_depth',
+    'Emails waiting for the mail dispatcher'
+))
+admission_active = registry.register(Gauge(
+    'glycofit_admission_active',
+    'Requests holding an admission slot',
+    ('name',)
+))
+admission_waiting = registry.register(Gauge(
+    'glycofit_admission_waiting',
+    'Requests queued for an admission slot',
+    ('name',)
+))
+
+def collect_service_stats():
+    import services.ml_service as ml_module
+    from services.cache_service import get_cache_stats
+    from middleware.logging_middleware import get_logging_stats
+    from middleware.admission_control import get_admission_stats
+    from services.mail_dispatcher import get_mail_stats
+
+    # Read the global directly; scraping must never trigger a model load
+    ml_service = ml_module.ml_service
+    batching = ml_service.get_batching_stats() if ml_service else None
+    if batching:
+        ml_batch_queue_depth.set(batching['queue_depth'])
+
+    caches = get_cache_stats()
+    if ml_service:
+        caches['prediction'] = ml_service.get_cache_stats()
+    for name, stats in caches.items():
+        if isinstance(stats, dict) and 'hit_ratio' in stats:
+            cache_hit_ratio.set(stats['hit_ratio'], cache=name)
+
+    log_dropped_records.set(get_logging_stats().get('dropped_records', 0))
+
+    admission = get_admission_stats()
+    if admission:
+        admission_active.set(admission['active'], name='inference')
+        admission_waiting.set(admission['waiting'], name='inference')
+
+    mail = get_mail_stats()
+    if mail:
+        mail_queue_depth.set(mail['queue_depth'])
+
+registry.register_collector(collect_service_stats)
+
+@contextmanager
+def time_phase(phase, operation=''):
+    """
+    Time a block of internal work into glycofit_phase_duration_seconds
+
+    Usable as a context manager or as a decorator.
+    """
+    started_at = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        phase_errors_total.inc(phase=phase, operation=operation)
+        raise
+    finally:
+        phase_duration_seconds.observe(time.perf_counter() - started_at, phase=phase, operation=operation)
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """Records every MongoDB command as a 'mongo' phase, using the driver's own timings"""
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        phase_duration_seconds.observe(event.duration_micros / 1e6, phase='mongo', operation=event.command_name)
+
+    def failed(self, event):
+        phase_duration_seconds.observe(event.duration_micros / 1e6, phase='mongo', operation=event.command_name)
+        phase_errors_total.inc(phase='mongo', operation=event.command_name)
+
+def _request_labels():
+    # Use the matched endpoint rather than the raw path to keep label
+    # cardinality bounded (404s all share one series)
+    return {
+        'blueprint': request.blueprint or '',
+        'endpoint': request.endpoint or 'unmatched'
+    }
+
+def metrics_enabled():
+    return os.getenv('METRICS_ENABLED', 'true').lower() == 'true'
+
+def init_metrics(app):
+    """Register request instrumentation hooks and the /metrics scrape endpoint"""
+    if not metrics_enabled():
+        logging.info("Metrics disabled")
+        return
+
+    @app.before_request
+    def start_request_metrics():
+        g.metrics_started_at = time.perf_counter()
+        g.metrics_labels = _request_labels()
+        http_requests_in_flight.inc(**g.metrics_labels)
+
+    @app.after_request
+    def record_request_metrics(response):
+        labels = g.get('metrics_labels')
+        if labels is not None:
+            duration = time.perf_counter() - g.metrics_started_at
+            http_request_duration_seconds.observe(duration, method=request.method, **labels)
+            http_requests_total.inc(method=request.method, status=response.status_code, **labels)
+        return response
+
+    @app.teardown_request
+    def finish_request_metrics(error=None):
+        labels = g.pop('metrics_labels', None)
+        if labels is not None:
+            http_requests_in_flight.dec(**labels)
+
+    @app.route('/metrics', methods=['GET'])
+    def metrics():
+        return Response(registry.render(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+    logging.info("Metrics enabled at /metrics")
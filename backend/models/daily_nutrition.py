@@ -0,0 +1,279 @@
+from datetime import datetime, timedelta, timezone
+from bson import ObjectId
+from pymongo import UpdateOne
+from config.database import get_db
+from middleware.logging_middleware import log_database_operation
+import logging
+import time
+import os
+
+class DailyNutrition:
+    """
+    Pre-aggregated nutrition totals per user, day (UTC) and food type
+
+    Documents in `user_daily_nutrition` are kept in step with `user_meals` by
+    UserMeal.create_meal, update_meal and delete_meal, so summaries can read
+    a handful of rollups instead of re-aggregating every meal in the range.
+    """
+
+    COLLECTION = 'user_daily_nutrition'
+    META_ID = 'user_daily_nutrition'
+
+    # Rollup field -> key in the meal's nutrients dict
+    NUTRIENT_FIELDS = {
+        'calories': 'Calories',
+        'protein': 'Protein (g)',
+        'carbs': 'Carbs (g)',
+        'fat': 'Fat (g)'
+    }
+
+    # Rollups are only read once a backfill has completed
+    _ready = False
+    _ready_checked_at = 0.0
+
+    @staticmethod
+    def normalize_datetime(value):
+        """Parse ISO strings and convert aware datetimes to naive UTC, matching stored meals"""
+        if value is None:
+            return None
+        if isinstance(value, str):
+            value = datetime.fromisoformat(value.replace('Z', '+00:00'))
+        if value.tzinfo is not None:
+            value = value.astimezone(timezone.utc).replace(tzinfo=None)
+        return value
+
+    @staticmethod
+    def day_of(value):
+        return datetime(value.year, value.month, value.day)
+
+    @staticmethod
+    def _nutrient_value(nutrients, key):
+        value = (nutrients or {}).get(key)
+        return float(value) if isinstance(value, (int, float)) else 0.0
+
+    @staticmethod
+    def is_enabled():
+        """Whether summaries should be served from rollups"""
+        if os.getenv('NUTRITION_ROLLUPS_ENABLED', 'true').lower() != 'true':
+            return False
+
+        if DailyNutrition._ready:
+            return True
+
+        # Re-check the backfill marker at most once a minute until it appears
+        now = time.monotonic()
+        if now - DailyNutrition._ready_checked_at > 60:
+            DailyNutrition._ready_checked_at = now
+            try:
+                meta = get_db().rollup_meta.find_one({'_id': DailyNutrition.META_ID})
+                DailyNutrition._ready = bool(meta and meta.get('backfilled_at'))
+                if not DailyNutrition._ready:
+                    logging.warning("Daily nutrition rollups not backfilled yet, summaries will aggregate raw meals")
+            except Exception as e:
+                logging.warning(f"Could not read rollup status: {str(e)}")
+
+        return DailyNutrition._ready
+
+    @staticmethod
+    def apply_meal(meal, sign=1, food_type=None):
+        """
+        Add (sign=1) or remove (sign=-1) a meal document from its day's rollup
+
+        Args:
+            meal: Meal document as stored in user_meals
+            sign: 1 when the meal is created, -1 when it is deleted
+            food_type: Override the meal's food type (used when it changes)
+        """
+        try:
+            db = get_db()
+            nutrients = meal.get('nutrients')
+
+            key = {
+                'user_id': meal['user_id'],
+                'day': DailyNutrition.day_of(meal['meal_datetime']),
+                'food_type': food_type or meal.get('food_type') or 'other'
+            }
+
+            increments = {'meal_count': sign}
+            for field, nutrient_key in DailyNutrition.NUTRIENT_FIELDS.items():
+                increments[field] = sign * DailyNutrition._nutrient_value(nutrients, nutrient_key)
+
+            started_at = time.perf_counter()
+            result = db[DailyNutrition.COLLECTION].update_one(
+                key,
+                {'$inc': increments, '$set': {'updated_at': datetime.utcnow()}},
+                upsert=True
+            )
+            log_database_operation('update_one', DailyNutrition.COLLECTION, key, result, started_at=started_at)
+
+        except Exception as e:
+            # A missed update is repaired by the next rebuild
+            logging.error(f"Error updating daily nutrition rollup: {str(e)}")
+
+    @staticmethod
+    def move_meal(meal, old_food_type, new_food_type):
+        """Move a meal's contribution from one food type rollup to another"""
+        DailyNutrition.apply_meal(meal, -1, food_type=old_food_type)
+        DailyNutrition.apply_meal(meal, 1, food_type=new_food_type)
+
+    @staticmethod
+    def _merge(totals, group_key, values):
+        entry = totals.setdefault(group_key, {'calories': 0.0, 'protein': 0.0, 'carbs': 0.0, 'fat': 0.0, 'meal_count': 0})
+        for field in ('calories', 'protein', 'carbs', 'fat', 'meal_count'):
+            entry[field] += values.get(field) or 0
+
+    @staticmethod
+    def _aggregate_raw(db, user_id, date_query, by_food_type, totals):
+        """Aggregate raw meals for the partial days at the edges of a range"""
+        group = {
+            '_id': '$food_type' if by_food_type else None,
+            'meal_count': {'$sum': 1}
+        }
+        for field, nutrient_key in DailyNutrition.NUTRIENT_FIELDS.items():
+            group[field] = {'$sum': f'$nutrients.{nutrient_key}'}
+
+        pipeline = [
+            {'$match': {'user_id': user_id, 'meal_datetime': date_query}},
+            {'$group': group}
+        ]
+
+        for item in db.user_meals.aggregate(pipeline):
+            group_key = (item['_id'] or 'other') if by_food_type else None
+            DailyNutrition._merge(totals, group_key, item)
+
+    @staticmethod
+    def get_totals(user_id, start_date=None, end_date=None, by_food_type=False):
+        """
+        Sum nutrients for a user over [start_date, end_date]
+
+        Whole days inside the range are read from rollups; any partial day at
+        either edge is aggregated from the raw meals so results stay exact.
+
+        Returns:
+            Dict keyed by food type (or None when not grouping) with total
+            calories, protein, carbs, fat and meal_count
+        """
+        db = get_db()
+        user_id = ObjectId(user_id) if isinstance(user_id, str) else user_id
+        start = DailyNutrition.normalize_datetime(start_date)
+        end = DailyNutrition.normalize_datetime(end_date)
+
+        # First whole day on or after start, and the (exclusive) day boundary
+        # after the last whole day that ends on or before end
+        full_start = None
+        if start is not None:
+            full_start = DailyNutrition.day_of(start)
+            if full_start < start:
+                full_start += timedelta(days=1)
+        full_end = None
+        if end is not None:
+            full_end = DailyNutrition.day_of(end)
+            # Stored dates have millisecond precision, so an end at
+            # 23:59:59.999 (what the controllers send) covers the whole day
+            if end >= full_end + timedelta(days=1) - timedelta(milliseconds=1):
+                full_end += timedelta(days=1)
+
+        totals = {}
+
+        if full_start is not None and full_end is not None and full_start >= full_end:
+            # No whole day in range, aggregate it all from raw meals
+            DailyNutrition._aggregate_raw(db, user_id, {'$gte': start, '$lte': end}, by_food_type, totals)
+            return totals
+
+        rollup_query = {'user_id': user_id, 'meal_count': {'$gt': 0}}
+        day_query = {}
+        if full_start is not None:
+            day_query['$gte'] = full_start
+        if full_end is not None:
+            day_query['$lt'] = full_end
+        if day_query:
+            rollup_query['day'] = day_query
+
+        started_at = time.perf_counter()
+        rollups = list(db[DailyNutrition.COLLECTION].find(rollup_query))
+        log_database_operation('find', DailyNutrition.COLLECTION, rollup_query, rollups, started_at=started_at)
+
+        for rollup in rollups:
+            group_key = rollup.get('food_type', 'other') if by_food_type else None
+            DailyNutrition._merge(totals, group_key, rollup)
+
+        if start is not None and start < full_start:
+            DailyNutrition._aggregate_raw(db, user_id, {'$gte': start, '$lt': full_start}, by_food_type, totals)
+        if end is not None and full_end <= end:
+            DailyNutrition._aggregate_raw(db, user_id, {'$gte': full_end, '$lte': end}, by_food_type, totals)
+
+        return totals
+
+    @staticmethod
+    def rebuild(user_id=None):
+        """
+        Recompute rollups from user_meals (all users, or one user)
+
+        Safe to run while the API is serving traffic, but a meal written
+        while the aggregation is running may need another rebuild.
+        
+        Returns:
+            Number of rollup documents written
+        """
+        db = get_db()
+        stamp = datetime.utcnow()
+
+        match = {}
+        if user_id is not None:
+            match['user_id'] = ObjectId(user_id) if isinstance(user_id, str) else user_id
+
+        group = {
+            '_id': {
+                'user_id': '$user_id',
+                'day': {
+                    '$dateFromParts': {
+                        'year': {'$year': '$meal_datetime'},
+                        'month': {'$month': '$meal_datetime'},
+                        'day': {'$dayOfMonth': '$meal_datetime'}
+                    }
+                },
+                'food_type': {'$ifNull': ['$food_type', 'other']}
+            },
+            'meal_count': {'$sum': 1}
+        }
+        for field, nutrient_key in DailyNutrition.NUTRIENT_FIELDS.items():
+            group[field] = {'$sum': f'$nutrients.{nutrient_key}'}
+
+        pipeline = [{'$match': match}, {'$group': group}]
+
+        written = 0
+        operations = []
+        for item in db.user_meals.aggregate(pipeline, allowDiskUse=True):
+            key = item['_id']
+            values = {field: item.get(field, 0) for field in DailyNutrition.NUTRIENT_FIELDS}
+            values['meal_count'] = item['meal_count']
+            values['updated_at'] = stamp
+            operations.append(UpdateOne(key, {'$set': values}, upsert=True))
+
+            if len(operations) >= 1000:
+                db[DailyNutrition.COLLECTION].bulk_write(operations, ordered=False)
+                written += len(operations)
+                operations = []
+
+        if operations:
+            db[DailyNutrition.COLLECTION].bulk_write(operations, ordered=False)
+            written += len(operations)
+
+        # Drop rollups for days that no longer have meals (anything touched
+        # by a live write since the rebuild started is kept)
+        stale_query = dict(match)
+        stale_query['updated_at'] = {'$lt': stamp}
+        started_at = time.perf_counter()
+        result = db[DailyNutrition.COLLECTION].delete_many(stale_query)
+        log_database_operation('delete_many', DailyNutrition.COLLECTION, stale_query, result, started_at=started_at)
+
+        if user_id is None:
+            db.rollup_meta.update_one(
+                {'_id': DailyNutrition.META_ID},
+                {'$set': {'backfilled_at': stamp}},
+                upsert=True
+            )
+            DailyNutrition._ready = True
+
+        logging.info(f"Daily nutrition rollups rebuilt: {written} documents")
+        return written
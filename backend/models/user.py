@@ -1,8 +1,16 @@
 from datetime import datetime
 from bson import ObjectId
+from pymongo import UpdateOne
 from config.database import get_db
 from middleware.logging_middleware import log_database_operation
+from services.cache_service import get_named_cache
 import logging
+import time
+import copy
+
+def get_user_cache():
+    """Short-lived cache of User objects by Firebase UID (None when disabled)"""
+    return get_named_cache('user', 'USER_CACHE', max_entries=2048, ttl_seconds=30)
 
 class DisableRecord:
     def __init__(self, reason, end_date=None, is_permanent=False):
@@ -38,6 +46,8 @@ class User:
         self.disable_history = []
         self.created_at = datetime.utcnow()
         self.updated_at = datetime.utcnow()
+        # Fields modified since the user was loaded; save() only writes these
+        self._changed = set()
 
     def to_dict(self):
         """Convert user object to dictionary for MongoDB storage"""
@@ -131,7 +141,8 @@ class User:
         # Create new disable record
         new_record = DisableRecord(reason, end_date, is_permanent)
         self.disable_history.append(new_record.to_dict())
-        self.updated_at = datetime.utcnow()
+        self.mark_changed('disable_history')
+        self.invalidate_cache()
 
         return new_record
 
@@ -153,27 +164,58 @@ class User:
             'created_at': datetime.utcnow()
         }
         self.disable_history.append(enable_record)
+        self.mark_changed('disable_history')
+        self.invalidate_cache()
+
+    def mark_changed(self, *fields):
+        """Record fields modified outside the model's own methods so save() writes them"""
+        self._changed.update(fields)
         self.updated_at = datetime.utcnow()
 
+    def invalidate_cache(self):
+        """Drop this user from the UID cache so the next lookup reads the database"""
+        cache = get_user_cache()
+        if cache is not None:
+            cache.delete(self.uid)
+
+    def clone(self):
+        """Copy with its own mutable fields, so changes never leak into the cache"""
+        user = copy.copy(self)
+        user.avatar = dict(self.avatar) if self.avatar else self.avatar
+        user.push_tokens = list(self.push_tokens)
+        user.disable_history = [dict(record) for record in self.disable_history]
+        user._changed = set(self._changed)
+        return user
+
     def save(self):
-        """Save user to database"""
+        """
+        Save user to database
+
+        A new user is inserted whole. An existing user only gets a $set of
+        the fields changed since it was loaded (see mark_changed), so a
+        profile edit never rewrites disable_history or push tokens that
+        another request may be updating; returns None if nothing changed.
+        """
         try:
             db = get_db()
-            user_data = self.to_dict()
 
             if hasattr(self, '_id'):
                 # Update existing user
-                result = db.users.update_one(
-                    {'_id': self._id},
-                    {'$set': user_data}
-                )
-                log_database_operation('update_one', 'users', {'_id': self._id}, result)
+                if not self._changed:
+                    return None
+                user_data = self.to_dict()
+                fields = {field: user_data[field] for field in self._changed | {'updated_at'}}
+                result = self._update({'$set': fields})
+                self._changed = set()
                 return result
             else:
                 # Create new user
+                user_data = self.to_dict()
+                started_at = time.perf_counter()
                 result = db.users.insert_one(user_data)
                 self._id = result.inserted_id
-                log_database_operation('insert_one', 'users', user_data, result)
+                self._changed = set()
+                log_database_operation('insert_one', 'users', user_data, result, started_at=started_at)
                 return result
 
         except Exception as e:
@@ -185,8 +227,9 @@ class User:
         """Find user by Firebase UID"""
         try:
             db = get_db()
+            started_at = time.perf_counter()
             user_data = db.users.find_one({'uid': uid})
-            log_database_operation('find_one', 'users', {'uid': uid}, user_data)
+            log_database_operation('find_one', 'users', {'uid': uid}, user_data, started_at=started_at)
 
             if user_data:
                 user = User.from_dict(user_data)
@@ -198,13 +241,36 @@ class User:
             logging.error(f"Error finding user by UID: {str(e)}")
             raise e
 
+    @staticmethod
+    def find_by_uid_cached(uid):
+        """
+        Find user by Firebase UID, served from the user cache when possible
+
+        Used on every authenticated request. The cache is invalidated by save,
+        add_disable_record and enable_user in this process; other processes
+        see changes within USER_CACHE_TTL_SECONDS.
+        """
+        cache = get_user_cache()
+        if cache is None:
+            return User.find_by_uid(uid)
+
+        user = cache.get(uid)
+        if user is None:
+            user = User.find_by_uid(uid)
+            if user is None:
+                return None
+            cache.set(uid, user)
+
+        return user.clone()
+
     @staticmethod
     def find_by_email(email):
         """Find user by email"""
         try:
             db = get_db()
+            started_at = time.perf_counter()
             user_data = db.users.find_one({'email': email.lower().strip()})
-            log_database_operation('find_one', 'users', {'email': email}, user_data)
+            log_database_operation('find_one', 'users', {'email': email}, user_data, started_at=started_at)
 
             if user_data:
                 user = User.from_dict(user_data)
@@ -221,8 +287,9 @@ class User:
         """Find user by MongoDB ObjectId"""
         try:
             db = get_db()
+            started_at = time.perf_counter()
             user_data = db.users.find_one({'_id': ObjectId(user_id)})
-            log_database_operation('find_one', 'users', {'_id': user_id}, user_data)
+            log_database_operation('find_one', 'users', {'_id': user_id}, user_data, started_at=started_at)
 
             if user_data:
                 user = User.from_dict(user_data)
@@ -239,8 +306,9 @@ class User:
         """Get all users with pagination"""
         try:
             db = get_db()
+            started_at = time.perf_counter()
             users_data = list(db.users.find().skip(skip).limit(limit))
-            log_database_operation('find', 'users', {'skip': skip, 'limit': limit}, users_data)
+            log_database_operation('find', 'users', {'skip': skip, 'limit': limit}, users_data, started_at=started_at)
 
             users = []
             for user_data in users_data:
@@ -254,17 +322,140 @@ class User:
             logging.error(f"Error getting all users: {str(e)}")
             raise e
 
+    def _update(self, update):
+        """Apply an update operator document to this user's record and drop it from the cache"""
+        db = get_db()
+        started_at = time.perf_counter()
+        result = db.users.update_one({'_id': self._id}, update)
+        log_database_operation('update_one', 'users', {'_id': self._id}, result, started_at=started_at)
+        self.invalidate_cache()
+        return result
+
     def add_push_token(self, token):
-        """Add push notification token"""
+        """
+        Add push notification token
+
+        For a saved user this is written immediately with $addToSet, so
+        concurrent registrations from several devices can't overwrite each other.
+        """
         if token not in self.push_tokens:
             self.push_tokens.append(token)
-            self.updated_at = datetime.utcnow()
+        self.updated_at = datetime.utcnow()
+
+        if hasattr(self, '_id'):
+            try:
+                return self._update({
+                    '$addToSet': {'push_tokens': token},
+                    '$set': {'updated_at': self.updated_at}
+                })
+            except Exception as e:
+                logging.error(f"Error adding push token: {str(e)}")
+                raise e
 
     def remove_push_token(self, token):
-        """Remove push notification token"""
+        """Remove push notification token (written immediately with $pull for a saved user)"""
         if token in self.push_tokens:
             self.push_tokens.remove(token)
-            self.updated_at = datetime.utcnow()
+        self.updated_at = datetime.utcnow()
+
+        if hasattr(self, '_id'):
+            try:
+                return self._update({
+                    '$pull': {'push_tokens': token},
+                    '$set': {'updated_at': self.updated_at}
+                })
+            except Exception as e:
+                logging.error(f"Error removing push token: {str(e)}")
+                raise e
+
+    @staticmethod
+    def bulk_sync_push_tokens(syncs):
+        """
+        Apply push token changes for many users in one bulk_write
+
+        Args:
+            syncs: Mapping of Firebase UID to {'add': [...], 'remove': [...]},
+                e.g. the old and new token of each device that refreshed
+
+        Only push_tokens and updated_at are touched. MongoDB can't $pull and
+        $addToSet the same field in one update, so a user with both gets a
+        $pull followed by an $addToSet; the batch is ordered to keep that
+        sequence. Returns the bulk write's matched and modified counts.
+        """
+        now = datetime.utcnow()
+        operations = []
+        for uid, changes in syncs.items():
+            remove = list(changes.get('remove') or [])
+            add = list(changes.get('add') or [])
+            if remove:
+                operations.append(UpdateOne(
+                    {'uid': uid},
+                    {'$pull': {'push_tokens': {'$in': remove}}, '$set': {'updated_at': now}}
+                ))
+            if add:
+                operations.append(UpdateOne(
+                    {'uid': uid},
+                    {'$addToSet': {'push_tokens': {'$each': add}}, '$set': {'updated_at': now}}
+                ))
+
+        if not operations:
+            return {'matched': 0, 'modified': 0}
+
+        try:
+            db = get_db()
+            started_at = time.perf_counter()
+            result = db.users.bulk_write(operations, ordered=True)
+            log_database_operation('bulk_write', 'users', {'uid': {'$in': list(syncs)}}, result, started_at=started_at)
+
+            cache = get_user_cache()
+            if cache is not None:
+                for uid in syncs:
+                    cache.delete(uid)
+
+            return {'matched': result.matched_count, 'modified': result.modified_count}
+
+        except Exception as e:
+            logging.error(f"Error syncing push tokens: {str(e)}")
+            raise e
+
+    @staticmethod
+    def prune_push_tokens(tokens):
+        """
+        Remove push tokens from every user holding them, in one update_many
+
+        Used for tokens FCM reports as unregistered. Returns the number of
+        users modified.
+        """
+        tokens = list(tokens)
+        if not tokens:
+            return 0
+
+        try:
+            db = get_db()
+            query = {'push_tokens': {'$in': tokens}}
+            uids = [user_data['uid'] for user_data in db.users.find(query, {'uid': 1})]
+
+            started_at = time.perf_counter()
+            result = db.users.update_many(
+                query,
+                {
+                    '$pull': {'push_tokens': {'$in': tokens}},
+                    '$set': {'updated_at': datetime.utcnow()}
+                }
+            )
+            log_database_operation('update_many', 'users', query, result, started_at=started_at)
+
+            cache = get_user_cache()
+            if cache is not None:
+                for uid in uids:
+                    cache.delete(uid)
+
+            logging.info(f"Pruned {len(tokens)} invalid push tokens from {result.modified_count} users")
+            return result.modified_count
+
+        except Exception as e:
+            logging.error(f"Error pruning push tokens: {str(e)}")
+            raise e
 
     def update_profile(self, **kwargs):
         """Update user profile fields"""
@@ -273,6 +464,7 @@ class User:
         for field, value in kwargs.items():
             if field in allowed_fields:
                 setattr(self, field, value)
+                self._changed.add(field)
         
         self.updated_at = datetime.utcnow()
 
@@ -1,8 +1,14 @@
 from datetime import datetime
 from bson import ObjectId
+from bson.errors import InvalidId
+import base64
+from pymongo import ReturnDocument
 from config.database import get_db
+from models.daily_nutrition import DailyNutrition
+from services.cache_service import get_summary_cache
 from middleware.logging_middleware import log_database_operation
 import logging
+import time
 
 class UserMeal:
     # Define valid meal types
@@ -41,6 +47,111 @@ class UserMeal:
             logging.warning(f"Invalid food type '{food_type}', defaulting to 'other'")
             return 'other'
 
+    @staticmethod
+    def query_shapes():
+        """
+        Representative filter/sort shapes issued by this model
+        
+        Used by config.database.check_query_plans at startup; keep in sync
+        with the queries built below.
+        """
+        user_id = ObjectId()
+        start_date = datetime(2000, 1, 1)
+        end_date = datetime(2000, 1, 31)
+        date_range = {'$gte': start_date, '$lte': end_date}
+        newest_first = [('meal_datetime', -1), ('_id', -1)]
+        cursor = UserMeal.encode_cursor({'meal_datetime': end_date, '_id': ObjectId()})
+        
+        return [
+            ('get_user_meals', {'user_id': user_id}, newest_first),
+            ('get_user_meals_by_date', {'user_id': user_id, 'meal_datetime': date_range}, newest_first),
+            ('get_user_meals_cursor', UserMeal._apply_cursor({'user_id': user_id}, cursor), newest_first),
+            ('get_meals_by_food_type', {'user_id': user_id, 'food_type': 'lunch'}, newest_first),
+            ('get_meals_by_food_type_by_date', {'user_id': user_id, 'food_type': 'lunch', 'meal_datetime': date_range}, newest_first),
+            ('get_meals_by_food_type_cursor', UserMeal._apply_cursor({'user_id': user_id, 'food_type': 'lunch'}, cursor), newest_first),
+            ('get_meal_by_id', {'_id': ObjectId(), 'user_id': user_id}, None),
+            ('summary_match', {'user_id': user_id, 'meal_datetime': date_range}, None)
+        ]
+    
+    @staticmethod
+    def encode_cursor(meal):
+        """Build an opaque pagination cursor pointing just past this meal document"""
+        raw = f"{meal['meal_datetime'].isoformat()}|{meal['_id']}"
+        return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+    
+    @staticmethod
+    def decode_cursor(cursor):
+        """
+        Decode a pagination cursor into (meal_datetime, _id)
+        
+        Raises:
+            ValueError: If the cursor is malformed
+        """
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            raw = base64.urlsafe_b64decode(padded.encode('ascii')).decode('utf-8')
+            meal_datetime, meal_id = raw.split('|', 1)
+            return datetime.fromisoformat(meal_datetime), ObjectId(meal_id)
+        except (ValueError, TypeError, UnicodeError, InvalidId) as e:
+            raise ValueError(f"Invalid cursor: {str(e)}")
+    
+    @staticmethod
+    def _apply_cursor(query, cursor):
+        """Restrict a newest-first query to documents after the cursor position"""
+        if cursor:
+            after_datetime, after_id = UserMeal.decode_cursor(cursor)
+            query['$or'] = [
+                {'meal_datetime': {'$lt': after_datetime}},
+                {'meal_datetime': after_datetime, '_id': {'$lt': after_id}}
+            ]
+        return query
+    
+    @staticmethod
+    def _find_page(db, query, limit, offset=0, cursor=None):
+        """
+        Fetch one page of meals, newest first
+        
+        With cursor=None this is classic offset paging. Any other value
+        (including '' for the first page) switches to keyset paging on
+        (meal_datetime, _id), which costs the same at any depth.
+        
+        Returns:
+            Tuple of (meals, next_cursor)
+        """
+        sort = [('meal_datetime', -1), ('_id', -1)]
+        
+        if cursor is None:
+            meals = list(db.user_meals.find(query).sort(sort).skip(offset).limit(limit))
+            return meals, None
+        
+        UserMeal._apply_cursor(query, cursor)
+        
+        # Fetch one extra document to know whether another page exists
+        meals = list(db.user_meals.find(query).sort(sort).limit(limit + 1))
+        next_cursor = None
+        if len(meals) > limit:
+            meals = meals[:limit]
+            next_cursor = UserMeal.encode_cursor(meals[-1])
+        
+        return meals, next_cursor
+    
+    @staticmethod
+    def format_meal(meal):
+        """Convert a meal document into its API representation"""
+        return {
+            'id': str(meal['_id']),
+            'user_id': str(meal['user_id']),
+            'nutrients': meal['nutrients'],
+            'image_url': meal.get('image_url'),
+            'image_public_id': meal.get('image_public_id'),
+            'meal_name': meal.get('meal_name'),
+            'notes': meal.get('notes'),
+            'food_type': meal.get('food_type', 'other'),
+            'meal_datetime': meal['meal_datetime'].isoformat(),
+            'created_at': meal['created_at'].isoformat(),
+            'updated_at': meal['updated_at'].isoformat()
+        }
+    
     def to_dict(self):
         """Convert meal object to dictionary for MongoDB storage"""
         return {
@@ -72,15 +183,20 @@ class UserMeal:
                 food_type=food_type
             )
             
-            result = db.user_meals.insert_one(meal.to_dict())
-            log_database_operation('insert_one', 'user_meals', meal.to_dict(), result)
+            meal_doc = meal.to_dict()
+            started_at = time.perf_counter()
+            result = db.user_meals.insert_one(meal_doc)
+            log_database_operation('insert_one', 'user_meals', meal_doc, result, started_at=started_at)
+            
+            DailyNutrition.apply_meal(meal_doc, 1)
+            UserMeal.invalidate_summaries(user_id)
             
             logging.info(f"Meal created successfully for user {user_id}: {result.inserted_id}")
             
             return {
                 'success': True,
                 'meal_id': str(result.inserted_id),
-                'meal': meal.to_dict()
+                'meal': meal_doc
             }
             
         except Exception as e:
@@ -91,8 +207,8 @@ class UserMeal:
             }
 
     @staticmethod
-    def get_user_meals(user_id, limit=50, offset=0, start_date=None, end_date=None):
-        """Get meals for a specific user"""
+    def get_user_meals(user_id, limit=50, offset=0, start_date=None, end_date=None, cursor=None):
+        """Get meals for a specific user (offset paging, or keyset paging when cursor is not None)"""
         try:
             db = get_db()
             
@@ -112,35 +228,19 @@ class UserMeal:
                 query['meal_datetime'] = date_query
             
             # Get meals
-            meals = list(db.user_meals.find(query)
-                        .sort('meal_datetime', -1)
-                        .skip(offset)
-                        .limit(limit))
+            started_at = time.perf_counter()
+            meals, next_cursor = UserMeal._find_page(db, query, limit, offset, cursor)
             
-            log_database_operation('find', 'user_meals', query, meals)
+            log_database_operation('find', 'user_meals', query, meals, started_at=started_at)
             
             # Format response
-            meals_response = []
-            for meal in meals:
-                meal_data = {
-                    'id': str(meal['_id']),
-                    'user_id': str(meal['user_id']),
-                    'nutrients': meal['nutrients'],
-                    'image_url': meal.get('image_url'),
-                    'image_public_id': meal.get('image_public_id'),
-                    'meal_name': meal.get('meal_name'),
-                    'notes': meal.get('notes'),
-                    'food_type': meal.get('food_type', 'other'),
-                    'meal_datetime': meal['meal_datetime'].isoformat(),
-                    'created_at': meal['created_at'].isoformat(),
-                    'updated_at': meal['updated_at'].isoformat()
-                }
-                meals_response.append(meal_data)
+            meals_response = [UserMeal.format_meal(meal) for meal in meals]
             
             return {
                 'success': True,
                 'meals': meals_response,
-                'count': len(meals_response)
+                'count': len(meals_response),
+                'next_cursor': next_cursor
             }
             
         except Exception as e:
@@ -160,27 +260,14 @@ class UserMeal:
             if user_id:
                 query['user_id'] = ObjectId(user_id) if isinstance(user_id, str) else user_id
             
+            started_at = time.perf_counter()
             meal = db.user_meals.find_one(query)
-            log_database_operation('find_one', 'user_meals', query, meal)
+            log_database_operation('find_one', 'user_meals', query, meal, started_at=started_at)
             
             if meal:
-                meal_data = {
-                    'id': str(meal['_id']),
-                    'user_id': str(meal['user_id']),
-                    'nutrients': meal['nutrients'],
-                    'image_url': meal.get('image_url'),
-                    'image_public_id': meal.get('image_public_id'),
-                    'meal_name': meal.get('meal_name'),
-                    'notes': meal.get('notes'),
-                    'food_type': meal.get('food_type', 'other'),
-                    'meal_datetime': meal['meal_datetime'].isoformat(),
-                    'created_at': meal['created_at'].isoformat(),
-                    'updated_at': meal['updated_at'].isoformat()
-                }
-                
                 return {
                     'success': True,
-                    'meal': meal_data
+                    'meal': UserMeal.format_meal(meal)
                 }
             else:
                 return {
@@ -224,10 +311,25 @@ class UserMeal:
                 'user_id': ObjectId(user_id) if isinstance(user_id, str) else user_id
             }
             
-            result = db.user_meals.update_one(query, {'$set': update_data})
-            log_database_operation('update_one', 'user_meals', query, result)
-            
-            if result.modified_count > 0:
+            # Fetch the previous version in the same round trip so the daily
+            # rollup can follow a food type change
+            started_at = time.perf_counter()
+            previous = db.user_meals.find_one_and_update(
+                query,
+                {'$set': update_data},
+                return_document=ReturnDocument.BEFORE
+            )
+            log_database_operation('find_one_and_update', 'user_meals', query, previous, started_at=started_at)
+            
+            if previous is not None:
+                old_food_type = previous.get('food_type') or 'other'
+                new_food_type = update_data.get('food_type', old_food_type)
+                # Summaries only depend on nutrients, dates and food type, so
+                # renaming a meal or editing its notes keeps them cached
+                if new_food_type != old_food_type:
+                    DailyNutrition.move_meal(previous, old_food_type, new_food_type)
+                    UserMeal.invalidate_summaries(previous['user_id'])
+                
                 return {
                     'success': True,
                     'message': 'Meal updated successfully'
@@ -264,14 +366,18 @@ class UserMeal:
                 }
             
             # Delete from database
+            started_at = time.perf_counter()
             result = db.user_meals.delete_one({
                 '_id': ObjectId(meal_id),
                 'user_id': ObjectId(user_id) if isinstance(user_id, str) else user_id
             })
             
-            log_database_operation('delete_one', 'user_meals', {'_id': ObjectId(meal_id)}, result)
+            log_database_operation('delete_one', 'user_meals', {'_id': ObjectId(meal_id)}, result, started_at=started_at)
             
             if result.deleted_count > 0:
+                DailyNutrition.apply_meal(meal, -1)
+                UserMeal.invalidate_summaries(meal['user_id'])
+                
                 # Return image public_id so it can be deleted from Cloudinary by the caller
                 return {
                     'success': True,
@@ -291,10 +397,60 @@ class UserMeal:
                 'error': str(e)
             }
 
+    @staticmethod
+    def _summarize_totals(totals):
+        """Build the summary response block from DailyNutrition totals"""
+        meal_count = totals.get('meal_count', 0)
+        
+        def average(field):
+            return round(totals[field] / meal_count, 2) if meal_count else 0
+        
+        return {
+            'total_nutrients': {
+                'calories': round(totals.get('calories', 0), 2),
+                'protein': round(totals.get('protein', 0), 2),
+                'carbs': round(totals.get('carbs', 0), 2),
+                'fat': round(totals.get('fat', 0), 2)
+            },
+            'average_nutrients': {
+                'calories': average('calories'),
+                'protein': average('protein'),
+                'carbs': average('carbs'),
+                'fat': average('fat')
+            },
+            'meal_count': meal_count
+        }
+    
+    @staticmethod
+    def invalidate_summaries(user_id):
+        """Drop cached summaries after a user's meals change"""
+        cache = get_summary_cache()
+        if cache is not None:
+            cache.invalidate_user(user_id)
+    
     @staticmethod
     def get_nutrition_summary(user_id, start_date=None, end_date=None):
-        """Get nutrition summary for a user within a date range"""
+        """Get nutrition summary for a user within a date range (cached per user and range)"""
+        cache = get_summary_cache()
+        if cache is None:
+            return UserMeal._compute_nutrition_summary(user_id, start_date, end_date)
+        
+        return cache.get_or_compute(
+            user_id, 'nutrition', start_date, end_date,
+            lambda: UserMeal._compute_nutrition_summary(user_id, start_date, end_date)
+        )
+    
+    @staticmethod
+    def _compute_nutrition_summary(user_id, start_date=None, end_date=None):
         try:
+            # Serve from the daily rollups once they have been backfilled
+            if DailyNutrition.is_enabled():
+                totals = DailyNutrition.get_totals(user_id, start_date, end_date).get(None, {})
+                return {
+                    'success': True,
+                    'summary': UserMeal._summarize_totals(totals)
+                }
+            
             db = get_db()
             
             # Build match stage for aggregation
@@ -370,8 +526,8 @@ class UserMeal:
             }
 
     @staticmethod
-    def get_meals_by_food_type(user_id, food_type, limit=50, offset=0, start_date=None, end_date=None):
-        """Get meals for a specific user filtered by food type"""
+    def get_meals_by_food_type(user_id, food_type, limit=50, offset=0, start_date=None, end_date=None, cursor=None):
+        """Get meals for a specific user filtered by food type (keyset paging when cursor is not None)"""
         try:
             db = get_db()
             
@@ -401,36 +557,20 @@ class UserMeal:
                 query['meal_datetime'] = date_query
             
             # Get meals
-            meals = list(db.user_meals.find(query)
-                        .sort('meal_datetime', -1)
-                        .skip(offset)
-                        .limit(limit))
+            started_at = time.perf_counter()
+            meals, next_cursor = UserMeal._find_page(db, query, limit, offset, cursor)
             
-            log_database_operation('find', 'user_meals', query, meals)
+            log_database_operation('find', 'user_meals', query, meals, started_at=started_at)
             
             # Format response
-            meals_response = []
-            for meal in meals:
-                meal_data = {
-                    'id': str(meal['_id']),
-                    'user_id': str(meal['user_id']),
-                    'nutrients': meal['nutrients'],
-                    'image_url': meal.get('image_url'),
-                    'image_public_id': meal.get('image_public_id'),
-                    'meal_name': meal.get('meal_name'),
-                    'notes': meal.get('notes'),
-                    'food_type': meal.get('food_type', 'other'),
-                    'meal_datetime': meal['meal_datetime'].isoformat(),
-                    'created_at': meal['created_at'].isoformat(),
-                    'updated_at': meal['updated_at'].isoformat()
-                }
-                meals_response.append(meal_data)
+            meals_response = [UserMeal.format_meal(meal) for meal in meals]
             
             return {
                 'success': True,
                 'meals': meals_response,
                 'count': len(meals_response),
-                'food_type': food_type.lower()
+                'food_type': food_type.lower(),
+                'next_cursor': next_cursor
             }
             
         except Exception as e:
@@ -442,8 +582,30 @@ class UserMeal:
 
     @staticmethod
     def get_food_type_summary(user_id, start_date=None, end_date=None):
-        """Get nutrition summary grouped by food type"""
+        """Get nutrition summary grouped by food type (cached per user and range)"""
+        cache = get_summary_cache()
+        if cache is None:
+            return UserMeal._compute_food_type_summary(user_id, start_date, end_date)
+        
+        return cache.get_or_compute(
+            user_id, 'food_type', start_date, end_date,
+            lambda: UserMeal._compute_food_type_summary(user_id, start_date, end_date)
+        )
+    
+    @staticmethod
+    def _compute_food_type_summary(user_id, start_date=None, end_date=None):
         try:
+            # Serve from the daily rollups once they have been backfilled
+            if DailyNutrition.is_enabled():
+                totals_by_type = DailyNutrition.get_totals(user_id, start_date, end_date, by_food_type=True)
+                ordered = sorted(totals_by_type.items(), key=lambda item: item[1]['meal_count'], reverse=True)
+                return {
+                    'success': True,
+                    'summary_by_food_type': {
+                        food_type: UserMeal._summarize_totals(totals) for food_type, totals in ordered
+                    }
+                }
+            
             db = get_db()
             
             # Build match stage for aggregation
@@ -36,6 +36,46 @@ def predict_nutrients_only():
     """
     return NutrientController.predict_nutrients_only()
 
+@nutrient_bp.route('/predict-batch', methods=['POST'])
+def predict_nutrients_batch():
+    """
+    POST /api/v1/nutrients/predict-batch
+    
+    Predict nutrient values for several food images (e.g. the dishes of one
+    meal) in one request, without saving
+    
+    Request:
+    - Content-Type: multipart/form-data
+    - Body: 
+      - one or more image files with key 'images' (required, up to
+        ML_PREDICT_BATCH_MAX_IMAGES; the whole request is limited to 10MB)
+    
+    Response:
+    {
+        "success": true,
+        "message": "Nutrient prediction completed for 2 of 3 images",
+        "data": {
+            "images": [
+                {
+                    "index": 0,
+                    "filename": "rice.jpg",
+                    "success": true,
+                    "nutrients": {"Calories": 245.67, "Protein (g)": 5.1, "Carbs (g)": 52.3, "Fat (g)": 0.9},
+                    "temp_image_url": "https://res.cloudinary.com/...",
+                    "temp_image_public_id": "temp_meals/temp_meal_1725272400_1234_0"
+                },
+                {"index": 1, "filename": "curry.jpg", "success": true, "nutrients": {...}, ...},
+                {"index": 2, "filename": "notes.txt", "success": false, "error": "Invalid file type. ..."}
+            ],
+            "total_nutrients": {"Calories": 612.4, "Protein (g)": 28.2, "Carbs (g)": 71.0, "Fat (g)": 19.6},
+            "predicted_count": 2,
+            "failed_count": 1,
+            "valid_food_types": ["breakfast", "lunch", "dinner", "snacks", "drinks"]
+        }
+    }
+    """
+    return NutrientController.predict_nutrients_batch()
+
 @nutrient_bp.route('/save-meal', methods=['POST'])
 def save_meal():
     """
@@ -86,7 +126,26 @@ def get_model_status():
     {
         "success": true,
         "model_ready": true,
-        "message": "Model is ready"
+        "message": "Model is ready",
+        "batching": {
+            "max_batch_size": 8,
+            "window_ms": 5.0,
+            "queue_depth": 0,
+            "batches": 120,
+            "requests": 310,
+            "avg_batch_size": 2.58,
+            "avg_queue_wait_ms": 3.1,
+            "avg_inference_ms": 182.4,
+            "batch_size_histogram": {"1": 40, "2": 31, ...}
+        },
+        "prediction_cache": {
+            "exact_hits": 12,
+            "perceptual_hits": 3,
+            "misses": 295,
+            "hit_ratio": 0.0484,
+            "size": 295,
+            ...
+        }
     }
     """
     return NutrientController.get_model_status()
@@ -132,12 +191,15 @@ def get_user_meals():
     Query Parameters:
     - limit: Number of meals to return (default: 50, max: 100)
     - offset: Number of meals to skip (default: 0)
+    - cursor: Opaque keyset cursor. Send it empty (?cursor=) for the first
+      page and then pass back next_cursor; deep pages cost the same as the
+      first. Takes precedence over offset.
     - start_date: Filter meals from this date (ISO format)
     - end_date: Filter meals until this date (ISO format)
     
     Requires Firebase authentication (Bearer token in Authorization header)
     
-    Response:
+    Response (offset mode):
     {
         "success": true,
         "message": "Meals retrieved successfully",
@@ -148,6 +210,18 @@ def get_user_meals():
             "offset": 0
         }
     }
+    
+    Response (cursor mode):
+    {
+        "success": true,
+        "message": "Meals retrieved successfully",
+        "data": {
+            "meals": [...],
+            "count": 50,
+            "limit": 50,
+            "next_cursor": "MjAyNS0wOS0wMlQxMDozMDowMHw2NTA..."  // null on the last page
+        }
+    }
     """
     return NutrientController.get_user_meals()
 
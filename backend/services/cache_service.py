@@ -0,0 +1,314 @@
+from collections import OrderedDict
+import threading
+import logging
+import copy
+import json
+import time
+import os
+
+class TTLCache:
+    """
+    Thread-safe in-process cache with LRU eviction and per-entry expiry
+
+    Bounded by `max_entries`; each entry expires `ttl_seconds` after it was
+    stored (or at an explicit `expires_at` monotonic time when given).
+    """
+
+    def __init__(self, max_entries=1024, ttl_seconds=300):
+        self.max_entries = max(1, int(max_entries))
+        self.ttl_seconds = float(ttl_seconds)
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {
+            'hits': 0,
+            'misses': 0,
+            'evictions': 0,
+            'expirations': 0
+        }
+
+    def get(self, key):
+        """Return the cached value for key, or None"""
+        now = time.monotonic()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] <= now:
+                del self._entries[key]
+                self._stats['expirations'] += 1
+                entry = None
+
+            if entry is None:
+                self._stats['misses'] += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self._stats['hits'] += 1
+            return entry[0]
+
+    def set(self, key, value, expires_at=None):
+        """Store value under key, evicting the least recently used entries when full"""
+        if expires_at is None:
+            expires_at = time.monotonic() + self.ttl_seconds
+
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats['evictions'] += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self):
+        """Return hit/miss counters and current size"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['size'] = len(self._entries)
+
+        lookups = stats['hits'] + stats['misses']
+        stats['max_entries'] = self.max_entries
+        stats['ttl_seconds'] = self.ttl_seconds
+        stats['hit_ratio'] = round(stats['hits'] / lookups, 4) if lookups else 0
+        return stats
+
+class MemoryCacheBackend:
+    """Per-process storage for SummaryCache"""
+
+    name = 'memory'
+
+    def __init__(self, max_entries, ttl_seconds):
+        self.entries = TTLCache(max_entries, ttl_seconds)
+        # Generations are a few bytes per user and must never be evicted,
+        # otherwise a reset counter could make invalidated entries reachable
+        self.generations = {}
+        self.generations_lock = threading.Lock()
+
+    def get(self, key):
+        value = self.entries.get(key)
+        # Hand out a copy so callers can't modify the cached result
+        return copy.deepcopy(value) if value is not None else None
+
+    def set(self, key, value):
+        self.entries.set(key, copy.deepcopy(value))
+
+    def get_generation(self, user_id):
+        return self.generations.get(user_id, 0)
+
+    def bump_generation(self, user_id):
+        with self.generations_lock:
+            self.generations[user_id] = self.generations.get(user_id, 0) + 1
+
+class RedisCacheBackend:
+    """Redis storage for SummaryCache, shared by every worker process"""
+
+    name = 'redis'
+
+    def __init__(self, url, ttl_seconds, prefix='glycofit:summary'):
+        import redis  # Optional dependency, only needed for this backend
+
+        self.client = redis.Redis.from_url(url, socket_timeout=0.5, socket_connect_timeout=0.5)
+        self.ttl_seconds = max(1, int(ttl_seconds))
+        self.prefix = prefix
+
+    def get(self, key):
+        raw = self.client.get(f"{self.prefix}:{key}")
+        return json.loads(raw) if raw is not None else None
+
+    def set(self, key, value):
+        self.client.set(f"{self.prefix}:{key}", json.dumps(value, default=str), ex=self.ttl_seconds)
+
+    def get_generation(self, user_id):
+        raw = self.client.get(f"{self.prefix}:gen:{user_id}")
+        return int(raw) if raw is not None else 0
+
+    def bump_generation(self, user_id):
+        self.client.incr(f"{self.prefix}:gen:{user_id}")
+
+class SummaryCache:
+    """
+    Cache for per-user nutrition summaries
+
+    Keys combine the user, the kind of summary, the normalized date range and
+    the user's current generation. Any write to a user's meals bumps the
+    generation, which makes all of that user's cached summaries unreachable
+    at once; they then age out through LRU/TTL. Because the generation is
+    read before the summary is computed, a result that raced with a write is
+    stored under the old generation and is never served.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+
+        self._lock = threading.Lock()
+        self._stats = {
+            'hits': 0,
+            'misses': 0,
+            'invalidations': 0,
+            'errors': 0
+        }
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+    @staticmethod
+    def _normalize_range_value(value):
+        from models.daily_nutrition import DailyNutrition
+
+        value = DailyNutrition.normalize_datetime(value)
+        return value.isoformat() if value is not None else '-'
+
+    def get_or_compute(self, user_id, kind, start_date, end_date, compute):
+        """
+        Return a cached summary, or compute and cache it
+
+        Args:
+            compute: Callable returning the summary result dict; only results
+                with success=True are cached
+        """
+        user_id = str(user_id)
+
+        try:
+            date_range = f"{self._normalize_range_value(start_date)}:{self._normalize_range_value(end_date)}"
+        except ValueError:
+            # Invalid dates, let compute() report the error
+            return compute()
+
+        try:
+            generation = self.backend.get_generation(user_id)
+            key = f"{kind}:{user_id}:{generation}:{date_range}"
+            cached = self.backend.get(key)
+        except Exception as e:
+            logging.warning(f"Summary cache unavailable: {str(e)}")
+            self._count('errors')
+            return compute()
+
+        if cached is not None:
+            self._count('hits')
+            return cached
+
+        self._count('misses')
+        result = compute()
+
+        if result.get('success'):
+            try:
+                self.backend.set(key, result)
+            except Exception as e:
+                logging.warning(f"Could not store summary in cache: {str(e)}")
+                self._count('errors')
+
+        return result
+
+    def invalidate_user(self, user_id):
+        """Drop every cached summary for a user (call after any meal write)"""
+        try:
+            self.backend.bump_generation(str(user_id))
+            self._count('invalidations')
+        except Exception as e:
+            logging.error(f"Could not invalidate summary cache for user {user_id}: {str(e)}")
+            self._count('errors')
+
+    def get_stats(self):
+        """Return hit ratio and invalidation counters"""
+        with self._lock:
+            stats = dict(self._stats)
+
+        lookups = stats['hits'] + stats['misses']
+        stats['backend'] = self.backend.name
+        stats['hit_ratio'] = round(stats['hits'] / lookups, 4) if lookups else 0
+
+        if isinstance(self.backend, MemoryCacheBackend):
+            entry_stats = self.backend.entries.get_stats()
+            stats['size'] = entry_stats['size']
+            stats['max_entries'] = entry_stats['max_entries']
+            stats['evictions'] = entry_stats['evictions']
+            stats['ttl_seconds'] = entry_stats['ttl_seconds']
+
+        return stats
+
+# Named in-process caches (token, user, ...) created on first use
+named_caches = {}
+named_caches_lock = threading.Lock()
+
+def get_named_cache(name, env_prefix, max_entries=1024, ttl_seconds=300):
+    """
+    Get a shared TTLCache configured from the environment (None when disabled)
+
+    Reads {env_prefix}_ENABLED, {env_prefix}_MAX_ENTRIES and
+    {env_prefix}_TTL_SECONDS, falling back to the given defaults.
+    """
+    if name in named_caches:
+        return named_caches[name]
+
+    with named_caches_lock:
+        if name not in named_caches:
+            if os.getenv(f'{env_prefix}_ENABLED', 'true').lower() != 'true':
+                logging.info(f"{name} cache disabled")
+                named_caches[name] = None
+            else:
+                named_caches[name] = TTLCache(
+                    max_entries=int(os.getenv(f'{env_prefix}_MAX_ENTRIES', max_entries)),
+                    ttl_seconds=float(os.getenv(f'{env_prefix}_TTL_SECONDS', ttl_seconds))
+                )
+
+    return named_caches[name]
+
+def get_cache_stats():
+    """Return stats for every cache created so far"""
+    stats = {}
+
+    cache = get_summary_cache()
+    stats['summary'] = cache.get_stats() if cache else 'disabled'
+
+    for name, named_cache in list(named_caches.items()):
+        stats[name] = named_cache.get_stats() if named_cache else 'disabled'
+
+    return stats
+
+# Global summary cache instance
+summary_cache = None
+summary_cache_initialized = False
+summary_cache_lock = threading.Lock()
+
+def get_summary_cache():
+    """Get the shared summary cache, creating it on first use (None when disabled)"""
+    global summary_cache, summary_cache_initialized
+
+    if summary_cache_initialized:
+        return summary_cache
+
+    with summary_cache_lock:
+        if summary_cache_initialized:
+            return summary_cache
+
+        if os.getenv('SUMMARY_CACHE_ENABLED', 'true').lower() != 'true':
+            logging.info("Summary cache disabled")
+        else:
+            max_entries = int(os.getenv('SUMMARY_CACHE_MAX_ENTRIES', 4096))
+            ttl_seconds = float(os.getenv('SUMMARY_CACHE_TTL_SECONDS', 300))
+            backend_name = os.getenv('SUMMARY_CACHE_BACKEND', 'memory').lower()
+
+            backend = None
+            if backend_name == 'redis':
+                try:
+                    backend = RedisCacheBackend(os.getenv('SUMMARY_CACHE_REDIS_URL', 'redis://localhost:6379/0'), ttl_seconds)
+                except ImportError:
+                    logging.error("SUMMARY_CACHE_BACKEND=redis requires the 'redis' package, using the memory backend")
+
+            if backend is None:
+                backend = MemoryCacheBackend(max_entries, ttl_seconds)
+
+            summary_cache = SummaryCache(backend)
+            logging.info(f"Summary cache enabled (backend={backend.name}, ttl={ttl_seconds}s)")
+
+        summary_cache_initialized = True
+
+    return summary_cache
@@ -2,10 +2,18 @@ import cloudinary
 import cloudinary.uploader
 import cloudinary.api
 from flask import current_app
+from concurrent.futures import ThreadPoolExecutor
+from middleware.metrics_middleware import time_phase
+import threading
 import os
 import logging
 from datetime import datetime
 
+# Bounded executor for uploads that run alongside other request work
+upload_executor = None
+upload_slots = None
+upload_executor_lock = threading.Lock()
+
 def init_cloudinary():
     """Initialize Cloudinary with configuration"""
     try:
@@ -24,14 +32,40 @@ def init_cloudinary():
         logging.error(f"Failed to initialize Cloudinary: {str(e)}")
         raise e
 
+def get_upload_executor():
+    """Get the shared upload executor, creating it on first use"""
+    global upload_executor, upload_slots
+    
+    with upload_executor_lock:
+        if upload_executor is None:
+            max_workers = int(os.getenv('CLOUDINARY_UPLOAD_WORKERS', 4))
+            max_pending = int(os.getenv('CLOUDINARY_UPLOAD_MAX_PENDING', max_workers * 2))
+            upload_executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='cloudinary-upload')
+            upload_slots = threading.BoundedSemaphore(max_pending)
+            logging.info(f"Cloudinary upload executor started (workers={max_workers}, max_pending={max_pending})")
+    
+    return upload_executor
+
+def get_upload_timeout():
+    """Seconds to allow a single Cloudinary upload"""
+    return float(os.getenv('CLOUDINARY_UPLOAD_TIMEOUT_SECONDS', 20))
+
 class CloudinaryService:
     @staticmethod
-    def upload_image(file_path, folder=None, public_id=None, transformation=None):
-        """Upload image to Cloudinary"""
+    def upload_image(file, folder=None, public_id=None, transformation=None):
+        """
+        Upload image to Cloudinary
+        
+        Args:
+            file: Local path, remote URL, raw bytes or a file-like object.
+                In-memory data is streamed straight to Cloudinary without
+                touching the local disk.
+        """
         try:
             upload_options = {
                 'secure': True,
-                'resource_type': 'image'
+                'resource_type': 'image',
+                'timeout': get_upload_timeout()
             }
             
             if folder:
@@ -43,7 +77,8 @@ class CloudinaryService:
             if transformation:
                 upload_options['transformation'] = transformation
             
-            result = cloudinary.uploader.upload(file_path, **upload_options)
+            with time_phase('cloudinary', 'upload'):
+                result = cloudinary.uploader.upload(file, **upload_options)
             
             logging.info(f"Image uploaded successfully to Cloudinary: {result.get('public_id')}")
             
@@ -65,8 +100,55 @@ class CloudinaryService:
             }
     
     @staticmethod
-    def upload_avatar(file_path, user_id, old_public_id=None):
-        """Upload user avatar with specific settings"""
+    def upload_image_async(file, folder=None, public_id=None, transformation=None):
+        """
+        Start an image upload on the shared executor
+        
+        Returns:
+            A Future resolving to the upload_image result, or None when the
+            executor already has its maximum number of pending uploads
+        """
+        executor = get_upload_executor()
+        
+        if not upload_slots.acquire(blocking=False):
+            logging.warning("Cloudinary upload executor saturated, skipping background upload")
+            return None
+        
+        try:
+            future = executor.submit(
+                CloudinaryService.upload_image,
+                file=file,
+                folder=folder,
+                public_id=public_id,
+                transformation=transformation
+            )
+        except Exception:
+            upload_slots.release()
+            raise
+        
+        future.add_done_callback(lambda _: upload_slots.release())
+        return future
+    
+    @staticmethod
+    def discard_upload(future):
+        """Cancel a background upload, deleting the image if it finishes anyway"""
+        if future is None or future.cancel():
+            return
+        
+        def delete_orphan(done_future):
+            try:
+                result = done_future.result()
+                if result.get('success'):
+                    CloudinaryService.delete_image(result['public_id'])
+                    logging.info(f"Discarded orphaned upload: {result['public_id']}")
+            except Exception as e:
+                logging.warning(f"Failed to discard orphaned upload: {str(e)}")
+        
+        future.add_done_callback(delete_orphan)
+    
+    @staticmethod
+    def upload_avatar(file, user_id, old_public_id=None):
+        """Upload user avatar with specific settings (file: path, bytes or file-like object)"""
         try:
             # Delete old avatar if exists
             if old_public_id:
@@ -74,7 +156,7 @@ class CloudinaryService:
             
             # Upload new avatar
             result = CloudinaryService.upload_image(
-                file_path=file_path,
+                file=file,
                 folder='avatars',
                 public_id=f"avatar_{user_id}_{int(datetime.now().timestamp())}",
                 transformation=[
@@ -100,7 +182,8 @@ class CloudinaryService:
     def delete_image(public_id):
         """Delete image from Cloudinary"""
         try:
-            result = cloudinary.uploader.destroy(public_id)
+            with time_phase('cloudinary', 'destroy'):
+                result = cloudinary.uploader.destroy(public_id)
             
             if result.get('result') == 'ok':
                 logging.info(f"Image deleted successfully from Cloudinary: {public_id}")
@@ -113,6 +196,43 @@ class CloudinaryService:
             logging.error(f"Error deleting image from Cloudinary: {str(e)}")
             return False
     
+    @staticmethod
+    def move_image(from_public_id, to_public_id):
+        """
+        Move (rename) an image server-side
+        
+        The stored asset is relocated as-is, so no download, re-upload or
+        re-transcode happens and no transformation quota is used.
+        """
+        try:
+            with time_phase('cloudinary', 'rename'):
+                result = cloudinary.uploader.rename(
+                    from_public_id,
+                    to_public_id,
+                    overwrite=False,
+                    invalidate=True,
+                    timeout=get_upload_timeout()
+                )
+            
+            logging.info(f"Image moved on Cloudinary: {from_public_id} -> {result.get('public_id')}")
+            
+            return {
+                'success': True,
+                'public_id': result.get('public_id'),
+                'url': result.get('secure_url'),
+                'width': result.get('width'),
+                'height': result.get('height'),
+                'format': result.get('format'),
+                'bytes': result.get('bytes')
+            }
+            
+        except Exception as e:
+            logging.warning(f"Failed to move image on Cloudinary: {str(e)}")
+            return {
+                'success': False,
+                'error': str(e)
+            }
+    
     @staticmethod
     def get_image_info(public_id):
         """Get image information from Cloudinary"""
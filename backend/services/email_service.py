@@ -1,8 +1,10 @@
 from flask_mail import Mail, Message
 from flask import current_app
+from services.mail_dispatcher import get_mail_dispatcher, smtp_use_ssl
+from services.otp_store import get_otp_store
+from services.email_templates import get_email_templates
 import os
 import logging
-from datetime import datetime
 import random
 
 # Global mail instance
@@ -15,8 +17,8 @@ def init_mail(app):
     # Configure Flask-Mail
     app.config['MAIL_SERVER'] = os.getenv('SMTP_HOST', 'smtp.gmail.com')
     app.config['MAIL_PORT'] = int(os.getenv('SMTP_PORT', 465))
-    app.config['MAIL_USE_SSL'] = True
-    app.config['MAIL_USE_TLS'] = False
+    app.config['MAIL_USE_SSL'] = smtp_use_ssl()
+    app.config['MAIL_USE_TLS'] = not smtp_use_ssl()
     app.config['MAIL_USERNAME'] = os.getenv('SMTP_EMAIL')
     app.config['MAIL_PASSWORD'] = os.getenv('SMTP_PASSWORD')
     app.config['MAIL_DEFAULT_SENDER'] = (
@@ -26,10 +28,27 @@ def init_mail(app):
     
     mail = Mail(app)
     logging.info("Flask-Mail initialized successfully")
+    
+    # Compile the templates and start the background dispatcher now rather
+    # than on the first email
+    get_email_templates()
+    get_mail_dispatcher()
 
 def send_email(to_email, subject, html_content, text_content=None):
-    """Send email using Flask-Mail"""
+    """
+    Send email, queued for background delivery unless MAIL_ASYNC_ENABLED=false
+    
+    When queued, returns as soon as the message is on the queue; delivery
+    failures are logged and counted by the dispatcher instead of raised here.
+    """
     try:
+        dispatcher = get_mail_dispatcher()
+        if dispatcher is not None:
+            if not dispatcher.enqueue(to_email, subject, html_content, text_content):
+                raise Exception("Mail queue is full")
+            logging.info(f"Email queued for {to_email}")
+            return True
+        
         if not mail:
             raise Exception("Mail service not initialized")
         
@@ -54,103 +73,51 @@ def generate_otp(length=5):
 
 def create_otp_email_template(otp, purpose="verification"):
     """Create HTML email template for OTP"""
-    return f"""
-    <div style="font-family: Arial, sans-serif; max-width: 600px; margin: 0 auto; padding: 20px; border: 1px solid #e0e0e0; border-radius: 8px; background-color: #ffffff;">
-        <div style="text-align: center; margin-bottom: 30px;">
-            <h1 style="color: #2c5530; margin: 0; font-size: 28px;">GlycoFit</h1>
-            <p style="color: #666; margin: 5px 0; font-size: 16px;">Diabetes Management Made Simple</p>
-            <div style="height: 4px; background: linear-gradient(to right, #2c5530, #4a7c59); margin: 15px auto; width: 100px; border-radius: 2px;"></div>
-        </div>
-        
-        <div style="background-color: #f8f9fa; padding: 25px; border-radius: 8px; margin-bottom: 25px;">
-            <h2 style="color: #2c5530; margin: 0 0 15px 0; text-align: center;">Email Verification</h2>
-            <p style="color: #555; font-size: 16px; line-height: 1.6; text-align: center; margin: 0 0 20px 0;">
-                Thank you for choosing GlycoFit. Please use the following One-Time Password (OTP) to complete your {purpose}:
-            </p>
-            
-            <div style="text-align: center; margin: 25px 0;">
-                <div style="font-size: 36px; font-weight: bold; letter-spacing: 8px; padding: 20px; background-color: #ffffff; border: 2px solid #2c5530; border-radius: 8px; color: #2c5530; display: inline-block;">
-                    {otp}
-                </div>
-                <p style="color: #888; font-size: 14px; margin-top: 15px;">This OTP will expire in 10 minutes.</p>
-            </div>
-        </div>
-        
-        <div style="background-color: #e8f5e8; padding: 20px; border-radius: 8px; margin-bottom: 25px;">
-            <h3 style="color: #2c5530; margin: 0 0 10px 0; font-size: 18px;">Why GlycoFit?</h3>
-            <ul style="color: #555; font-size: 14px; line-height: 1.6; margin: 0; padding-left: 20px;">
-                <li>Track blood glucose levels effortlessly</li>
-                <li>Monitor your diabetes management progress</li>
-                <li>Get personalized insights and recommendations</li>
-                <li>Secure, private, and HIPAA-compliant platform</li>
-            </ul>
-        </div>
-        
-        <div style="text-align: center; padding: 20px 0; border-top: 1px solid #e0e0e0; color: #888; font-size: 14px;">
-            <p style="margin: 0 0 10px 0;">If you didn't request this OTP, please ignore this email.</p>
-            <p style="margin: 0;">Need help? Contact our support team.</p>
-            <p style="margin: 15px 0 0 0; font-weight: bold;">&copy; {datetime.now().year} GlycoFit. All rights reserved.</p>
-        </div>
-    </div>
-    """
+    return get_email_templates().render('otp', otp=otp, purpose=purpose, purpose_title=purpose.title()).html
 
 def create_welcome_email_template(user_name):
     """Create welcome email template"""
-    return f"""
-    <div style="font-family: Arial, sans-serif; max-width: 600px; margin: 0 auto; padding: 20px; border: 1px solid #e0e0e0; border-radius: 8px; background-color: #ffffff;">
-        <div style="text-align: center; margin-bottom: 30px;">
-            <h1 style="color: #2c5530; margin: 0; font-size: 28px;">Welcome to GlycoFit!</h1>
-            <div style="height: 4px; background: linear-gradient(to right, #2c5530, #4a7c59); margin: 15px auto; width: 150px; border-radius: 2px;"></div>
-        </div>
-        
-        <div style="margin-bottom: 25px;">
-            <h2 style="color: #2c5530; margin: 0 0 15px 0;">Hello {user_name},</h2>
-            <p style="color: #555; font-size: 16px; line-height: 1.6; margin: 0 0 15px 0;">
-                Congratulations! Your GlycoFit account has been successfully created. You're now part of a community dedicated to better diabetes management.
-            </p>
-        </div>
-        
-        <div style="background-color: #f8f9fa; padding: 25px; border-radius: 8px; margin-bottom: 25px;">
-            <h3 style="color: #2c5530; margin: 0 0 15px 0;">What's Next?</h3>
-            <ul style="color: #555; font-size: 14px; line-height: 1.8; margin: 0; padding-left: 20px;">
-                <li>Complete your profile setup in the app</li>
-                <li>Start logging your blood glucose readings</li>
-                <li>Set your target glucose ranges</li>
-                <li>Explore our tracking and analysis features</li>
-            </ul>
-        </div>
+    return get_email_templates().render('welcome', user_name=user_name).html
+
+def send_bulk_email(template_name, recipients):
+    """
+    Send one template to many recipients (campaign-style)
+    
+    Args:
+        template_name: Name of a template in templates/email
+        recipients: Iterable of (email, context dict) pairs
         
-        <div style="text-align: center; margin: 25px 0;">
-            <p style="color: #555; font-size: 16px; margin: 0 0 15px 0;">Ready to take control of your diabetes management?</p>
-            <div style="background-color: #2c5530; color: white; padding: 15px 30px; border-radius: 6px; display: inline-block; text-decoration: none; font-weight: bold;">
-                Get Started with GlycoFit
-            </div>
-        </div>
+    Returns:
+        Tuple of (sent or queued count, list of emails that failed)
         
-        <div style="text-align: center; padding: 20px 0; border-top: 1px solid #e0e0e0; color: #888; font-size: 14px;">
-            <p style="margin: 0 0 10px 0;">Need help getting started? Our support team is here to help.</p>
-            <p style="margin: 15px 0 0 0; font-weight: bold;">&copy; {datetime.now().year} GlycoFit. All rights reserved.</p>
-        </div>
-    </div>
+    Raises:
+        KeyError: Unknown template, before anything is sent
     """
-
-# OTP Storage (in production, use Redis or database)
-otp_store = {}
+    # Look the template up once, up front, so a bad name fails the whole
+    # campaign instead of part of it
+    template = get_email_templates().get(template_name)
+    
+    sent = 0
+    failed = []
+    for to_email, context in recipients:
+        try:
+            email = template.render(**context)
+            send_email(to_email, email.subject, email.html, email.text)
+            sent += 1
+        except Exception as e:
+            logging.error(f"Bulk email '{template_name}' to {to_email} failed: {str(e)}")
+            failed.append(to_email)
+    
+    logging.info(f"Bulk email '{template_name}': {sent} sent, {len(failed)} failed")
+    return sent, failed
 
 class OTPService:
     @staticmethod
     def generate_and_store_otp(email, purpose="verification", length=5, expires_in_minutes=10):
         """Generate OTP and store with expiration"""
         otp = generate_otp(length)
-        expires_at = datetime.now().timestamp() + (expires_in_minutes * 60)
         
-        otp_store[email] = {
-            'otp': otp,
-            'purpose': purpose,
-            'expires_at': expires_at,
-            'attempts': 0,
-            'max_attempts': 3
-        }
+        get_otp_store().put(email, otp, purpose, ttl_seconds=expires_in_minutes * 60, max_attempts=3)
         
         logging.info(f"OTP generated for {email} - Purpose: {purpose}")
         return otp
@@ -158,43 +125,20 @@ class OTPService:
     @staticmethod
     def verify_otp(email, otp):
         """Verify OTP"""
-        stored_data = otp_store.get(email)
-        
-        if not stored_data:
-            return False, "OTP not found or expired"
-        
-        # Check expiration
-        if datetime.now().timestamp() > stored_data['expires_at']:
-            del otp_store[email]
-            return False, "OTP has expired"
-        
-        # Check attempts
-        if stored_data['attempts'] >= stored_data['max_attempts']:
-            del otp_store[email]
-            return False, "Maximum verification attempts exceeded"
-        
-        # Verify OTP
-        if stored_data['otp'] != otp:
-            stored_data['attempts'] += 1
-            return False, f"Invalid OTP. {stored_data['max_attempts'] - stored_data['attempts']} attempts remaining"
-        
-        # Success - clean up
-        purpose = stored_data['purpose']
-        del otp_store[email]
-        return True, f"{purpose} successful"
+        return get_otp_store().verify(email, otp)
     
     @staticmethod
     def send_otp_email(email, purpose="verification"):
         """Generate and send OTP via email"""
         try:
             otp = OTPService.generate_and_store_otp(email, purpose)
-            html_content = create_otp_email_template(otp, purpose)
+            rendered = get_email_templates().render('otp', otp=otp, purpose=purpose, purpose_title=purpose.title())
             
             send_email(
                 to_email=email,
-                subject=f"GlycoFit - Your {purpose.title()} Code",
-                html_content=html_content,
-                text_content=f"Your GlycoFit {purpose} code is: {otp}. This code will expire in 10 minutes."
+                subject=rendered.subject,
+                html_content=rendered.html,
+                text_content=rendered.text
             )
             
             logging.info(f"OTP email sent successfully to {email}")
@@ -208,13 +152,13 @@ class OTPService:
     def send_welcome_email(email, user_name):
         """Send welcome email to new user"""
         try:
-            html_content = create_welcome_email_template(user_name)
+            rendered = get_email_templates().render('welcome', user_name=user_name)
             
             send_email(
                 to_email=email,
-                subject="Welcome to GlycoFit - Let's Start Your Journey",
-                html_content=html_content,
-                text_content=f"Welcome to GlycoFit, {user_name}! Your account has been successfully created."
+                subject=rendered.subject,
+                html_content=rendered.html,
+                text_content=rendered.text
             )
             
             logging.info(f"Welcome email sent successfully to {email}")
@@ -0,0 +1,162 @@
+from collections import namedtuple
+from datetime import date
+import threading
+import logging
+import html
+import re
+import os
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'templates', 'email')
+
+# {{ name }} slots; names are plain identifiers
+SLOT_PATTERN = re.compile(r'\{\{\s*([A-Za-z_][A-Za-z0-9_]*)\s*\}\}')
+
+RenderedEmail = namedtuple('RenderedEmail', ('subject', 'html', 'text'))
+
+class CompiledTemplate:
+    """
+    One template part split into literal segments and slot positions
+
+    Parsing happens once; rendering copies the segment list, drops the
+    values into the slot positions and joins. Slots listed in `constants`
+    are folded into the neighbouring literals at compile time.
+    """
+
+    def __init__(self, source, escape=False, constants=None):
+        self.escape = escape
+        constants = constants or {}
+
+        segments = []
+        self.positions = []
+        literal = []
+        position = 0
+        for match in SLOT_PATTERN.finditer(source):
+            literal.append(source[position:match.start()])
+            name = match.group(1)
+            if name in constants:
+                value = str(constants[name])
+                literal.append(html.escape(value) if escape else value)
+            else:
+                segments.append(''.join(literal))
+                literal = []
+                self.positions.append((len(segments), name))
+                segments.append(None)
+            position = match.end()
+        literal.append(source[position:])
+        segments.append(''.join(literal))
+
+        self.segments = segments
+        self.slots = set(name for _, name in self.positions)
+
+    def render(self, values):
+        """Render with already-escaped values"""
+        parts = self.segments[:]
+        for index, name in self.positions:
+            parts[index] = values[name]
+        return ''.join(parts)
+
+class EmailTemplate:
+    """Subject, HTML and text parts of one email, rendered together"""
+
+    def __init__(self, name, subject, html_source, text_source, constants=None):
+        self.name = name
+        self.subject = CompiledTemplate(subject, constants=constants)
+        self.html = CompiledTemplate(html_source, escape=True, constants=constants)
+        self.text = CompiledTemplate(text_source, constants=constants)
+        self.slots = self.subject.slots | self.html.slots | self.text.slots
+
+    def render(self, **context):
+        missing = self.slots.difference(context)
+        if missing:
+            raise ValueError(f"Missing values for email template '{self.name}': {', '.join(sorted(missing))}")
+
+        plain = {name: str(context[name]) for name in self.slots}
+        escaped = {name: html.escape(value) for name, value in plain.items()}
+        return RenderedEmail(self.subject.render(plain), self.html.render(escaped), self.text.render(plain))
+
+class EmailTemplateRegistry:
+    """
+    Loads and compiles every template in templates/email once
+
+    A template is a set of files sharing a name: <name>.html, <name>.txt
+    and <name>.subject.txt. {{ year }} is bound at compile time; templates
+    are recompiled when the year rolls over.
+    """
+
+    def __init__(self, template_dir=TEMPLATE_DIR):
+        self.template_dir = template_dir
+        self.templates = {}
+        self.year = None
+        self._lock = threading.Lock()
+        self.load()
+
+    def _read(self, filename):
+        with open(os.path.join(self.template_dir, filename), encoding='utf-8') as template_file:
+            return template_file.read().rstrip('\n')
+
+    def load(self):
+        year = date.today().year
+        constants = {'year': year}
+        templates = {}
+
+        for filename in sorted(os.listdir(self.template_dir)):
+            if not filename.endswith('.html'):
+                continue
+            name = filename[:-len('.html')]
+            templates[name] = EmailTemplate(
+                name,
+                subject=self._read(f"{name}.subject.txt"),
+                html_source=self._read(filename),
+                text_source=self._read(f"{name}.txt"),
+                constants=constants
+            )
+
+        self.templates = templates
+        self.year = year
+        logging.info(f"Compiled {len(templates)} email templates: {', '.join(templates)}")
+
+    def get(self, name):
+        if date.today().year != self.year:
+            with self._lock:
+                if date.today().year != self.year:
+                    self.load()
+
+        template = self.templates.get(name)
+        if template is None:
+            raise KeyError(f"Unknown email template: {name}")
+        return template
+
+    def render(self, name, **context):
+        """
+        Render one email
+
+        Returns:
+            RenderedEmail(subject, html, text)
+        """
+        return self.get(name).render(**context)
+
+    def render_bulk(self, name, contexts):
+        """
+        Render one template for many recipients
+
+        Looks the template up once and yields a RenderedEmail per context,
+        lazily, so a campaign to thousands of users never holds every
+        rendered message in memory at once.
+        """
+        template = self.get(name)
+        for context in contexts:
+            yield template.render(**context)
+
+# Global instance
+email_templates = None
+email_templates_lock = threading.Lock()
+
+def get_email_templates():
+    """Get the compiled template registry, loading it on first use"""
+    global email_templates
+
+    with email_templates_lock:
+        if email_templates is None:
+            email_templates = EmailTemplateRegistry()
+
+    return email_templates
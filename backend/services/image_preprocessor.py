@@ -0,0 +1,77 @@
+from PIL import Image, ImageOps
+import numpy as np
+import logging
+import os
+import io
+
+import torch
+
+IMAGENET_MEAN = (0.485, 0.456, 0.406)
+IMAGENET_STD = (0.229, 0.224, 0.225)
+
+class FastImagePreprocessor:
+    """
+    Decode-and-normalize path equivalent to Resize -> ToTensor -> Normalize
+
+    Phone photos are 12 MP JPEGs but the model only sees 224x224, so:
+    - JPEGs are decoded in draft mode, letting libjpeg scale the DCT by up to
+      1/8 while staying at or above the target size (a 4032x3024 photo
+      decodes as 504x378, about 1/64 of the pixels)
+    - the image is turned upright from its EXIF orientation tag
+    - PIL resizes to the target size (antialiased bilinear, like
+      torchvision's Resize on PIL images)
+    - ToTensor and Normalize collapse into a single multiply-add per channel
+      that reads the uint8 HWC pixels and writes straight into the
+      (1, C, H, W) output tensor, with no float intermediates
+    """
+
+    def __init__(self, size=(224, 224), mean=IMAGENET_MEAN, std=IMAGENET_STD):
+        self.size = tuple(size)
+        std = np.asarray(std, dtype=np.float32)
+        # (x / 255 - mean) / std == x * scale + bias
+        self.scale = (1.0 / (255.0 * std)).reshape(3, 1, 1)
+        self.bias = (-np.asarray(mean, dtype=np.float32) / std).reshape(3, 1, 1)
+
+    def load(self, image_data):
+        """Decode raw bytes (or take a PIL image) into an upright RGB image at the target size"""
+        if isinstance(image_data, (bytes, bytearray)):
+            image = Image.open(io.BytesIO(image_data))
+        else:
+            image = image_data
+
+        width, height = self.size
+        # Orientations 5-8 swap the axes, so make both decoded sides large enough
+        target = max(width, height)
+        # No-op for formats other than JPEG
+        image.draft('RGB', (target, target))
+
+        image = ImageOps.exif_transpose(image)
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
+
+        if image.size != self.size:
+            image = image.resize(self.size, Image.BILINEAR)
+        return image
+
+    def __call__(self, image_data):
+        """
+        Preprocess one image
+
+        Returns:
+            Float32 tensor of shape (1, 3, H, W)
+        """
+        pixels = np.asarray(self.load(image_data))
+
+        width, height = self.size
+        output = torch.empty((1, 3, height, width), dtype=torch.float32)
+        buffer = output.numpy()[0]
+        np.multiply(pixels.transpose(2, 0, 1), self.scale, out=buffer)
+        np.add(buffer, self.bias, out=buffer)
+        return output
+
+def create_fast_preprocessor():
+    """Build the fast preprocessing path unless ML_FAST_PREPROCESS is disabled"""
+    if os.getenv('ML_FAST_PREPROCESS', 'true').lower() != 'true':
+        logging.info("Fast image preprocessing disabled, using torchvision transforms")
+        return None
+    return FastImagePreprocessor()
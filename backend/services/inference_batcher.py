@@ -0,0 +1,165 @@
+import threading
+import queue
+import logging
+import time
+
+class _PendingPrediction:
+    """A single request waiting for its slot in a batch"""
+
+    __slots__ = ('tensor', 'enqueued_at', 'event', 'result', 'error')
+
+    def __init__(self, tensor):
+        self.tensor = tensor
+        self.enqueued_at = time.perf_counter()
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+class InferenceBatcher:
+    """
+    Micro-batching scheduler for model inference
+
+    Request threads submit single preprocessed images and block until their
+    result is ready. A background worker collects concurrent submissions for
+    up to `max_wait_ms` (or until `max_batch_size` is reached), runs them as
+    one stacked forward pass and fans the rows back out to the callers.
+    """
+
+    def __init__(self, run_batch, max_batch_size=8, max_wait_ms=5, request_timeout=30):
+        """
+        Args:
+            run_batch: Callable taking a list of (1, C, H, W) tensors and
+                returning one output row per input
+            max_batch_size: Maximum number of images per forward pass
+            max_wait_ms: How long to hold the first request while waiting for more
+            request_timeout: Seconds a caller waits for its result before giving up
+        """
+        self.run_batch = run_batch
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self.request_timeout = request_timeout
+
+        self._queue = queue.Queue()
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            'batches': 0,
+            'requests': 0,
+            'failed_batches': 0,
+            'max_batch_size_seen': 0,
+            'total_queue_wait_ms': 0.0,
+            'total_inference_ms': 0.0,
+            'last_batch_size': 0,
+            'last_inference_ms': 0.0,
+            'batch_size_histogram': {}
+        }
+
+        self._worker = threading.Thread(target=self._worker_loop, name='inference-batcher', daemon=True)
+        self._worker.start()
+        logging.info(f"Inference batcher started (max_batch_size={self.max_batch_size}, window={max_wait_ms}ms)")
+
+    def submit(self, tensor):
+        """
+        Queue a preprocessed image and wait for its prediction row
+
+        Args:
+            tensor: Preprocessed image tensor with a batch dimension of 1
+
+        Returns:
+            The model output row for this image
+        """
+        pending = _PendingPrediction(tensor)
+        self._queue.put(pending)
+
+        if not pending.event.wait(self.request_timeout):
+            raise TimeoutError(f"Inference did not complete within {self.request_timeout}s")
+
+        if pending.error is not None:
+            raise pending.error
+
+        return pending.result
+
+    def _collect_batch(self):
+        """Block for the first request, then gather more until the window closes"""
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                # Window closed, but still take anything that is already waiting
+                try:
+                    batch.append(self._queue.get_nowait())
+                    continue
+                except queue.Empty:
+                    break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+
+        return batch
+
+    def _worker_loop(self):
+        while True:
+            batch = self._collect_batch()
+            started_at = time.perf_counter()
+
+            try:
+                outputs = self.run_batch([pending.tensor for pending in batch])
+                for pending, output in zip(batch, outputs):
+                    pending.result = output
+                failed = False
+            except Exception as e:
+                logging.error(f"Batched inference failed for {len(batch)} request(s): {str(e)}")
+                for pending in batch:
+                    pending.error = e
+                failed = True
+
+            finished_at = time.perf_counter()
+            for pending in batch:
+                pending.event.set()
+
+            self._record_batch(batch, started_at, finished_at, failed)
+
+    def _record_batch(self, batch, started_at, finished_at, failed):
+        batch_size = len(batch)
+        inference_ms = (finished_at - started_at) * 1000
+        queue_wait_ms = sum((started_at - pending.enqueued_at) * 1000 for pending in batch)
+
+        with self._stats_lock:
+            stats = self._stats
+            stats['batches'] += 1
+            stats['requests'] += batch_size
+            stats['failed_batches'] += 1 if failed else 0
+            stats['max_batch_size_seen'] = max(stats['max_batch_size_seen'], batch_size)
+            stats['total_queue_wait_ms'] += queue_wait_ms
+            stats['total_inference_ms'] += inference_ms
+            stats['last_batch_size'] = batch_size
+            stats['last_inference_ms'] = inference_ms
+            histogram = stats['batch_size_histogram']
+            histogram[batch_size] = histogram.get(batch_size, 0) + 1
+
+    def get_stats(self):
+        """Return batch size and latency statistics for tuning the window"""
+        with self._stats_lock:
+            stats = dict(self._stats)
+            stats['batch_size_histogram'] = {str(size): count for size, count in sorted(stats['batch_size_histogram'].items())}
+
+        batches = stats['batches'] or 1
+        requests = stats['requests'] or 1
+
+        return {
+            'max_batch_size': self.max_batch_size,
+            'window_ms': self.max_wait * 1000,
+            'queue_depth': self._queue.qsize(),
+            'batches': stats['batches'],
+            'requests': stats['requests'],
+            'failed_batches': stats['failed_batches'],
+            'avg_batch_size': round(stats['requests'] / batches, 2) if stats['batches'] else 0,
+            'max_batch_size_seen': stats['max_batch_size_seen'],
+            'avg_queue_wait_ms': round(stats['total_queue_wait_ms'] / requests, 2),
+            'avg_inference_ms': round(stats['total_inference_ms'] / batches, 2),
+            'last_batch_size': stats['last_batch_size'],
+            'last_inference_ms': round(stats['last_inference_ms'], 2),
+            'batch_size_histogram': stats['batch_size_histogram']
+        }
@@ -0,0 +1,321 @@
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+import threading
+import logging
+import time
+import os
+
+import torch
+import torch.multiprocessing
+
+# Modes whose workers are built on one shared copy of the fp32 state dict.
+# int8_static and exported artifacts are TorchScript modules that own their
+# storage, so each worker loads its own copy of those.
+SHARED_WEIGHT_MODES = ('fp32', 'channels_last', 'int8_dynamic')
+
+# Seconds to wait for every worker to load its model
+STARTUP_TIMEOUT_SECONDS = 120
+
+# Loaded by each worker process in _init_worker
+_worker_model = None
+_worker_channels_last = False
+
+def load_shared_state_dict(weights_path, channels_last=False):
+    """
+    Load the fp32 weights into shared memory, once, in the serving process
+
+    Tensors in the returned state dict travel to spawned workers as handles
+    to the same pages rather than as copies. Conv weights are converted to
+    NHWC here for channels_last, so the workers' .to(channels_last) is a no-op
+    instead of a private copy.
+    """
+    state_dict = torch.load(weights_path, map_location='cpu', mmap=True)
+    for name, tensor in state_dict.items():
+        if channels_last and tensor.dim() == 4:
+            tensor = tensor.contiguous(memory_format=torch.channels_last)
+        state_dict[name] = tensor.share_memory_()
+    return state_dict
+
+def build_shared_model(state_dict, mode):
+    """NutrientPredictor whose parameters are the (shared) state dict tensors themselves"""
+    from services.ml_service import NutrientPredictor
+    from services.model_optimizer import quantize_dynamic
+
+    # Build on the meta device so no throwaway weights are allocated
+    with torch.device('meta'):
+        model = NutrientPredictor()
+    model.load_state_dict(state_dict, assign=True)
+    model.eval()
+
+    if mode == 'int8_dynamic':
+        # Only the Linear head is quantized; in place, because the default
+        # deep copy would give every worker private conv weights
+        model = quantize_dynamic(model, inplace=True)
+    return model
+
+def _load_worker_model(shared_state_dict, artifact_path, weights_path, mode):
+    """
+    Build the worker's model: on the shared weights when the mode allows it,
+    otherwise the way the serving process loaded it
+    """
+    if shared_state_dict is not None:
+        return build_shared_model(shared_state_dict, mode), mode == 'channels_last'
+
+    device = torch.device('cpu')
+    if artifact_path:
+        from services.model_export import load_artifact
+        model, metadata = load_artifact(artifact_path, device)
+        return model, metadata['channels_last']
+
+    from services.ml_service import NutrientPredictor, build_transform
+    from services.model_optimizer import optimize_model
+    model = NutrientPredictor()
+    model.load_state_dict(torch.load(weights_path, map_location=device))
+    model.eval()
+    # int8_static comes from the calibration cache the serving process wrote
+    model, channels_last, _ = optimize_model(model, mode, weights_path, build_transform(), device)
+    return model, channels_last
+
+def _init_worker(num_threads, shared_state_dict, artifact_path, weights_path, mode):
+    global _worker_model, _worker_channels_last
+
+    # The parent's logging queue has no listener in the child, so write
+    # straight to stderr instead
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - worker %(process)d - %(levelname)s - %(message)s', force=True)
+    torch.set_num_threads(num_threads)
+    _worker_model, _worker_channels_last = _load_worker_model(shared_state_dict, artifact_path, weights_path, mode)
+
+def _worker_ready():
+    # Stay busy briefly so the other ready checks land on other workers
+    time.sleep(0.05)
+    return os.getpid()
+
+def _worker_predict(batch):
+    """Run one forward pass in a worker; batch is a (N, C, H, W) float32 array"""
+    tensor = torch.from_numpy(batch)
+    if _worker_channels_last:
+        tensor = tensor.contiguous(memory_format=torch.channels_last)
+    with torch.inference_mode():
+        return _worker_model(tensor).numpy()
+
+def _terminate_workers(executor):
+    # shutdown() leaves a worker that hangs while loading running, and
+    # ProcessPoolExecutor only gains a public way to kill workers in 3.14
+    for process in list((executor._processes or {}).values()):
+        process.terminate()
+
+def get_inference_backend():
+    backend = os.getenv('ML_BACKEND', 'thread').lower()
+    if backend not in ('thread', 'process'):
+        logging.warning(f"Unknown ML_BACKEND '{backend}', using thread")
+        backend = 'thread'
+    return backend
+
+class InferencePool:
+    """
+    Runs model forward passes in a pool of worker processes
+
+    Waitress serves every request on a thread of one process, so in-process
+    inference shares one GIL and one torch intra-op pool. Workers are
+    started with the spawn method: by the time the pool starts, the serving
+    process already runs logging, MongoDB monitor and OpenMP threads, and
+    forking it could deadlock the children.
+
+    For the SHARED_WEIGHT_MODES the fp32 weights are loaded once into shared
+    memory and every worker (and `model`, the serving process's copy) is
+    built on those same pages. int8_static and exported artifacts can't be
+    shared that way, so each worker then loads its own copy. Preprocessed
+    batches go to the workers as contiguous numpy arrays and only the small
+    prediction arrays come back.
+    """
+
+    def __init__(self, artifact_path=None, weights_path=None, mode='fp32', num_workers=2, worker_threads=1, request_timeout=30):
+        """
+        Args:
+            artifact_path: TorchScript artifact the serving process loaded, if any
+            weights_path: Trained state dict
+            mode: Inference mode to apply to the weights (see optimize_model)
+            num_workers: Number of worker processes
+            worker_threads: torch intra-op threads per worker
+            request_timeout: Seconds a caller waits for its result before giving up
+        """
+        self.artifact_path = artifact_path
+        self.weights_path = weights_path
+        self.mode = mode
+        self.num_workers = max(1, int(num_workers))
+        self.worker_threads = max(1, int(worker_threads))
+        self.request_timeout = request_timeout
+
+        # Shared weights when the mode allows it (the artifact and the .pth
+        # hold the same weights; load_artifact checks the digest)
+        self.shared_state_dict = None
+        self.model = None
+        if mode in SHARED_WEIGHT_MODES and weights_path and os.path.exists(weights_path):
+            self.shared_state_dict = load_shared_state_dict(weights_path, channels_last=(mode == 'channels_last'))
+            self.model = build_shared_model(self.shared_state_dict, mode)
+        elif mode in SHARED_WEIGHT_MODES:
+            logging.info(f"No weights file at {weights_path} to share, each inference worker loads its own copy of the artifact")
+        else:
+            logging.info(f"Inference mode {mode} can't share weights between processes, each worker loads its own copy")
+
+        # _lock guards the executor swap only; stats have their own lock so
+        # a restart never blocks requests or /model-status
+        self._lock = threading.Lock()
+        self._executor = None
+        self._restarting = False
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            'requests': 0,
+            'failed_requests': 0,
+            'restarts': 0,
+            'total_inference_ms': 0.0
+        }
+
+        self._executor = self._start()
+
+    def _start(self):
+        """
+        Start the workers and wait until every one has loaded its model
+
+        Raises:
+            RuntimeError: A worker failed to load its model or not every
+                worker was ready within STARTUP_TIMEOUT_SECONDS
+        """
+        executor = ProcessPoolExecutor(
+            max_workers=self.num_workers,
+            mp_context=torch.multiprocessing.get_context('spawn'),
+            initializer=_init_worker,
+            initargs=(self.worker_threads, self.shared_state_dict, self.artifact_path, self.weights_path, self.mode)
+        )
+        # A worker that is up early can answer several checks while another
+        # is still loading, so repeat until each one has answered
+        pids = set()
+        deadline = time.monotonic() + STARTUP_TIMEOUT_SECONDS
+        try:
+            while len(pids) < self.num_workers:
+                futures = [executor.submit(_worker_ready) for _ in range(self.num_workers)]
+                for future in futures:
+                    pids.add(future.result(timeout=max(0, deadline - time.monotonic())))
+        except (BrokenProcessPool, FutureTimeoutError) as e:
+            _terminate_workers(executor)
+            executor.shutdown(wait=False, cancel_futures=True)
+            if isinstance(e, BrokenProcessPool):
+                raise RuntimeError("Inference worker failed while loading the model (see the worker log above)") from e
+            raise RuntimeError(f"Only {len(pids)} of {self.num_workers} inference workers were ready after {STARTUP_TIMEOUT_SECONDS}s") from e
+
+        logging.info(f"Inference pool started ({self.num_workers} workers x {self.worker_threads} threads, shared weights: {self.shared_state_dict is not None}, pids={sorted(pids)})")
+        return executor
+
+    def _count(self, key, amount=1):
+        with self._stats_lock:
+            self._stats[key] += amount
+
+    def run(self, batch):
+        """
+        Run a forward pass in a worker process
+
+        Args:
+            batch: Preprocessed (N, C, H, W) CPU tensor
+
+        Returns:
+            Numpy array with one output row per input
+        """
+        started_at = time.perf_counter()
+        array = batch.contiguous().numpy()
+        executor = self._executor
+        if executor is None:
+            self._count('failed_requests')
+            raise RuntimeError("Inference workers are restarting")
+
+        try:
+            result = executor.submit(_worker_predict, array).result(timeout=self.request_timeout)
+        except BrokenProcessPool:
+            self._count('failed_requests')
+            self._restart(executor)
+            raise RuntimeError("Inference worker process died")
+        except Exception:
+            self._count('failed_requests')
+            raise
+
+        with self._stats_lock:
+            self._stats['requests'] += 1
+            self._stats['total_inference_ms'] += (time.perf_counter() - started_at) * 1000
+        return result
+
+    def _restart(self, broken_executor):
+        """Replace a broken executor; the new workers load in the background"""
+        with self._lock:
+            # Another request thread may already have replaced it
+            if self._executor is not broken_executor or self._restarting:
+                return
+            self._restarting = True
+            self._executor = None
+
+        logging.error("Inference worker died, restarting the pool")
+        broken_executor.shutdown(wait=False, cancel_futures=True)
+        self._count('restarts')
+        threading.Thread(target=self._rebuild, name='inference-pool-restart', daemon=True).start()
+
+    def _rebuild(self):
+        try:
+            executor = self._start()
+        except Exception as e:
+            logging.error(f"Failed to restart the inference pool: {str(e)}")
+            executor = None
+
+        with self._lock:
+            self._executor = executor
+            self._restarting = False
+
+    def shutdown(self):
+        with self._lock:
+            executor = self._executor
+            self._executor = None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def get_stats(self):
+        """Get pool statistics"""
+        with self._stats_lock:
+            stats = dict(self._stats)
+
+        requests = stats['requests']
+        stats['workers'] = self.num_workers
+        stats['worker_threads'] = self.worker_threads
+        stats['shared_weights'] = self.shared_state_dict is not None
+        stats['restarting'] = self._restarting
+        stats['avg_inference_ms'] = round(stats['total_inference_ms'] / requests, 3) if requests else 0.0
+        stats['total_inference_ms'] = round(stats['total_inference_ms'], 3)
+        return stats
+
+def create_inference_pool(device, artifact_path=None, weights_path=None, mode='fp32'):
+    """
+    Build the process pool when ML_BACKEND=process
+
+    Workers share one copy of `weights_path` for the SHARED_WEIGHT_MODES;
+    otherwise they load `artifact_path` when the serving process loaded
+    one, else `weights_path` with `mode` applied.
+
+    Returns:
+        InferencePool, or None to run inference in the serving process
+    """
+    if get_inference_backend() != 'process':
+        return None
+
+    if device.type != 'cpu':
+        logging.warning(f"ML_BACKEND=process only supports CPU inference, running in-process on {device}")
+        return None
+
+    cpu_count = os.cpu_count() or 1
+    num_workers = int(os.getenv('ML_WORKERS') or max(1, cpu_count // 2))
+    worker_threads = int(os.getenv('ML_WORKER_THREADS') or max(1, cpu_count // num_workers))
+
+    return InferencePool(
+        artifact_path=artifact_path,
+        weights_path=weights_path,
+        mode=mode,
+        num_workers=num_workers,
+        worker_threads=worker_threads,
+        request_timeout=float(os.getenv('ML_BATCH_TIMEOUT_SECONDS', 30))
+    )
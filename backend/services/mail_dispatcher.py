@@ -0,0 +1,262 @@
+from email.message import EmailMessage
+from email.utils import formataddr, make_msgid
+from middleware.metrics_middleware import mail_messages_total, time_phase
+import threading
+import smtplib
+import logging
+import random
+import atexit
+import queue
+import time
+import os
+
+def _is_permanent(error):
+    """5xx replies and refused recipients won't succeed on a retry; network errors and 4xx replies might"""
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return True
+    return isinstance(error, smtplib.SMTPResponseException) and error.smtp_code >= 500
+
+class _MailJob:
+    __slots__ = ('message', 'recipient', 'enqueued_at', 'attempts')
+
+    def __init__(self, message, recipient):
+        self.message = message
+        self.recipient = recipient
+        self.enqueued_at = time.monotonic()
+        self.attempts = 0
+
+class MailDispatcher:
+    """
+    Background email delivery over persistent SMTP connections
+
+    Request handlers only build the message and put it on a bounded queue.
+    Each worker thread keeps its own SMTP session open between messages
+    (one TLS handshake and login per connection instead of per email),
+    closes it after `idle_timeout` seconds without mail, and retries
+    transient failures on a fresh connection with exponential backoff.
+    """
+
+    def __init__(self, host, port, username=None, password=None, sender=None, use_ssl=True,
+                 workers=1, queue_size=1000, max_retries=3, backoff_seconds=1.0, idle_timeout=60, timeout=20):
+        self.host = host
+        self.port = int(port)
+        self.username = username
+        self.password = password
+        self.sender = sender
+        self.use_ssl = use_ssl
+        self.max_retries = max(0, int(max_retries))
+        self.backoff_seconds = max(0.0, float(backoff_seconds))
+        self.idle_timeout = float(idle_timeout)
+        self.timeout = float(timeout)
+
+        self._queue = queue.Queue(maxsize=max(1, int(queue_size)))
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            'enqueued': 0,
+            'sent': 0,
+            'failed': 0,
+            'retries': 0,
+            'dropped': 0,
+            'connections_opened': 0,
+            'total_delivery_ms': 0.0
+        }
+
+        self._workers = []
+        for index in range(max(1, int(workers))):
+            worker = threading.Thread(target=self._worker_loop, name=f'mail-dispatcher-{index}', daemon=True)
+            worker.start()
+            self._workers.append(worker)
+
+        atexit.register(self.stop)
+        logging.info(f"Mail dispatcher started ({len(self._workers)} workers, queue size {self._queue.maxsize}, {host}:{self.port})")
+
+    def _count(self, key, amount=1):
+        with self._stats_lock:
+            self._stats[key] += amount
+
+    def build_message(self, to_email, subject, html_content, text_content=None):
+        message = EmailMessage()
+        message['Subject'] = subject
+        message['From'] = formataddr(self.sender) if isinstance(self.sender, tuple) else self.sender
+        message['To'] = to_email
+        message['Message-ID'] = make_msgid(domain=self.host)
+        message.set_content(text_content or '')
+        message.add_alternative(html_content, subtype='html')
+        return message
+
+    def enqueue(self, to_email, subject, html_content, text_content=None):
+        """
+        Queue an email for background delivery
+
+        Returns:
+            True if queued, False if the queue is full
+        """
+        job = _MailJob(self.build_message(to_email, subject, html_content, text_content), to_email)
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            self._count('dropped')
+            mail_messages_total.inc(status='dropped')
+            logging.error(f"Mail queue full, dropping email to {to_email}")
+            return False
+
+        self._count('enqueued')
+        return True
+
+    def _connect(self):
+        if self.use_ssl:
+            connection = smtplib.SMTP_SSL(self.host, self.port, timeout=self.timeout)
+        else:
+            connection = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+            connection.ehlo()
+            if connection.has_extn('starttls'):
+                connection.starttls()
+                connection.ehlo()
+
+        if self.username and self.password:
+            connection.login(self.username, self.password)
+
+        self._count('connections_opened')
+        return connection
+
+    @staticmethod
+    def _close(connection):
+        if connection is None:
+            return
+        try:
+            connection.quit()
+        except Exception:
+            connection.close()
+
+    def _deliver(self, job, connection):
+        """
+        Send one message, reconnecting and backing off on transient errors
+
+        Returns:
+            The connection to reuse for the next message (None if it was dropped)
+        """
+        while True:
+            job.attempts += 1
+            reused = connection is not None
+            try:
+                if connection is None:
+                    connection = self._connect()
+                with time_phase('smtp', 'send'):
+                    connection.send_message(job.message)
+                self._count('sent')
+                self._count('total_delivery_ms', (time.monotonic() - job.enqueued_at) * 1000)
+                mail_messages_total.inc(status='sent')
+                logging.info(f"Email sent successfully to {job.recipient}")
+                return connection
+            except Exception as e:
+                permanent = _is_permanent(e)
+                if reused and not permanent:
+                    # The kept-open session went stale; reconnect without
+                    # spending a retry
+                    self._close(connection)
+                    connection = None
+                    job.attempts -= 1
+                    continue
+
+                if permanent or job.attempts > self.max_retries:
+                    self._count('failed')
+                    mail_messages_total.inc(status='failed')
+                    logging.error(f"Failed to send email to {job.recipient} after {job.attempts} attempts: {str(e)}")
+                    if permanent and connection is not None:
+                        # smtplib resets the session after a refusal, so it stays usable
+                        return connection
+                    self._close(connection)
+                    return None
+
+                self._close(connection)
+                connection = None
+                delay = self.backoff_seconds * (2 ** (job.attempts - 1)) * random.uniform(0.8, 1.2)
+                self._count('retries')
+                mail_messages_total.inc(status='retried')
+                logging.warning(f"Email to {job.recipient} failed ({str(e)}), retrying in {delay:.1f}s")
+                time.sleep(delay)
+
+    def _worker_loop(self):
+        connection = None
+        while True:
+            try:
+                job = self._queue.get(timeout=self.idle_timeout)
+            except queue.Empty:
+                # Servers drop idle sessions; close ours first
+                self._close(connection)
+                connection = None
+                continue
+
+            if job is None:
+                self._close(connection)
+                self._queue.task_done()
+                return
+
+            try:
+                connection = self._deliver(job, connection)
+            finally:
+                self._queue.task_done()
+
+    def stop(self, timeout=10):
+        """Deliver what is queued (up to `timeout` seconds) and stop the workers"""
+        deadline = time.monotonic() + timeout
+        for _ in self._workers:
+            try:
+                self._queue.put(None, timeout=max(0, deadline - time.monotonic()))
+            except queue.Full:
+                break
+        for worker in self._workers:
+            worker.join(max(0, deadline - time.monotonic()))
+
+    def get_stats(self):
+        """Get delivery statistics"""
+        with self._stats_lock:
+            stats = dict(self._stats)
+
+        sent = stats['sent']
+        stats['queue_depth'] = self._queue.qsize()
+        stats['workers'] = len(self._workers)
+        stats['avg_delivery_ms'] = round(stats['total_delivery_ms'] / sent, 3) if sent else 0.0
+        stats['total_delivery_ms'] = round(stats['total_delivery_ms'], 3)
+        return stats
+
+# Global instance
+mail_dispatcher = None
+mail_dispatcher_lock = threading.Lock()
+
+def smtp_use_ssl():
+    return os.getenv('SMTP_USE_SSL', 'true').lower() == 'true'
+
+def mail_async_enabled():
+    return os.getenv('MAIL_ASYNC_ENABLED', 'true').lower() == 'true'
+
+def get_mail_dispatcher():
+    """Get the background mail dispatcher, starting it on first use (None when disabled)"""
+    global mail_dispatcher
+
+    if not mail_async_enabled():
+        return None
+
+    with mail_dispatcher_lock:
+        if mail_dispatcher is None:
+            mail_dispatcher = MailDispatcher(
+                host=os.getenv('SMTP_HOST', 'smtp.gmail.com'),
+                port=int(os.getenv('SMTP_PORT', 465)),
+                username=os.getenv('SMTP_EMAIL'),
+                password=os.getenv('SMTP_PASSWORD'),
+                sender=(os.getenv('SMTP_FROM_NAME', 'GlycoFit'), os.getenv('SMTP_FROM_EMAIL', os.getenv('SMTP_EMAIL'))),
+                use_ssl=smtp_use_ssl(),
+                workers=int(os.getenv('MAIL_WORKERS', 1)),
+                queue_size=int(os.getenv('MAIL_QUEUE_SIZE', 1000)),
+                max_retries=int(os.getenv('MAIL_MAX_RETRIES', 3)),
+                backoff_seconds=float(os.getenv('MAIL_RETRY_BACKOFF_SECONDS', 1)),
+                idle_timeout=float(os.getenv('MAIL_IDLE_TIMEOUT_SECONDS', 60))
+            )
+
+    return mail_dispatcher
+
+def get_mail_stats():
+    """Delivery statistics for the status endpoints (None when not started)"""
+    if mail_dispatcher is None:
+        return None
+    return mail_dispatcher.get_stats()
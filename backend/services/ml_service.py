@@ -3,15 +3,24 @@ import torch.nn as nn
 import torchvision.models as models
 from torchvision import transforms
 from PIL import Image
+from concurrent.futures import ThreadPoolExecutor
 import logging
 import os
 import io
+from services.inference_batcher import InferenceBatcher
+from services.prediction_cache import create_prediction_cache
+from middleware.metrics_middleware import time_phase
+from services.model_optimizer import get_inference_mode, configure_threads, optimize_model
+from services.model_export import get_weights_path, get_artifact_path, load_artifact
+from services.inference_pool import create_inference_pool
+from services.image_preprocessor import create_fast_preprocessor
 
 class NutrientPredictor(nn.Module):
     def __init__(self, num_nutrients=4):
         super(NutrientPredictor, self).__init__()
-        # Load a pre-trained ResNet model
-        resnet = models.resnet50(pretrained=True)
+        # ResNet50 backbone; the trained state dict replaces every parameter,
+        # so there is no need to download the ImageNet weights
+        resnet = models.resnet50(weights=None)
         # Remove the original fully connected layer
         self.features = nn.Sequential(*list(resnet.children())[:-1])
         # Add a new fully connected layer for nutrient prediction
@@ -23,13 +32,35 @@ class NutrientPredictor(nn.Module):
         x = self.regressor(x)
         return x
 
+def build_transform():
+    """Image preprocessing matching the training pipeline"""
+    return transforms.Compose([
+        transforms.Resize((224, 224)),
+        transforms.ToTensor(),
+        transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225])
+    ])
+
 class MLModelService:
     def __init__(self):
         self.model = None
         self.device = None
         self.transform = None
+        self.fast_preprocessor = create_fast_preprocessor()
+        self.batcher = None
+        self.pool = None
+        self.artifact_path = None
+        # Decodes the images of a batch request in parallel (PIL releases the GIL while decoding)
+        self.decode_executor = ThreadPoolExecutor(max_workers=int(os.getenv('ML_DECODE_WORKERS', 4)), thread_name_prefix='ml-decode')
+        self.inference_mode = get_inference_mode()
+        self.channels_last = False
+        self.prediction_cache = create_prediction_cache()
         self.nutrient_names = ['Calories', 'Protein (g)', 'Carbs (g)', 'Fat (g)']
         self._initialize_model()
+        self.pool = create_inference_pool(self.device, self.artifact_path, get_weights_path(), self.inference_mode)
+        if self.pool is not None and self.pool.model is not None:
+            # Drop the private copy; the pool's model lives on the shared weights
+            self.model = self.pool.model
+        self._initialize_batcher()
     
     def _initialize_model(self):
         """Initialize the ML model and preprocessing transforms"""
@@ -37,12 +68,30 @@ class MLModelService:
             # Set device (CPU or GPU)
             self.device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
             logging.info(f"Using device: {self.device}")
+            configure_threads()
+            
+            # Initialize image preprocessing transforms
+            self.transform = build_transform()
+            
+            # Prefer the exported TorchScript artifact: it loads without
+            # building the torchvision model or copying a state dict
+            artifact_path = get_artifact_path()
+            if artifact_path and os.path.exists(artifact_path):
+                try:
+                    self.model, metadata = load_artifact(artifact_path, self.device, weights_path=get_weights_path())
+                    self.inference_mode = metadata['mode']
+                    self.channels_last = metadata['channels_last']
+                    self.artifact_path = artifact_path
+                    logging.info(f"✅ ML Model artifact loaded from {artifact_path} (inference mode: {self.inference_mode})")
+                    return
+                except Exception as e:
+                    logging.error(f"Failed to load model artifact {artifact_path}, falling back to weights: {str(e)}")
             
             # Initialize the model
             self.model = NutrientPredictor()
             
             # Load the trained model weights
-            model_path = os.path.join(os.path.dirname(__file__), '..', 'nutrient_predictor_model.pth')
+            model_path = get_weights_path()
             
             if os.path.exists(model_path):
                 self.model.load_state_dict(torch.load(model_path, map_location=self.device))
@@ -53,17 +102,44 @@ class MLModelService:
                 logging.error(f"Model file not found at: {model_path}")
                 raise FileNotFoundError(f"Model file not found at: {model_path}")
             
-            # Initialize image preprocessing transforms
-            self.transform = transforms.Compose([
-                transforms.Resize((224, 224)),
-                transforms.ToTensor(),
-                transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225])
-            ])
+            # Swap in the CPU-optimized variant selected by ML_INFERENCE_MODE
+            self.model, self.channels_last, self.inference_mode = optimize_model(self.model, self.inference_mode, model_path, self.transform, self.device)
+            logging.info(f"Inference mode: {self.inference_mode}")
             
         except Exception as e:
             logging.error(f"Failed to initialize ML model: {str(e)}")
             raise e
     
+    def _initialize_batcher(self):
+        """Start the micro-batching scheduler unless it is disabled"""
+        if os.getenv('ML_BATCHING_ENABLED', 'true').lower() != 'true':
+            logging.info("ML micro-batching disabled, running one forward pass per request")
+            return
+        
+        if self.pool is not None:
+            # A single batcher thread would keep only one worker busy at a time
+            logging.info("ML micro-batching skipped, requests go straight to the worker pool")
+            return
+        
+        self.batcher = InferenceBatcher(
+            run_batch=self._run_batch,
+            max_batch_size=int(os.getenv('ML_BATCH_MAX_SIZE', 8)),
+            max_wait_ms=float(os.getenv('ML_BATCH_WINDOW_MS', 5)),
+            request_timeout=float(os.getenv('ML_BATCH_TIMEOUT_SECONDS', 30))
+        )
+    
+    def _run_batch(self, tensors):
+        """Run one forward pass over a list of preprocessed (1, C, H, W) tensors"""
+        with time_phase('forward', 'predict_nutrients'):
+            batch = torch.cat(tensors, dim=0)
+            if self.pool is not None:
+                return self.pool.run(batch)
+            if self.channels_last:
+                batch = batch.contiguous(memory_format=torch.channels_last)
+            with torch.inference_mode():
+                predictions = self.model(batch)
+            return predictions.cpu().numpy()
+    
     def preprocess_image(self, image_data):
         """
         Preprocess image data for model inference
@@ -75,26 +151,30 @@ class MLModelService:
             Preprocessed image tensor
         """
         try:
-            # Convert bytes to PIL Image
-            if isinstance(image_data, bytes):
-                image = Image.open(io.BytesIO(image_data))
-            else:
-                image = image_data
-            
-            # Convert to RGB if necessary
-            if image.mode != 'RGB':
-                image = image.convert('RGB')
-            
-            # Apply transformations
-            processed_img = self.transform(image)
-            
-            # Add batch dimension
-            processed_img = processed_img.unsqueeze(0)
-            
-            # Move to device
-            processed_img = processed_img.to(self.device)
-            
-            return processed_img
+            with time_phase('decode', 'preprocess_image'):
+                if self.fast_preprocessor is not None:
+                    processed_img = self.fast_preprocessor(image_data)
+                else:
+                    # Convert bytes to PIL Image
+                    if isinstance(image_data, bytes):
+                        image = Image.open(io.BytesIO(image_data))
+                    else:
+                        image = image_data
+                    
+                    # Convert to RGB if necessary
+                    if image.mode != 'RGB':
+                        image = image.convert('RGB')
+                    
+                    # Apply transformations
+                    processed_img = self.transform(image)
+                    
+                    # Add batch dimension
+                    processed_img = processed_img.unsqueeze(0)
+                
+                # Move to device
+                processed_img = processed_img.to(self.device)
+                
+                return processed_img
             
         except Exception as e:
             logging.error(f"Error preprocessing image: {str(e)}")
@@ -114,26 +194,36 @@ class MLModelService:
             if self.model is None:
                 raise RuntimeError("Model not initialized")
             
+            # Serve repeated uploads from the cache, skipping decode and inference
+            cache_digest = None
+            cache_phash = None
+            if self.prediction_cache is not None and isinstance(image_data, bytes):
+                cached_result, cache_digest, cache_phash = self.prediction_cache.lookup(image_data)
+                if cached_result is not None:
+                    logging.info(f"✅ Nutrient prediction served from cache: {cached_result['nutrients']}")
+                    return {
+                        'success': True,
+                        'nutrients': dict(cached_result['nutrients'])
+                    }
+            
             # Preprocess the image
             processed_img = self.preprocess_image(image_data)
             
-            # Get predictions from the model
-            with torch.no_grad():
-                predictions = self.model(processed_img)
-            
-            # Convert predictions to numpy array
-            predictions_np = predictions.squeeze().cpu().numpy()
+            # Get predictions from the model, sharing a forward pass with
+            # concurrent requests when the batcher is running
+            if self.batcher is not None:
+                predictions_np = self.batcher.submit(processed_img)
+            else:
+                predictions_np = self._run_batch([processed_img])[0]
             
             # Create result dictionary
             result = {
                 'success': True,
-                'nutrients': {}
+                'nutrients': self._map_nutrients(predictions_np)
             }
             
-            # Map predictions to nutrient names
-            for name, value in zip(self.nutrient_names, predictions_np):
-                # Ensure non-negative values and round to 2 decimal places
-                result['nutrients'][name] = max(0, round(float(value), 2))
+            if cache_digest is not None:
+                self.prediction_cache.put(cache_digest, {'nutrients': dict(result['nutrients'])}, cache_phash)
             
             logging.info(f"✅ Nutrient prediction completed: {result['nutrients']}")
             return result
@@ -146,9 +236,86 @@ class MLModelService:
                 'nutrients': {}
             }
     
+    def predict_nutrients_batch(self, images):
+        """
+        Predict nutrient values for several images with one forward pass
+        
+        Args:
+            images: List of raw image data (bytes or PIL Image)
+            
+        Returns:
+            List with one predict_nutrients-style result per image, in order;
+            an image that fails to decode gets its own error result
+        """
+        if self.model is None:
+            raise RuntimeError("Model not initialized")
+        
+        results = [None] * len(images)
+        cache_keys = {}
+        pending = {}
+        
+        for index, image_data in enumerate(images):
+            if self.prediction_cache is not None and isinstance(image_data, bytes):
+                cached_result, cache_digest, cache_phash = self.prediction_cache.lookup(image_data)
+                if cached_result is not None:
+                    results[index] = {'success': True, 'nutrients': dict(cached_result['nutrients'])}
+                    continue
+                cache_keys[index] = (cache_digest, cache_phash)
+            pending[index] = self.decode_executor.submit(self.preprocess_image, image_data)
+        
+        indexes = []
+        tensors = []
+        for index, future in pending.items():
+            try:
+                tensors.append(future.result())
+                indexes.append(index)
+            except Exception as e:
+                results[index] = {'success': False, 'error': f"Could not decode image: {str(e)}", 'nutrients': {}}
+        
+        if tensors:
+            try:
+                predictions_np = self._run_batch(tensors)
+            except Exception as e:
+                logging.error(f"Error during batch nutrient prediction: {str(e)}")
+                for index in indexes:
+                    results[index] = {'success': False, 'error': str(e), 'nutrients': {}}
+                return results
+            
+            for index, row in zip(indexes, predictions_np):
+                results[index] = {'success': True, 'nutrients': self._map_nutrients(row)}
+                if index in cache_keys:
+                    cache_digest, cache_phash = cache_keys[index]
+                    self.prediction_cache.put(cache_digest, {'nutrients': dict(results[index]['nutrients'])}, cache_phash)
+        
+        logging.info(f"✅ Batch nutrient prediction completed: {len(tensors)} inferred, {len(images) - len(pending)} from cache")
+        return results
+    
+    def _map_nutrients(self, row):
+        """Map one output row to nutrient names"""
+        # Ensure non-negative values and round to 2 decimal places
+        return {name: max(0, round(float(value), 2)) for name, value in zip(self.nutrient_names, row)}
+    
     def is_model_ready(self):
         """Check if the model is ready for predictions"""
         return self.model is not None
+    
+    def get_batching_stats(self):
+        """Get micro-batching statistics (None when batching is disabled)"""
+        if self.batcher is None:
+            return None
+        return self.batcher.get_stats()
+    
+    def get_pool_stats(self):
+        """Get worker pool statistics (None when inference runs in-process)"""
+        if self.pool is None:
+            return None
+        return self.pool.get_stats()
+    
+    def get_cache_stats(self):
+        """Get prediction cache statistics (None when the cache is disabled)"""
+        if self.prediction_cache is None:
+            return None
+        return self.prediction_cache.get_stats()
 
 # Global instance
 ml_service = None
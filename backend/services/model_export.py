@@ -0,0 +1,209 @@
+"""
+Self-contained TorchScript artifact for NutrientPredictor
+
+The exported file holds the frozen graph, its weights and a small metadata
+record (inference mode, nutrient names, input size), so MLModelService can
+load it with torch.jit.load alone: no torchvision model construction, no
+state dict copy and no network access.
+
+Build it once per weights file (and per inference mode), from the backend
+directory:
+
+    python -m services.model_export --weights nutrient_predictor_model.pth --output nutrient_predictor_model.ts
+
+MLModelService picks up ML_MODEL_ARTIFACT (default: nutrient_predictor_model.ts in
+the backend directory) when it exists and was built from the current weights
+file, and falls back to the .pth otherwise.
+"""
+from dotenv import load_dotenv
+import argparse
+import warnings
+import hashlib
+import logging
+import json
+import time
+import sys
+import os
+
+import torch
+
+ARTIFACT_FORMAT_VERSION = 1
+METADATA_FILE = 'metadata.json'
+DEFAULT_WEIGHTS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'nutrient_predictor_model.pth')
+DEFAULT_ARTIFACT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'nutrient_predictor_model.ts')
+
+def get_weights_path():
+    return os.getenv('ML_MODEL_PATH') or DEFAULT_WEIGHTS_PATH
+
+def get_artifact_path():
+    """Artifact location from ML_MODEL_ARTIFACT ('none' always loads the .pth)"""
+    path = os.getenv('ML_MODEL_ARTIFACT') or DEFAULT_ARTIFACT_PATH
+    if path.lower() == 'none':
+        return None
+    return path
+
+def _file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as weights_file:
+        for chunk in iter(lambda: weights_file.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _weights_fingerprint(path):
+    stat = os.stat(path)
+    return {'weights_size': stat.st_size, 'weights_mtime': int(stat.st_mtime)}
+
+def _check_weights(metadata, weights_path):
+    """
+    Raise if the artifact was not exported from the weights file at `weights_path`
+
+    Size and mtime are compared first; the file is only hashed when they
+    differ (e.g. after a copy), so the usual cold start never reads the .pth.
+    Without a weights file the artifact is served as is.
+    """
+    if not weights_path or not os.path.exists(weights_path):
+        return
+
+    fingerprint = _weights_fingerprint(weights_path)
+    if all(metadata.get(key) == value for key, value in fingerprint.items()):
+        return
+
+    if _file_digest(weights_path) != metadata.get('weights_sha256'):
+        raise ValueError(f"Model artifact is stale: it was not exported from the current {weights_path}")
+
+def load_artifact(path, device, weights_path=None):
+    """
+    Load an exported artifact
+
+    Args:
+        weights_path: When given, reject the artifact unless it was exported
+            from this weights file
+
+    Returns:
+        Tuple of (model, metadata dict)
+    """
+    extra_files = {METADATA_FILE: ''}
+    with warnings.catch_warnings():
+        # TorchScript APIs emit deprecation warnings on recent torch
+        warnings.simplefilter('ignore')
+        model = torch.jit.load(path, map_location=device, _extra_files=extra_files)
+
+    metadata = json.loads(extra_files[METADATA_FILE] or '{}')
+    if metadata.get('format_version') != ARTIFACT_FORMAT_VERSION:
+        raise ValueError(f"Unsupported model artifact format: {metadata.get('format_version')}")
+
+    _check_weights(metadata, weights_path)
+    return model, metadata
+
+def export_artifact(weights_path, output_path, mode='fp32'):
+    """
+    Build the frozen TorchScript artifact from trained weights
+
+    Raises ValueError rather than writing an fp32 artifact labelled with
+    another mode when `mode` can't be built (int8 off CPU, int8_static
+    without calibration images).
+
+    Returns:
+        Metadata dict written into the artifact
+    """
+    from services.ml_service import NutrientPredictor, build_transform
+    from services.model_optimizer import optimize_model
+
+    device = torch.device('cpu')
+    model = NutrientPredictor()
+    model.load_state_dict(torch.load(weights_path, map_location=device))
+    model.eval()
+
+    transform = build_transform()
+    optimized, channels_last, applied_mode = optimize_model(model, mode, weights_path, transform, device)
+    if applied_mode != mode:
+        raise ValueError(f"{mode} could not be built (optimize_model fell back to {applied_mode}), not exporting")
+
+    example = torch.randn(1, 3, 224, 224)
+    if channels_last:
+        example = example.contiguous(memory_format=torch.channels_last)
+
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        if isinstance(optimized, torch.jit.ScriptModule):
+            # int8_static already comes back traced and frozen
+            artifact = optimized
+        else:
+            with torch.inference_mode():
+                artifact = torch.jit.freeze(torch.jit.trace(optimized, example).eval())
+
+        metadata = {
+            'format_version': ARTIFACT_FORMAT_VERSION,
+            'mode': applied_mode,
+            'channels_last': channels_last,
+            'input_size': [224, 224],
+            'nutrient_names': ['Calories', 'Protein (g)', 'Carbs (g)', 'Fat (g)'],
+            'weights_sha256': _file_digest(weights_path),
+            **_weights_fingerprint(weights_path),
+            'torch_version': torch.__version__,
+            'exported_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())
+        }
+
+        os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+        torch.jit.save(artifact, output_path, _extra_files={METADATA_FILE: json.dumps(metadata)})
+
+    return metadata
+
+def verify_artifact(weights_path, artifact_path):
+    """
+    Time a cold load of the artifact and compare it with the eager fp32 model
+
+    Returns:
+        Tuple of (load seconds, max absolute difference on a random batch)
+    """
+    from services.ml_service import NutrientPredictor
+
+    device = torch.device('cpu')
+    started_at = time.perf_counter()
+    artifact, metadata = load_artifact(artifact_path, device, weights_path=weights_path)
+    load_seconds = time.perf_counter() - started_at
+
+    model = NutrientPredictor()
+    model.load_state_dict(torch.load(weights_path, map_location=device))
+    model.eval()
+
+    batch = torch.randn(4, 3, 224, 224)
+    with torch.inference_mode():
+        expected = model(batch)
+        if metadata.get('channels_last'):
+            batch = batch.contiguous(memory_format=torch.channels_last)
+        actual = artifact(batch)
+
+    return load_seconds, float((actual - expected).abs().max())
+
+def main(argv=None):
+    from services.model_optimizer import INFERENCE_MODES
+
+    parser = argparse.ArgumentParser(description='Export NutrientPredictor as a frozen TorchScript artifact')
+    parser.add_argument('--weights', default=None, help='Trained state dict (default: ML_MODEL_PATH or nutrient_predictor_model.pth)')
+    parser.add_argument('--output', default=None, help='Artifact path (default: ML_MODEL_ARTIFACT or nutrient_predictor_model.ts)')
+    parser.add_argument('--mode', default='fp32', choices=INFERENCE_MODES, help='Inference mode baked into the artifact')
+    parser.add_argument('--calibration', help='Calibration image directory for int8_static (sets ML_CALIBRATION_DIR)')
+    args = parser.parse_args(argv)
+
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s - %(message)s')
+    if args.calibration:
+        os.environ['ML_CALIBRATION_DIR'] = args.calibration
+
+    weights_path = args.weights or get_weights_path()
+    output_path = args.output or get_artifact_path() or DEFAULT_ARTIFACT_PATH
+
+    try:
+        metadata = export_artifact(weights_path, output_path, args.mode)
+    except ValueError as e:
+        print(f"Error: {str(e)}", file=sys.stderr)
+        return 1
+
+    load_seconds, max_difference = verify_artifact(weights_path, output_path)
+    print(f"Exported {metadata['mode']} artifact to {output_path} ({os.path.getsize(output_path) / (1024 * 1024):.1f} MB)")
+    print(f"Cold load: {load_seconds * 1000:.0f} ms, max abs difference vs eager fp32: {max_difference:.6f}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,251 @@
+"""
+CPU-optimized variants of the NutrientPredictor model
+
+Selected with ML_INFERENCE_MODE:
+- fp32 (default): the model as trained
+- channels_last: fp32 weights in NHWC memory format (faster convolutions on most x86 CPUs)
+- int8_dynamic: dynamic INT8 quantization; only the Linear regressor is
+  quantized, so for ResNet50 the gain is small
+- int8_static: post-training static INT8 quantization of the whole network
+  (FX graph mode), calibrated on ML_CALIBRATION_DIR images. Calibration is
+  slow, so the result is cached as a TorchScript file in
+  ML_OPTIMIZED_MODEL_DIR, keyed by the weights file and torch version
+
+Check the accuracy/speed trade-off on held-out images before enabling a mode:
+
+    python -m services.model_optimizer --mode int8_static --images path/to/held_out --calibration path/to/calibration
+"""
+from PIL import Image
+from dotenv import load_dotenv
+import argparse
+import warnings
+import hashlib
+import logging
+import time
+import copy
+import sys
+import os
+
+import torch
+import torch.nn as nn
+
+INFERENCE_MODES = ('fp32', 'channels_last', 'int8_dynamic', 'int8_static')
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.webp')
+
+def get_inference_mode():
+    mode = os.getenv('ML_INFERENCE_MODE', 'fp32').lower()
+    if mode not in INFERENCE_MODES:
+        logging.warning(f"Unknown ML_INFERENCE_MODE '{mode}', using fp32")
+        mode = 'fp32'
+    return mode
+
+def configure_threads():
+    """Apply ML_NUM_THREADS / ML_NUM_INTEROP_THREADS (defaults are left to torch)"""
+    num_threads = os.getenv('ML_NUM_THREADS')
+    if num_threads:
+        torch.set_num_threads(int(num_threads))
+
+    interop_threads = os.getenv('ML_NUM_INTEROP_THREADS')
+    if interop_threads:
+        try:
+            torch.set_num_interop_threads(int(interop_threads))
+        except RuntimeError as e:
+            # Can only be set once, before any inter-op work has started
+            logging.warning(f"Could not set inter-op threads: {str(e)}")
+
+    logging.info(f"Torch threads: intra-op={torch.get_num_threads()}, inter-op={torch.get_num_interop_threads()}")
+
+def load_calibration_images(directory, transform, limit=None):
+    """Load and preprocess every image in a directory as (1, C, H, W) tensors"""
+    names = sorted(name for name in os.listdir(directory) if name.lower().endswith(IMAGE_EXTENSIONS))
+    if limit:
+        names = names[:limit]
+
+    tensors = []
+    for name in names:
+        with Image.open(os.path.join(directory, name)) as image:
+            tensors.append(transform(image.convert('RGB')).unsqueeze(0))
+    return tensors
+
+def _cache_path(weights_path, mode):
+    stat = os.stat(weights_path)
+    key = hashlib.sha256(f"{os.path.abspath(weights_path)}:{stat.st_size}:{stat.st_mtime_ns}:{torch.__version__}:{mode}".encode('utf-8')).hexdigest()[:16]
+    cache_dir = os.getenv('ML_OPTIMIZED_MODEL_DIR') or os.path.join(os.path.dirname(os.path.abspath(weights_path)), 'model_cache')
+    return os.path.join(cache_dir, f"nutrient_predictor_{mode}_{key}.pt")
+
+def quantize_dynamic(model, inplace=False):
+    from torch.ao.quantization import quantize_dynamic as ao_quantize_dynamic
+
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        return ao_quantize_dynamic(model, {nn.Linear}, dtype=torch.qint8, inplace=inplace)
+
+def quantize_static(model, calibration_tensors):
+    """Post-training static quantization (FX graph mode), traced to TorchScript"""
+    from torch.ao.quantization import get_default_qconfig_mapping
+    from torch.ao.quantization.quantize_fx import prepare_fx, convert_fx
+
+    engine = 'x86' if 'x86' in torch.backends.quantized.supported_engines else 'qnnpack'
+    torch.backends.quantized.engine = engine
+
+    example_inputs = (calibration_tensors[0],)
+    with warnings.catch_warnings():
+        # FX quantization and TorchScript APIs emit deprecation warnings on recent torch
+        warnings.simplefilter('ignore')
+        prepared = prepare_fx(copy.deepcopy(model), get_default_qconfig_mapping(engine), example_inputs)
+        with torch.inference_mode():
+            for tensor in calibration_tensors:
+                prepared(tensor)
+        quantized = convert_fx(prepared)
+
+        with torch.inference_mode():
+            traced = torch.jit.trace(quantized, example_inputs)
+        return torch.jit.freeze(traced.eval())
+
+def optimize_model(model, mode, weights_path, transform, device):
+    """
+    Build (or load from cache) the inference variant of an fp32 model
+
+    Args:
+        model: fp32 NutrientPredictor in eval mode
+        mode: One of INFERENCE_MODES
+        weights_path: Path of the fp32 weights, used for the cache key
+        transform: Preprocessing transform, used for calibration images
+
+    Returns:
+        Tuple of (model, channels_last, applied_mode) where channels_last
+        tells the caller to convert input batches to NHWC and applied_mode
+        is 'fp32' when the requested mode could not be built
+    """
+    if mode == 'fp32':
+        return model, False, 'fp32'
+
+    if mode.startswith('int8') and device.type != 'cpu':
+        logging.warning(f"{mode} only runs on CPU, using fp32 on {device}")
+        return model, False, 'fp32'
+
+    if mode == 'channels_last':
+        return model.to(memory_format=torch.channels_last), True, mode
+
+    if mode == 'int8_dynamic':
+        logging.info("Applying dynamic INT8 quantization")
+        return quantize_dynamic(model), False, mode
+
+    # int8_static
+    cache_path = _cache_path(weights_path, mode)
+    if os.path.exists(cache_path):
+        logging.info(f"Loading cached int8_static model: {cache_path}")
+        return torch.jit.load(cache_path, map_location=device), False, mode
+
+    calibration_dir = os.getenv('ML_CALIBRATION_DIR')
+    if not calibration_dir or not os.path.isdir(calibration_dir):
+        logging.error("int8_static needs ML_CALIBRATION_DIR pointing at representative food images, using fp32")
+        return model, False, 'fp32'
+
+    started_at = time.perf_counter()
+    calibration_tensors = load_calibration_images(calibration_dir, transform, limit=int(os.getenv('ML_CALIBRATION_MAX_IMAGES', 200)))
+    if not calibration_tensors:
+        logging.error(f"No images found in {calibration_dir}, using fp32")
+        return model, False, 'fp32'
+
+    quantized = quantize_static(model, calibration_tensors)
+
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    torch.jit.save(quantized, cache_path)
+    logging.info(f"Calibrated int8_static model on {len(calibration_tensors)} images in {time.perf_counter() - started_at:.1f}s, cached at {cache_path}")
+    return quantized, False, mode
+
+def _predict_all(model, tensors, channels_last=False, batch_size=8):
+    outputs = []
+    started_at = time.perf_counter()
+    with torch.inference_mode():
+        for index in range(0, len(tensors), batch_size):
+            batch = torch.cat(tensors[index:index + batch_size], dim=0)
+            if channels_last:
+                batch = batch.contiguous(memory_format=torch.channels_last)
+            outputs.append(model(batch))
+    return torch.cat(outputs, dim=0), time.perf_counter() - started_at
+
+def check_drift(mode, image_dir, max_relative_error=0.05):
+    """
+    Compare an optimized variant with the fp32 model on held-out images
+
+    Returns:
+        Report dict with per-nutrient mean absolute error, relative error
+        (MAE divided by the mean absolute fp32 prediction), max absolute
+        error, timings and whether the drift is within max_relative_error
+    """
+    from services.ml_service import MLModelService
+
+    # Build the services explicitly instead of going through the global
+    os.environ['ML_BATCHING_ENABLED'] = 'false'
+    os.environ['ML_CACHE_ENABLED'] = 'false'
+    # Both variants are built from the .pth, not an exported artifact
+    os.environ['ML_MODEL_ARTIFACT'] = 'none'
+
+    os.environ['ML_INFERENCE_MODE'] = 'fp32'
+    baseline = MLModelService()
+    os.environ['ML_INFERENCE_MODE'] = mode
+    optimized = MLModelService()
+
+    tensors = load_calibration_images(image_dir, baseline.transform)
+    if not tensors:
+        raise ValueError(f"No images found in {image_dir}")
+
+    # Warm both models up so one-off allocation doesn't skew the timings
+    _predict_all(baseline.model, tensors[:1])
+    _predict_all(optimized.model, tensors[:1], optimized.channels_last)
+
+    expected, fp32_seconds = _predict_all(baseline.model, tensors)
+    actual, optimized_seconds = _predict_all(optimized.model, tensors, optimized.channels_last)
+
+    absolute_error = (actual - expected).abs()
+    mae = absolute_error.mean(dim=0)
+    scale = expected.abs().mean(dim=0).clamp(min=1e-6)
+    relative_error = mae / scale
+
+    nutrients = {}
+    for index, name in enumerate(baseline.nutrient_names):
+        nutrients[name] = {
+            'mae': round(float(mae[index]), 4),
+            'relative_error': round(float(relative_error[index]), 4),
+            'max_abs_error': round(float(absolute_error[:, index].max()), 4)
+        }
+
+    worst = float(relative_error.max())
+    return {
+        'mode': mode,
+        'images': len(tensors),
+        'nutrients': nutrients,
+        'worst_relative_error': round(worst, 4),
+        'fp32_images_per_second': round(len(tensors) / fp32_seconds, 2),
+        'optimized_images_per_second': round(len(tensors) / optimized_seconds, 2),
+        'speedup': round(fp32_seconds / optimized_seconds, 2),
+        'within_tolerance': worst <= max_relative_error
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Check accuracy drift of an optimized NutrientPredictor against fp32')
+    parser.add_argument('--mode', required=True, choices=[mode for mode in INFERENCE_MODES if mode != 'fp32'])
+    parser.add_argument('--images', required=True, help='Directory of held-out food images')
+    parser.add_argument('--calibration', help='Calibration image directory for int8_static (sets ML_CALIBRATION_DIR)')
+    parser.add_argument('--max-relative-error', type=float, default=0.05, help='Largest acceptable per-nutrient MAE relative to the mean fp32 prediction')
+    args = parser.parse_args(argv)
+
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s - %(message)s')
+    if args.calibration:
+        os.environ['ML_CALIBRATION_DIR'] = args.calibration
+
+    report = check_drift(args.mode, args.images, max_relative_error=args.max_relative_error)
+
+    print(f"Mode: {report['mode']} on {report['images']} images")
+    for name, values in report['nutrients'].items():
+        print(f"  {name:<12} MAE {values['mae']:>9.4f}  relative {values['relative_error'] * 100:>6.2f}%  max {values['max_abs_error']:>9.4f}")
+    print(f"Throughput: fp32 {report['fp32_images_per_second']} img/s, {report['mode']} {report['optimized_images_per_second']} img/s ({report['speedup']}x)")
+    print('Within tolerance' if report['within_tolerance'] else f"Drift exceeds {args.max_relative_error * 100:.1f}%")
+
+    return 0 if report['within_tolerance'] else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,225 @@
+from concurrent.futures import ThreadPoolExecutor
+from firebase_admin import messaging, exceptions
+from middleware.metrics_middleware import push_notifications_total, time_phase
+import threading
+import logging
+import time
+import os
+
+# FCM accepts at most this many tokens per multicast call
+MAX_TOKENS_PER_CALL = 500
+
+def _is_invalid_token(error):
+    """Errors that mean the token will never work again, so it should be dropped"""
+    if isinstance(error, (messaging.UnregisteredError, messaging.SenderIdMismatchError)):
+        return True
+    # Malformed tokens come back as INVALID_ARGUMENT naming the registration token;
+    # other INVALID_ARGUMENT errors are about the payload
+    return isinstance(error, exceptions.InvalidArgumentError) and 'registration token' in str(error).lower()
+
+class FirebaseMessagingBackend:
+    """Sends through FCM with the initialized Firebase app"""
+
+    def send_multicast(self, tokens, title, body, data=None):
+        """
+        Send one notification to up to MAX_TOKENS_PER_CALL tokens
+
+        Returns:
+            One entry per token: None when delivered, otherwise the exception
+        """
+        from config.firebase_admin import get_firebase_app
+        get_firebase_app()  # Ensure Firebase is initialized
+
+        message = messaging.MulticastMessage(
+            notification=messaging.Notification(
+                title=title,
+                body=body
+            ),
+            data=data or {},
+            tokens=tokens
+        )
+        response = messaging.send_each_for_multicast(message)
+        return [None if result.success else result.exception for result in response.responses]
+
+class FakeMessagingBackend:
+    """
+    In-process stand-in for FCM, for tests and benchmarks
+
+    Tokens starting with 'invalid' fail as unregistered and tokens starting
+    with 'unavailable' fail with a transient error; everything else is
+    recorded in `sent`.
+    """
+
+    def __init__(self, latency_ms=0):
+        self.latency = latency_ms / 1000.0
+        self.sent = []
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def send_multicast(self, tokens, title, body, data=None):
+        if len(tokens) > MAX_TOKENS_PER_CALL:
+            raise ValueError(f'tokens must not contain more than {MAX_TOKENS_PER_CALL} elements.')
+        if self.latency:
+            time.sleep(self.latency)
+
+        results = []
+        with self._lock:
+            self.calls += 1
+            for token in tokens:
+                if token.startswith('invalid'):
+                    results.append(messaging.UnregisteredError('Requested entity was not found.'))
+                elif token.startswith('unavailable'):
+                    results.append(exceptions.UnavailableError('The service is currently unavailable.'))
+                else:
+                    self.sent.append({'token': token, 'title': title, 'body': body, 'data': data or {}})
+                    results.append(None)
+        return results
+
+class NotificationDispatcher:
+    """
+    Push notification fan-out
+
+    Token lists are de-duplicated and split into chunks of at most
+    MAX_TOKENS_PER_CALL, and the chunks are sent concurrently on a shared
+    pool of `max_parallel` threads, which also bounds the total number of
+    in-flight FCM calls across requests. Per-token failures are collected,
+    and tokens FCM reports as dead are removed from every user in one
+    update_many.
+    """
+
+    def __init__(self, backend, chunk_size=MAX_TOKENS_PER_CALL, max_parallel=4):
+        self.backend = backend
+        self.chunk_size = min(MAX_TOKENS_PER_CALL, max(1, int(chunk_size)))
+        self.max_parallel = max(1, int(max_parallel))
+        self._executor = ThreadPoolExecutor(max_workers=self.max_parallel, thread_name_prefix='push-dispatch')
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            'notifications': 0,
+            'chunks': 0,
+            'chunk_errors': 0,
+            'sent': 0,
+            'failed': 0,
+            'invalid': 0,
+            'pruned': 0
+        }
+
+    def _count(self, **amounts):
+        with self._stats_lock:
+            for key, amount in amounts.items():
+                self._stats[key] += amount
+
+    def _send_chunk(self, chunk, title, body, data):
+        with time_phase('fcm', 'send_each_for_multicast'):
+            return self.backend.send_multicast(chunk, title, body, data)
+
+    def send(self, tokens, title, body, data=None, prune_invalid=True):
+        """
+        Send one notification to every token
+
+        Returns:
+            Dict with success_count, failure_count, failures (token -> error)
+            and invalid_tokens (already removed from users if prune_invalid)
+        """
+        tokens = list(dict.fromkeys(token for token in tokens if token))
+        chunks = [tokens[start:start + self.chunk_size] for start in range(0, len(tokens), self.chunk_size)]
+        futures = [self._executor.submit(self._send_chunk, chunk, title, body, data) for chunk in chunks]
+
+        failures = {}
+        invalid_tokens = []
+        chunk_errors = 0
+        for chunk, future in zip(chunks, futures):
+            try:
+                errors = future.result()
+            except Exception as e:
+                # The whole call failed (credentials, network); no token is known to be dead
+                chunk_errors += 1
+                logging.error(f"Push notification chunk of {len(chunk)} tokens failed: {str(e)}")
+                errors = [e] * len(chunk)
+
+            for token, error in zip(chunk, errors):
+                if error is None:
+                    continue
+                failures[token] = str(error)
+                if _is_invalid_token(error):
+                    invalid_tokens.append(token)
+
+        pruned = 0
+        if prune_invalid and invalid_tokens:
+            from models.user import User
+            try:
+                pruned = User.prune_push_tokens(invalid_tokens)
+            except Exception as e:
+                logging.error(f"Failed to prune {len(invalid_tokens)} invalid push tokens: {str(e)}")
+
+        success_count = len(tokens) - len(failures)
+        self._count(
+            notifications=1,
+            chunks=len(chunks),
+            chunk_errors=chunk_errors,
+            sent=success_count,
+            failed=len(failures) - len(invalid_tokens),
+            invalid=len(invalid_tokens),
+            pruned=pruned
+        )
+        push_notifications_total.inc(success_count, status='sent')
+        push_notifications_total.inc(len(failures) - len(invalid_tokens), status='failed')
+        push_notifications_total.inc(len(invalid_tokens), status='invalid')
+
+        logging.info(f"Push notification sent to {len(tokens)} tokens in {len(chunks)} chunks: {success_count} successful, {len(failures)} failed, {len(invalid_tokens)} invalid")
+        return {
+            'success_count': success_count,
+            'failure_count': len(failures),
+            'failures': failures,
+            'invalid_tokens': invalid_tokens,
+            'pruned_users': pruned
+        }
+
+    def send_to_users(self, users, title, body, data=None):
+        """Send to every device of the users that have push notifications enabled"""
+        tokens = []
+        for user in users:
+            if user.enable_push_notifications:
+                tokens.extend(user.push_tokens)
+        return self.send(tokens, title, body, data)
+
+    def get_stats(self):
+        """Get dispatch statistics"""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats['chunk_size'] = self.chunk_size
+        stats['max_parallel'] = self.max_parallel
+        stats['backend'] = type(self.backend).__name__
+        return stats
+
+# Global instance
+notification_dispatcher = None
+notification_dispatcher_lock = threading.Lock()
+
+def get_notification_dispatcher():
+    """Get the dispatcher for the backend selected by NOTIFICATION_BACKEND (firebase or fake)"""
+    global notification_dispatcher
+
+    with notification_dispatcher_lock:
+        if notification_dispatcher is None:
+            backend = os.getenv('NOTIFICATION_BACKEND', 'firebase').lower()
+            if backend == 'fake':
+                messaging_backend = FakeMessagingBackend(latency_ms=float(os.getenv('NOTIFICATION_FAKE_LATENCY_MS', 0)))
+            else:
+                if backend != 'firebase':
+                    logging.warning(f"Unknown NOTIFICATION_BACKEND '{backend}', using firebase")
+                messaging_backend = FirebaseMessagingBackend()
+
+            notification_dispatcher = NotificationDispatcher(
+                messaging_backend,
+                chunk_size=int(os.getenv('NOTIFICATION_CHUNK_SIZE', MAX_TOKENS_PER_CALL)),
+                max_parallel=int(os.getenv('NOTIFICATION_MAX_PARALLEL', 4))
+            )
+            logging.info(f"Notification dispatcher: {type(messaging_backend).__name__} (chunk size {notification_dispatcher.chunk_size}, {notification_dispatcher.max_parallel} parallel)")
+
+    return notification_dispatcher
+
+def get_notification_stats():
+    """Dispatch statistics for the status endpoints (None when not started)"""
+    if notification_dispatcher is None:
+        return None
+    return notification_dispatcher.get_stats()
@@ -0,0 +1,250 @@
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from pymongo import ReturnDocument
+import threading
+import hashlib
+import logging
+import sqlite3
+import time
+import os
+
+# verify() messages, shared by every backend
+NOT_FOUND = "OTP not found or expired"
+EXPIRED = "OTP has expired"
+TOO_MANY_ATTEMPTS = "Maximum verification attempts exceeded"
+
+def _hash_otp(email, otp):
+    # Codes are only ever compared, so don't keep them in the clear
+    return hashlib.sha256(f"{email}:{otp}".encode('utf-8')).hexdigest()
+
+def _invalid_message(attempts_remaining):
+    return f"Invalid OTP. {attempts_remaining} attempts remaining"
+
+class MemoryOTPStore:
+    """
+    Per-process OTP store for single-worker deployments
+
+    Entries are kept in expiry order (every code gets the same TTL), so
+    expired codes are swept from the front on each write instead of waiting
+    for a verify; `max_entries` caps memory during signup bursts by dropping
+    the oldest codes first.
+    """
+
+    def __init__(self, max_entries=100000):
+        self.max_entries = max(1, int(max_entries))
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _sweep(self, now):
+        while self._entries:
+            email, entry = next(iter(self._entries.items()))
+            if entry['expires_at'] > now and len(self._entries) <= self.max_entries:
+                break
+            del self._entries[email]
+
+    def put(self, email, otp, purpose, ttl_seconds, max_attempts):
+        now = time.time()
+        with self._lock:
+            self._entries.pop(email, None)
+            self._entries[email] = {
+                'otp_hash': _hash_otp(email, otp),
+                'purpose': purpose,
+                'expires_at': now + ttl_seconds,
+                'attempts': 0,
+                'max_attempts': max_attempts
+            }
+            self._sweep(now)
+
+    def verify(self, email, otp):
+        with self._lock:
+            entry = self._entries.get(email)
+            if entry is None:
+                return False, NOT_FOUND
+
+            if time.time() > entry['expires_at']:
+                del self._entries[email]
+                return False, EXPIRED
+
+            if entry['attempts'] >= entry['max_attempts']:
+                del self._entries[email]
+                return False, TOO_MANY_ATTEMPTS
+
+            if entry['otp_hash'] != _hash_otp(email, otp):
+                entry['attempts'] += 1
+                return False, _invalid_message(entry['max_attempts'] - entry['attempts'])
+
+            del self._entries[email]
+            return True, f"{entry['purpose']} successful"
+
+    def get_stats(self):
+        with self._lock:
+            return {'backend': 'memory', 'size': len(self._entries), 'max_entries': self.max_entries}
+
+class MongoOTPStore:
+    """
+    OTP store shared by every worker and node, in the otp_codes collection
+
+    One document per email (_id). A TTL index on expires_at lets MongoDB
+    delete abandoned codes on its own; queries also check expires_at since
+    the TTL monitor only runs about once a minute. Successful verification
+    and attempt counting are single atomic find-and-modify operations, so
+    concurrent guesses can't exceed max_attempts.
+    """
+
+    COLLECTION = 'otp_codes'
+
+    def _collection(self):
+        from config.database import get_db
+        return get_db()[self.COLLECTION]
+
+    def put(self, email, otp, purpose, ttl_seconds, max_attempts):
+        self._collection().replace_one(
+            {'_id': email},
+            {
+                'otp_hash': _hash_otp(email, otp),
+                'purpose': purpose,
+                'expires_at': datetime.utcnow() + timedelta(seconds=ttl_seconds),
+                'attempts_remaining': max_attempts
+            },
+            upsert=True
+        )
+
+    def verify(self, email, otp):
+        collection = self._collection()
+        now = datetime.utcnow()
+        live = {
+            '_id': email,
+            'expires_at': {'$gt': now},
+            'attempts_remaining': {'$gt': 0}
+        }
+
+        # Right code: consume it
+        entry = collection.find_one_and_delete(dict(live, otp_hash=_hash_otp(email, otp)))
+        if entry is not None:
+            return True, f"{entry['purpose']} successful"
+
+        # Wrong code: count the attempt
+        entry = collection.find_one_and_update(live, {'$inc': {'attempts_remaining': -1}}, return_document=ReturnDocument.AFTER)
+        if entry is not None:
+            return False, _invalid_message(entry['attempts_remaining'])
+
+        # No live code: expired, out of attempts or never issued. Only delete a
+        # dead entry; put() may have issued a fresh code since the checks above
+        entry = collection.find_one_and_delete({
+            '_id': email,
+            '$or': [{'expires_at': {'$lte': now}}, {'attempts_remaining': {'$lte': 0}}]
+        })
+        if entry is None:
+            return False, NOT_FOUND
+        if entry['expires_at'] <= now:
+            return False, EXPIRED
+        return False, TOO_MANY_ATTEMPTS
+
+    def get_stats(self):
+        return {'backend': 'mongo', 'size': self._collection().estimated_document_count()}
+
+class _Transaction:
+    """BEGIN IMMEDIATE ... COMMIT/ROLLBACK around a block"""
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def __enter__(self):
+        self.connection.execute('BEGIN IMMEDIATE')
+        return self.connection
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.connection.execute('ROLLBACK' if exc_type else 'COMMIT')
+        return False
+
+class SQLiteOTPStore:
+    """
+    OTP store in a local SQLite file, shared by the worker processes of one node
+
+    Each operation runs in its own IMMEDIATE transaction, which takes the
+    database write lock up front, so check-and-increment is atomic across
+    processes. Expired rows are deleted on every write.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        with self._connect() as connection:
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS otp_codes ('
+                'email TEXT PRIMARY KEY, otp_hash TEXT NOT NULL, purpose TEXT NOT NULL, '
+                'expires_at REAL NOT NULL, attempts INTEGER NOT NULL, max_attempts INTEGER NOT NULL)'
+            )
+            connection.execute('CREATE INDEX IF NOT EXISTS otp_codes_expires_at ON otp_codes (expires_at)')
+
+    def _connect(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            # Autocommit mode; transactions are opened explicitly below
+            connection = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            self._local.connection = connection
+        return _Transaction(connection)
+
+    def put(self, email, otp, purpose, ttl_seconds, max_attempts):
+        now = time.time()
+        with self._connect() as connection:
+            connection.execute('DELETE FROM otp_codes WHERE expires_at <= ?', (now,))
+            connection.execute(
+                'INSERT OR REPLACE INTO otp_codes VALUES (?, ?, ?, ?, 0, ?)',
+                (email, _hash_otp(email, otp), purpose, now + ttl_seconds, max_attempts)
+            )
+
+    def verify(self, email, otp):
+        with self._connect() as connection:
+            row = connection.execute(
+                'SELECT otp_hash, purpose, expires_at, attempts, max_attempts FROM otp_codes WHERE email = ?',
+                (email,)
+            ).fetchone()
+            if row is None:
+                return False, NOT_FOUND
+
+            otp_hash, purpose, expires_at, attempts, max_attempts = row
+            if time.time() > expires_at:
+                connection.execute('DELETE FROM otp_codes WHERE email = ?', (email,))
+                return False, EXPIRED
+
+            if attempts >= max_attempts:
+                connection.execute('DELETE FROM otp_codes WHERE email = ?', (email,))
+                return False, TOO_MANY_ATTEMPTS
+
+            if otp_hash != _hash_otp(email, otp):
+                connection.execute('UPDATE otp_codes SET attempts = attempts + 1 WHERE email = ?', (email,))
+                return False, _invalid_message(max_attempts - attempts - 1)
+
+            connection.execute('DELETE FROM otp_codes WHERE email = ?', (email,))
+            return True, f"{purpose} successful"
+
+    def get_stats(self):
+        with self._connect() as connection:
+            size = connection.execute('SELECT COUNT(*) FROM otp_codes').fetchone()[0]
+        return {'backend': 'sqlite', 'size': size, 'path': self.path}
+
+# Global instance
+otp_store = None
+otp_store_lock = threading.Lock()
+
+def get_otp_store():
+    """Get the OTP store selected by OTP_STORE_BACKEND (memory, mongo or sqlite)"""
+    global otp_store
+
+    with otp_store_lock:
+        if otp_store is None:
+            backend = os.getenv('OTP_STORE_BACKEND', 'memory').lower()
+            if backend == 'mongo':
+                otp_store = MongoOTPStore()
+            elif backend == 'sqlite':
+                path = os.getenv('OTP_STORE_SQLITE_PATH') or os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'otp_codes.sqlite3')
+                otp_store = SQLiteOTPStore(path)
+            else:
+                if backend != 'memory':
+                    logging.warning(f"Unknown OTP_STORE_BACKEND '{backend}', using memory")
+                otp_store = MemoryOTPStore(max_entries=int(os.getenv('OTP_STORE_MAX_ENTRIES', 100000)))
+            logging.info(f"OTP store: {type(otp_store).__name__}")
+
+    return otp_store
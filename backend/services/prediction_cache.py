@@ -0,0 +1,163 @@
+from collections import OrderedDict
+from PIL import Image
+import hashlib
+import threading
+import logging
+import time
+import os
+import io
+
+class PredictionCache:
+    """
+    Content-addressed cache for nutrient predictions
+
+    Entries are keyed by the SHA-256 of the uploaded bytes, so an exact
+    re-upload skips both image decode and inference. When the perceptual
+    tier is enabled, each entry also stores a 64-bit difference hash (dHash)
+    so a near-identical photo (re-encoded, lightly cropped, retaken) can be
+    served from the cache as well. Eviction is LRU, bounded by `max_entries`,
+    with a per-entry TTL.
+    """
+
+    def __init__(self, max_entries=1024, ttl_seconds=3600, perceptual_enabled=False, max_hamming_distance=4):
+        self.max_entries = max(1, int(max_entries))
+        self.ttl_seconds = float(ttl_seconds)
+        self.perceptual_enabled = perceptual_enabled
+        self.max_hamming_distance = int(max_hamming_distance)
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {
+            'exact_hits': 0,
+            'perceptual_hits': 0,
+            'misses': 0,
+            'evictions': 0,
+            'expirations': 0
+        }
+
+    @staticmethod
+    def digest(image_data):
+        """Exact content key for raw image bytes"""
+        return hashlib.sha256(image_data).hexdigest()
+
+    @staticmethod
+    def perceptual_hash(image_data):
+        """
+        Compute a 64-bit difference hash of the image
+
+        JPEGs are decoded in draft mode at a reduced DCT scale, so this is much
+        cheaper than the full-resolution decode used for inference.
+        """
+        image = Image.open(io.BytesIO(image_data))
+        image.draft('L', (64, 64))
+        image = image.convert('L').resize((9, 8), Image.BILINEAR)
+        pixels = list(image.getdata())
+
+        value = 0
+        for row in range(8):
+            for col in range(8):
+                left = pixels[row * 9 + col]
+                right = pixels[row * 9 + col + 1]
+                value = (value << 1) | (1 if left > right else 0)
+        return value
+
+    def _is_expired(self, entry, now):
+        return now - entry['stored_at'] > self.ttl_seconds
+
+    def lookup(self, image_data):
+        """
+        Find a cached prediction for raw image bytes
+
+        Returns:
+            Tuple of (result or None, digest, phash). The digest and phash are
+            handed back so the caller can store a fresh prediction without
+            hashing the image twice.
+        """
+        digest = self.digest(image_data)
+        now = time.monotonic()
+
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is not None and self._is_expired(entry, now):
+                del self._entries[digest]
+                self._stats['expirations'] += 1
+                entry = None
+
+            if entry is not None:
+                self._entries.move_to_end(digest)
+                self._stats['exact_hits'] += 1
+                return entry['result'], digest, entry['phash']
+
+        phash = None
+        if self.perceptual_enabled:
+            try:
+                phash = self.perceptual_hash(image_data)
+            except Exception as e:
+                logging.warning(f"Could not compute perceptual hash: {str(e)}")
+
+        with self._lock:
+            if phash is not None:
+                best_key = None
+                best_distance = self.max_hamming_distance + 1
+
+                for key, entry in self._entries.items():
+                    if entry['phash'] is None or self._is_expired(entry, now):
+                        continue
+                    distance = bin(entry['phash'] ^ phash).count('1')
+                    if distance < best_distance:
+                        best_key = key
+                        best_distance = distance
+
+                if best_key is not None:
+                    self._entries.move_to_end(best_key)
+                    self._stats['perceptual_hits'] += 1
+                    return self._entries[best_key]['result'], digest, phash
+
+            self._stats['misses'] += 1
+            return None, digest, phash
+
+    def put(self, digest, result, phash=None):
+        """Store a successful prediction"""
+        with self._lock:
+            self._entries[digest] = {
+                'result': result,
+                'phash': phash,
+                'stored_at': time.monotonic()
+            }
+            self._entries.move_to_end(digest)
+
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats['evictions'] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self):
+        """Return hit/miss counters and current size"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['size'] = len(self._entries)
+
+        lookups = stats['exact_hits'] + stats['perceptual_hits'] + stats['misses']
+        stats['max_entries'] = self.max_entries
+        stats['ttl_seconds'] = self.ttl_seconds
+        stats['perceptual_enabled'] = self.perceptual_enabled
+        stats['hit_ratio'] = round((stats['exact_hits'] + stats['perceptual_hits']) / lookups, 4) if lookups else 0
+        return stats
+
+def create_prediction_cache():
+    """Build the prediction cache from environment settings (None when disabled)"""
+    if os.getenv('ML_CACHE_ENABLED', 'true').lower() != 'true':
+        logging.info("Prediction cache disabled")
+        return None
+
+    cache = PredictionCache(
+        max_entries=int(os.getenv('ML_CACHE_MAX_ENTRIES', 1024)),
+        ttl_seconds=float(os.getenv('ML_CACHE_TTL_SECONDS', 3600)),
+        perceptual_enabled=os.getenv('ML_CACHE_PERCEPTUAL_ENABLED', 'false').lower() == 'true',
+        max_hamming_distance=int(os.getenv('ML_CACHE_PERCEPTUAL_MAX_DISTANCE', 4))
+    )
+    logging.info(f"Prediction cache enabled (max_entries={cache.max_entries}, perceptual={cache.perceptual_enabled})")
+    return cache